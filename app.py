@@ -2,12 +2,27 @@
 PDF Form Filler - Aplicación Streamlit
 """
 
-import streamlit as st
 import os
-import tempfile
+import streamlit as st
+import uuid
+from datetime import datetime
 from pathlib import Path
+from typing import Any, Dict, Tuple
+
+from utils import PDFExtractor, CSVHandler, PDFFiller, metrics
+from utils.field_cache import FieldCache, content_hash
+from utils.jobs import DONE, FAILED, JobQueue
+
 
-from utils import PDFExtractor, CSVHandler, PDFFiller
+# Caché de análisis de PDFs entre reruns (compartida por todas las sesiones)
+ANALYSIS_CACHE_MAX_ENTRIES = 32
+ANALYSIS_CACHE_TTL = 60 * 60  # segundos
+
+# Templates compilados que guarda cada sesión
+SESSION_FILLERS = 2
+
+# Procesos de la cola de trabajos en segundo plano (compartida por todas las sesiones)
+JOB_WORKERS = 2
 
 
 # Configuración de la página
@@ -19,8 +34,97 @@ st.set_page_config(
 )
 
 
+@st.cache_resource
+def get_field_cache() -> FieldCache:
+    """Caché persistente de campos/etiquetas compartida por todas las sesiones."""
+    return FieldCache()
+
+
+@st.cache_resource
+def start_metrics_server() -> None:
+    """
+    Publica las métricas en /metrics si MCMPDF_METRICS_PORT está definido
+    (una sola vez por proceso).
+    """
+    port = os.environ.get('MCMPDF_METRICS_PORT')
+    if port:
+        metrics.serve(int(port), os.environ.get('MCMPDF_METRICS_HOST', '127.0.0.1'))
+
+
+@st.cache_resource
+def get_job_queue() -> JobQueue:
+    """Cola de trabajos en segundo plano compartida por todas las sesiones."""
+    return JobQueue(workers=JOB_WORKERS)
+
+
+def session_id() -> str:
+    """Identificador de la sesión, para listar solo sus trabajos."""
+    if 'session_id' not in st.session_state:
+        st.session_state['session_id'] = uuid.uuid4().hex
+    return st.session_state['session_id']
+
+
+def select_job(job_id: str) -> None:
+    """Selecciona el trabajo cuyo resultado se prepara para descargar."""
+    st.session_state['selected_job'] = job_id
+
+
+def upload_hash(upload) -> str:
+    """
+    Hash de contenido de un archivo subido, calculado una vez por subida.
+
+    Streamlit vuelve a ejecutar el script con cada interacción; el hash se
+    guarda en la sesión para no recorrer los bytes del PDF en cada rerun.
+    """
+    hashes = st.session_state.setdefault('upload_hashes', {})
+    key = getattr(upload, 'file_id', None) or (upload.name, upload.size)
+    if key not in hashes:
+        hashes[key] = content_hash(upload.getvalue())
+    return hashes[key]
+
+
+@st.cache_data(max_entries=ANALYSIS_CACHE_MAX_ENTRIES, ttl=ANALYSIS_CACHE_TTL, show_spinner=False)
+def analyze_pdf(pdf_hash: str, _pdf_bytes: bytes) -> Tuple[Dict[str, Any], Dict[str, Dict[str, Any]]]:
+    """
+    Información del PDF y campos con etiquetas, cacheados por hash de contenido.
+
+    Streamlit no incluye en la clave los argumentos que empiezan por ``_``,
+    así que los bytes no se vuelven a hashear en cada rerun.
+
+    Args:
+        pdf_hash: Hash de contenido del PDF (ver upload_hash)
+        _pdf_bytes: Bytes del PDF
+
+    Returns:
+        Tupla (get_pdf_info(), get_fields_with_labels())
+    """
+    extractor = PDFExtractor(_pdf_bytes, cache=get_field_cache())
+    return extractor.get_pdf_info(), extractor.get_fields_with_labels()
+
+
+def get_filler(upload, verbose: bool = True) -> PDFFiller:
+    """
+    PDFFiller del archivo subido, reutilizado entre reruns de la sesión.
+
+    El template compilado y su caché de apariencias se guardan en la sesión
+    (no se comparten entre sesiones: PDFFiller guarda estado como
+    ``last_error``), con un máximo de SESSION_FILLERS templates.
+    """
+    pdf_hash = upload_hash(upload)
+    fillers = st.session_state.setdefault('fillers', {})
+    filler = fillers.pop(pdf_hash, None)
+    if filler is None:
+        filler = PDFFiller(upload.getvalue())
+        while len(fillers) >= SESSION_FILLERS:
+            fillers.pop(next(iter(fillers)))
+    fillers[pdf_hash] = filler
+    filler.verbose = verbose
+    return filler
+
+
 def main():
     """Función principal de la aplicación."""
+    start_metrics_server()
 
     st.title("📄 PDF Form Filler")
     st.markdown("*Extrae campos de PDFs con detección automática de etiquetas y rellena formularios*")
@@ -48,7 +152,7 @@ def main():
         st.info("💡 Para checkboxes usa: **__YES__** o **__NO__**")
 
     # Tabs principales
-    tab1, tab2, tab3 = st.tabs(["🔍 Extraer Campos", "✍️ Rellenar PDF", "⚡ Editor Rápido"])
+    tab1, tab2, tab3, tab4 = st.tabs(["🔍 Extraer Campos", "✍️ Rellenar PDF", "⚡ Editor Rápido", "🗂️ Trabajos"])
 
     # TAB 1: EXTRAER CAMPOS
     with tab1:
@@ -63,17 +167,11 @@ def main():
         )
 
         if pdf_file:
-            # Guardar archivo temporalmente
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_pdf:
-                tmp_pdf.write(pdf_file.read())
-                tmp_pdf_path = tmp_pdf.name
-
             try:
-                # Extraer información
+                # Extraer información (en memoria y cacheada por contenido:
+                # los reruns no vuelven a analizar el PDF)
                 with st.spinner("Analizando PDF y detectando etiquetas..."):
-                    extractor = PDFExtractor(tmp_pdf_path)
-                    pdf_info = extractor.get_pdf_info()
-                    fields = extractor.get_fields_with_labels()
+                    pdf_info, fields = analyze_pdf(upload_hash(pdf_file), pdf_file.getvalue())
 
                 # Mostrar información
                 col1, col2, col3 = st.columns(3)
@@ -125,64 +223,39 @@ def main():
                     )
 
                     if st.button("📥 Generar y descargar CSV", type="primary", use_container_width=True):
-                        # Generar CSV
-                        with tempfile.NamedTemporaryFile(delete=False, suffix='.csv') as tmp_csv:
-                            tmp_csv_path = tmp_csv.name
-
-                        if include_info:
-                            CSVHandler.generate_template_with_info(fields, tmp_csv_path)
-                        else:
-                            CSVHandler.generate_template(fields, tmp_csv_path)
-
-                        # Leer CSV para descarga
-                        with open(tmp_csv_path, 'rb') as f:
-                            csv_data = f.read()
+                        # Generar CSV y mapeos en memoria
+                        template_files = CSVHandler.build_template_files(fields, include_info=include_info)
 
                         st.download_button(
                             label="💾 Descargar plantilla.csv",
-                            data=csv_data,
+                            data=template_files['plantilla.csv'],
                             file_name=f"{Path(pdf_file.name).stem}_plantilla.csv",
                             mime="text/csv",
                             use_container_width=True
                         )
 
-                        # Descargar archivos adicionales
-                        files_to_download = []
-
-                        # Archivo de mapeo (siempre se genera)
-                        mapping_path = tmp_csv_path.replace('.csv', '_mapeo.txt')
-                        if os.path.exists(mapping_path):
-                            files_to_download.append(('mapeo.txt', mapping_path, 'text/plain'))
-
-                        # Archivo INFO (opcional)
+                        # Archivos de mapeo (siempre se generan) e INFO (opcional)
+                        files_to_download = [
+                            ('mapeo.txt', 'text/plain'),
+                            ('mapeo.json', 'application/json')
+                        ]
                         if include_info:
-                            info_path = tmp_csv_path.replace('.csv', '_info.txt')
-                            if os.path.exists(info_path):
-                                files_to_download.append(('info.txt', info_path, 'text/plain'))
+                            files_to_download.append(('info.txt', 'text/plain'))
 
                         # Botones de descarga para archivos adicionales
-                        if files_to_download:
-                            cols = st.columns(len(files_to_download))
-                            for idx, (name, path, mime) in enumerate(files_to_download):
-                                with cols[idx]:
-                                    with open(path, 'rb') as f:
-                                        file_data = f.read()
-                                    st.download_button(
-                                        label=f"📋 {name}",
-                                        data=file_data,
-                                        file_name=f"{Path(pdf_file.name).stem}_{name}",
-                                        mime=mime,
-                                        use_container_width=True
-                                    )
+                        cols = st.columns(len(files_to_download))
+                        for idx, (name, mime) in enumerate(files_to_download):
+                            with cols[idx]:
+                                st.download_button(
+                                    label=f"📋 {name}",
+                                    data=template_files[name],
+                                    file_name=f"{Path(pdf_file.name).stem}_{name}",
+                                    mime=mime,
+                                    use_container_width=True
+                                )
 
                         st.success("✅ Plantilla generada. **Edita el CSV** y pasa al **Paso 2**.")
-                        st.info("💡 **IMPORTANTE:** Descarga también el archivo **mapeo.txt** - lo necesitarás para rellenar el PDF")
-
-                        # Limpiar archivos temporales
-                        os.unlink(tmp_csv_path)
-                        for name, path, _ in files_to_download:
-                            if os.path.exists(path):
-                                os.unlink(path)
+                        st.info("💡 **IMPORTANTE:** Descarga también el archivo **mapeo.json** (o mapeo.txt) - lo necesitarás para rellenar el PDF")
                 else:
                     st.warning("⚠️ Este PDF no tiene campos de formulario detectables.")
                     st.info("💡 Asegúrate de que el PDF tenga campos interactivos (no es un PDF escaneado).")
@@ -192,11 +265,6 @@ def main():
                 import traceback
                 st.code(traceback.format_exc())
 
-            finally:
-                # Limpiar archivo temporal
-                if os.path.exists(tmp_pdf_path):
-                    os.unlink(tmp_pdf_path)
-
     # TAB 2: RELLENAR PDF
     with tab2:
         st.header("Paso 2: Rellenar el PDF")
@@ -222,33 +290,17 @@ def main():
 
         with col_map:
             mapping_file = st.file_uploader(
-                "🗺️ Archivo mapeo.txt",
-                type=['txt'],
+                "🗺️ Archivo de mapeo",
+                type=['json', 'txt'],
                 key='mapping_file',
                 help="REQUERIDO: archivo de mapeo generado en el Paso 1"
             )
 
         if pdf_to_fill and csv_data_file:
-            # Guardar archivos temporalmente
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_pdf:
-                tmp_pdf.write(pdf_to_fill.read())
-                tmp_pdf_path = tmp_pdf.name
-
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.csv', mode='wb') as tmp_csv:
-                tmp_csv.write(csv_data_file.read())
-                tmp_csv_path = tmp_csv.name
-
-            # Guardar archivo de mapeo si existe
-            tmp_mapping_path = None
-            if mapping_file:
-                with tempfile.NamedTemporaryFile(delete=False, suffix='.txt', mode='wb') as tmp_map:
-                    tmp_map.write(mapping_file.read())
-                    tmp_mapping_path = tmp_map.name
-
             try:
-                # Leer datos del CSV con mapeo
-                if tmp_mapping_path:
-                    csv_data = CSVHandler.read_csv_with_mapping(tmp_csv_path, tmp_mapping_path)
+                # Leer datos del CSV con mapeo (directamente desde las subidas)
+                if mapping_file:
+                    csv_data = CSVHandler.read_csv_with_mapping(csv_data_file, mapping_file)
                     st.success("✅ Archivo de mapeo cargado correctamente")
                 else:
                     st.error("❌ Falta el archivo de mapeo. Por favor súbelo.")
@@ -273,61 +325,42 @@ def main():
                     )
 
                     if st.button("✨ Rellenar PDF", type="primary", use_container_width=True):
-                        with st.spinner("Rellenando PDF..."):
-                            # Rellenar PDF
-                            filler = PDFFiller(tmp_pdf_path)
-
-                            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_output:
-                                tmp_output_path = tmp_output.name
-
-                            # Capturar output
-                            import io
-                            from contextlib import redirect_stdout
-
-                            output_buffer = io.StringIO()
-                            with redirect_stdout(output_buffer):
-                                success = filler.fill_pdf(csv_data, tmp_output_path, flatten=flatten)
-
-                            # Mostrar logs
-                            logs = output_buffer.getvalue()
-                            if logs:
-                                with st.expander("📋 Ver logs de proceso"):
-                                    st.code(logs)
-
-                            if success:
-                                st.success("🎉 ¡PDF rellenado exitosamente!")
-
-                                # Leer PDF rellenado para descarga
-                                with open(tmp_output_path, 'rb') as f:
-                                    pdf_bytes = f.read()
-
-                                st.download_button(
-                                    label="💾 Descargar PDF rellenado",
-                                    data=pdf_bytes,
-                                    file_name=f"{Path(pdf_to_fill.name).stem}_rellenado.pdf",
-                                    mime="application/pdf",
-                                    use_container_width=True
-                                )
+                        # El relleno se ejecuta en la cola de trabajos: la sesión no queda bloqueada
+                        job_id = get_job_queue().submit_fill(
+                            pdf_to_fill.getvalue(),
+                            csv_data,
+                            name=pdf_to_fill.name,
+                            flatten=flatten,
+                            owner=session_id()
+                        )
+                        st.success(f"📨 Relleno encolado (trabajo {job_id[:8]}). Descárgalo en la pestaña **🗂️ Trabajos** cuando termine.")
+
+                    # Lote: un PDF por cada fila del CSV, empaquetados en un ZIP
+                    with st.expander("📦 Generar un PDF por fila (ZIP)"):
+                        zip_pattern = st.text_input(
+                            "Patrón de nombre",
+                            value="documento_{index:05d}.pdf",
+                            help="Usa {index} o {nombre_campo} para nombrar cada PDF"
+                        )
 
-                                # Limpiar
-                                os.unlink(tmp_output_path)
-                            else:
-                                st.error("❌ Error al rellenar el PDF. Revisa los logs arriba para más detalles.")
+                        if st.button("📦 Generar ZIP", use_container_width=True):
+                            # El lote se ejecuta en la cola de trabajos: la sesión no queda bloqueada
+                            job_id = get_job_queue().submit_batch(
+                                pdf_to_fill.getvalue(),
+                                csv_data_file.getvalue(),
+                                mapping_file.getvalue(),
+                                name=pdf_to_fill.name,
+                                filename_pattern=zip_pattern,
+                                flatten=flatten,
+                                owner=session_id()
+                            )
+                            st.success(f"📨 Lote encolado (trabajo {job_id[:8]}). Sigue su progreso en la pestaña **🗂️ Trabajos**.")
 
             except Exception as e:
                 st.error(f"❌ Error: {str(e)}")
                 import traceback
                 st.code(traceback.format_exc())
 
-            finally:
-                # Limpiar archivos temporales
-                if os.path.exists(tmp_pdf_path):
-                    os.unlink(tmp_pdf_path)
-                if os.path.exists(tmp_csv_path):
-                    os.unlink(tmp_csv_path)
-                if tmp_mapping_path and os.path.exists(tmp_mapping_path):
-                    os.unlink(tmp_mapping_path)
-
         elif not pdf_to_fill:
             st.info("👆 Sube el PDF original")
         elif not csv_data_file:
@@ -346,14 +379,9 @@ def main():
         )
 
         if pdf_quick:
-            with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_pdf:
-                tmp_pdf.write(pdf_quick.read())
-                tmp_pdf_path = tmp_pdf.name
-
             try:
                 with st.spinner("Analizando PDF..."):
-                    extractor = PDFExtractor(tmp_pdf_path)
-                    fields = extractor.get_fields_with_labels()
+                    _, fields = analyze_pdf(upload_hash(pdf_quick), pdf_quick.getvalue())
 
                 if fields:
                     st.success(f"✅ {len(fields)} campos detectados")
@@ -407,19 +435,12 @@ def main():
                                         data_to_fill[field_name] = str(value)
 
                                 # Rellenar PDF
-                                filler = PDFFiller(tmp_pdf_path)
-
-                                with tempfile.NamedTemporaryFile(delete=False, suffix='.pdf') as tmp_output:
-                                    tmp_output_path = tmp_output.name
+                                filler = get_filler(pdf_quick, verbose=False)
+                                pdf_bytes = filler.fill_bytes(data_to_fill, flatten=flatten_quick)
 
-                                success = filler.fill_pdf(data_to_fill, tmp_output_path, flatten=flatten_quick)
-
-                                if success:
+                                if pdf_bytes is not None:
                                     st.success("🎉 ¡PDF generado!")
 
-                                    with open(tmp_output_path, 'rb') as f:
-                                        pdf_bytes = f.read()
-
                                     st.download_button(
                                         label="💾 Descargar PDF rellenado",
                                         data=pdf_bytes,
@@ -427,8 +448,6 @@ def main():
                                         mime="application/pdf",
                                         use_container_width=True
                                     )
-
-                                    os.unlink(tmp_output_path)
                                 else:
                                     st.error("❌ Error al generar el PDF")
                 else:
@@ -438,9 +457,54 @@ def main():
                 st.error(f"❌ Error: {str(e)}")
                 import traceback
                 st.code(traceback.format_exc())
-            finally:
-                if os.path.exists(tmp_pdf_path):
-                    os.unlink(tmp_pdf_path)
+
+    # TAB 4: TRABAJOS EN SEGUNDO PLANO
+    with tab4:
+        st.header("🗂️ Trabajos en segundo plano")
+        st.markdown("Los rellenados y los lotes se procesan en segundo plano: puedes seguir usando la aplicación mientras tanto.")
+
+        st.button("🔄 Actualizar", key='refresh_jobs')
+
+        jobs = get_job_queue().list_jobs(owner=session_id())
+        if not jobs:
+            st.info("📭 Todavía no has lanzado ningún trabajo")
+
+        for job in jobs:
+            created = datetime.fromtimestamp(job['created']).strftime('%H:%M:%S')
+            kind = {'batch': '📦 Lote', 'fill': '✍️ Relleno', 'extract': '🔍 Extracción'}.get(job['kind'], job['kind'])
+            st.markdown(f"**{kind} · {job['name']}** · {created}")
+
+            if job['status'] == DONE:
+                if job['failed']:
+                    st.warning(f"⚠️ {job['failed']}/{job['total']} filas con error (ver manifest.csv en el ZIP)")
+                # Solo se lee del disco el resultado del trabajo seleccionado
+                # (no todos los ZIP terminados en cada rerun)
+                if st.session_state.get('selected_job') != job['id']:
+                    st.button(
+                        f"📂 Preparar descarga de {job['result']}",
+                        key=f"select_{job['id']}",
+                        on_click=select_job,
+                        args=(job['id'],),
+                        use_container_width=True
+                    )
+                else:
+                    result_path = get_job_queue().result_path(job['id'])
+                    if result_path:
+                        with open(result_path, 'rb') as f:
+                            st.download_button(
+                                label=f"💾 Descargar {job['result']}",
+                                data=f.read(),
+                                file_name=f"{Path(job['name']).stem}_{job['result']}",
+                                mime="application/pdf" if job['result'].endswith('.pdf') else "application/zip",
+                                key=f"job_{job['id']}",
+                                use_container_width=True
+                            )
+            elif job['status'] == FAILED:
+                st.error(f"❌ {job['error']}")
+            elif job['total']:
+                st.progress(job['done'] / job['total'], text=f"{job['done']}/{job['total']} filas")
+            else:
+                st.caption("⏳ En cola...")
 
     # Footer
     st.markdown("---")
@@ -0,0 +1,119 @@
+#!/usr/bin/env python3
+"""
+Rellenado por lotes: un PDF template + un CSV con N filas -> N PDFs rellenados.
+
+Uso:
+    python batch_fill.py plantilla.pdf datos.csv mapeo.txt salida/
+    python batch_fill.py plantilla.pdf datos.csv mapeo.txt salida/ --patron "solicitud_{index:05d}.pdf" --aplanar
+    python batch_fill.py plantilla.pdf datos.csv mapeo.txt salida/ --workers 8
+    python batch_fill.py plantilla_grande.pdf datos.csv mapeo.txt salida/ --workers 8 --mmap
+"""
+
+import argparse
+import logging
+import os
+import sys
+import time
+from pathlib import Path
+
+# Añadir el directorio actual al path para importar utils
+sys.path.insert(0, str(Path(__file__).parent))
+
+from utils import CSVHandler, PDFFiller, ParallelFiller, metrics
+from utils.columnar import ColumnNormalizer
+
+
+def main():
+    """Función principal."""
+    parser = argparse.ArgumentParser(
+        description="Genera un PDF rellenado por cada fila de un CSV."
+    )
+    parser.add_argument('pdf', help="PDF template con formulario")
+    parser.add_argument('csv', help="CSV con una fila de datos por documento")
+    parser.add_argument('mapeo', help="Archivo de mapeo generado en el Paso 1")
+    parser.add_argument('salida', help="Carpeta donde guardar los PDFs")
+    parser.add_argument(
+        '--patron',
+        default='documento_{index:05d}.pdf',
+        help="Patrón del nombre de archivo: {index} y nombres técnicos de campo "
+             "(por defecto: documento_{index:05d}.pdf)"
+    )
+    parser.add_argument('--aplanar', action='store_true', help="Aplanar los PDFs generados")
+    parser.add_argument(
+        '--workers',
+        type=int,
+        default=1,
+        help="Número de procesos en paralelo (0 = uno por CPU, por defecto: 1)"
+    )
+    parser.add_argument(
+        '--mmap',
+        action='store_true',
+        help="Proyectar el template en memoria y escribir los PDFs como actualización "
+             "incremental (recomendado para templates muy grandes)"
+    )
+    parser.add_argument(
+        '--incremental',
+        action='store_true',
+        help="Escribir cada PDF como actualización incremental del template: solo se "
+             "añaden los campos modificados y las firmas del template siguen siendo válidas"
+    )
+    parser.add_argument(
+        '--metricas',
+        metavar='ARCHIVO',
+        help="Volcar métricas en formato Prometheus a ARCHIVO al terminar "
+             "(p.ej. para el textfile collector de node_exporter)"
+    )
+    args = parser.parse_args()
+    incremental = True if args.incremental else None
+
+    logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+    if args.metricas:
+        metrics.enable()
+
+    # Con un mapeo JSON, los tipos y estados de los campos vienen del mapeo
+    mapping = CSVHandler.load_mapping_data(args.mapeo)
+    filler = PDFFiller(args.pdf, use_mmap=args.mmap, incremental=incremental,
+                       field_info=mapping['fields'])
+
+    # Normalizar los datos por columnas (vacíos, checkboxes, desplegables)
+    # antes de rellenar, en lugar de celda a celda en cada PDF
+    normalizer = ColumnNormalizer(filler.template, dict(mapping['labels']))
+    rows = normalizer.iter_rows(args.csv)
+
+    start = time.perf_counter()
+    if args.workers == 1:
+        summary = filler.fill_batch(rows, args.salida, filename_pattern=args.patron,
+                                    flatten=args.aplanar, preprocessed=True)
+    else:
+        filler = ParallelFiller(args.pdf, workers=args.workers or None, use_mmap=args.mmap,
+                                incremental=incremental, field_info=mapping['fields'])
+        results = filler.fill_batch(rows, args.salida, filename_pattern=args.patron,
+                                    flatten=args.aplanar, preprocessed=True)
+        summary = {
+            'total': len(results),
+            'ok': sum(1 for r in results if r['success']),
+            'failed': sum(1 for r in results if not r['success']),
+            'errors': [(r['index'], os.path.basename(r['output']), r['error'])
+                       for r in results if not r['success']]
+        }
+    elapsed = time.perf_counter() - start
+
+    print(f"\n📄 Filas procesadas: {summary['total']}")
+    print(f"✅ PDFs generados: {summary['ok']}")
+    if summary['failed']:
+        print(f"❌ Filas con error: {summary['failed']}")
+        for index, name, error in summary['errors'][:10]:
+            print(f"   • Fila {index} ({name}): {error}")
+    for name, count in normalizer.invalid_counts.items():
+        print(f"⚠️  {name}: {count} valores que no son opciones válidas (se dejaron vacíos)")
+    if summary['total']:
+        print(f"⏱️  {elapsed:.1f}s ({summary['total'] / elapsed:.1f} filas/s)")
+
+    if args.metricas:
+        metrics.write(args.metricas)
+
+    sys.exit(1 if summary['failed'] else 0)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,122 @@
+"""
+Fixtures comunes para las pruebas: genera PDFs de formulario con pypdf.
+"""
+
+import pytest
+from pypdf import PdfWriter
+from pypdf.generic import (
+    ArrayObject, DecodedStreamObject, DictionaryObject, FloatObject,
+    NameObject, NumberObject, TextStringObject
+)
+
+
+def _stream(writer: PdfWriter, data: bytes, extra: dict = None):
+    """Añade un stream al writer y devuelve su referencia."""
+    stream = DecodedStreamObject()
+    stream.set_data(data)
+    for key, value in (extra or {}).items():
+        stream[NameObject(key)] = value
+    return writer._add_object(stream)
+
+
+def build_form_pdf(path: str, num_pages: int = 3, field_pages=(0, 2)) -> str:
+    """
+    Crea un PDF con formulario: en cada página de ``field_pages`` hay tres
+    campos de texto, un checkbox (estado activo /On) y un desplegable, cada
+    uno con su etiqueta a la izquierda.
+
+    Args:
+        path: Ruta donde guardar el PDF
+        num_pages: Número total de páginas
+        field_pages: Páginas con campos
+
+    Returns:
+        Ruta del PDF creado
+    """
+    writer = PdfWriter()
+    font = writer._add_object(DictionaryObject({
+        NameObject('/Type'): NameObject('/Font'),
+        NameObject('/Subtype'): NameObject('/Type1'),
+        NameObject('/BaseFont'): NameObject('/Helvetica'),
+    }))
+    fields = ArrayObject()
+
+    for page_num in range(num_pages):
+        page = writer.add_blank_page(612, 792)
+        page[NameObject('/Resources')] = DictionaryObject({
+            NameObject('/Font'): DictionaryObject({NameObject('/Helv'): font})
+        })
+        content = [f"BT /Helv 12 Tf 50 750 Td (Pagina {page_num}) Tj ET"]
+        annots = ArrayObject()
+
+        if page_num in field_pages:
+            specs = [
+                (f'p{page_num}_nombre', '/Tx', 0),
+                (f'p{page_num}_apellido', '/Tx', 0),
+                (f'p{page_num}_dni', '/Tx', 0),
+                (f'p{page_num}_acepto', '/Btn', 0),
+                (f'p{page_num}_pais', '/Ch', 131072),
+            ]
+            for i, (name, ft, ff) in enumerate(specs):
+                y = 650 - i * 50
+                label = name.split('_', 1)[1].capitalize()
+                content.append(f"BT /Helv 12 Tf 50 {y + 5} Td ({label}:) Tj ET")
+
+                widget = DictionaryObject({
+                    NameObject('/Type'): NameObject('/Annot'),
+                    NameObject('/Subtype'): NameObject('/Widget'),
+                    NameObject('/FT'): NameObject(ft),
+                    NameObject('/T'): TextStringObject(name),
+                    NameObject('/Ff'): NumberObject(ff),
+                    NameObject('/F'): NumberObject(4),
+                    NameObject('/Rect'): ArrayObject([
+                        FloatObject(200), FloatObject(y), FloatObject(400), FloatObject(y + 20)
+                    ]),
+                    NameObject('/DA'): TextStringObject('/Helv 10 Tf 0 g'),
+                    NameObject('/P'): page.indirect_reference,
+                })
+
+                if ft == '/Btn':
+                    widget[NameObject('/Rect')] = ArrayObject([
+                        FloatObject(200), FloatObject(y), FloatObject(215), FloatObject(y + 15)
+                    ])
+                    bbox = ArrayObject([FloatObject(0), FloatObject(0), FloatObject(15), FloatObject(15)])
+                    form = {'/Type': NameObject('/XObject'), '/Subtype': NameObject('/Form'), '/BBox': bbox}
+                    widget[NameObject('/AP')] = DictionaryObject({
+                        NameObject('/N'): DictionaryObject({
+                            NameObject('/On'): _stream(writer, b"0 g 2 2 11 11 re f", form),
+                            NameObject('/Off'): _stream(writer, b"", form),
+                        })
+                    })
+                    widget[NameObject('/V')] = NameObject('/Off')
+                    widget[NameObject('/AS')] = NameObject('/Off')
+                elif ft == '/Ch':
+                    widget[NameObject('/Opt')] = ArrayObject([
+                        TextStringObject('España'), TextStringObject('Francia'), TextStringObject('Italia')
+                    ])
+
+                ref = writer._add_object(widget)
+                annots.append(ref)
+                fields.append(ref)
+
+        page[NameObject('/Contents')] = _stream(writer, "\n".join(content).encode('latin-1'))
+        if annots:
+            page[NameObject('/Annots')] = annots
+
+    writer._root_object[NameObject('/AcroForm')] = DictionaryObject({
+        NameObject('/Fields'): fields,
+        NameObject('/DA'): TextStringObject('/Helv 0 Tf 0 g'),
+        NameObject('/DR'): DictionaryObject({
+            NameObject('/Font'): DictionaryObject({NameObject('/Helv'): font})
+        }),
+    })
+
+    with open(path, 'wb') as f:
+        writer.write(f)
+    return path
+
+
+@pytest.fixture
+def form_pdf(tmp_path):
+    """PDF de formulario de 3 páginas con campos en las páginas 0 y 2."""
+    return build_form_pdf(str(tmp_path / 'formulario.pdf'))
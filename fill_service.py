@@ -0,0 +1,85 @@
+#!/usr/bin/env python3
+"""
+Servicio HTTP de relleno de PDFs para otros sistemas.
+
+Uso:
+    python fill_service.py --puerto 8080
+    python fill_service.py --puerto 8080 plantilla1.pdf plantilla2.pdf
+
+    curl --data-binary @plantilla.pdf http://localhost:8080/templates
+    curl -H 'Content-Type: application/json' -d '{"nombre": "Ana"}' \\
+         http://localhost:8080/templates/<template_id>/fill -o rellenado.pdf
+"""
+
+import argparse
+import asyncio
+import sys
+from pathlib import Path
+
+# Añadir el directorio actual al path para importar utils
+sys.path.insert(0, str(Path(__file__).parent))
+
+from utils import metrics
+from utils.service import (
+    DEFAULT_MAX_CONCURRENCY, DEFAULT_MAX_PENDING, DEFAULT_MAX_TEMPLATES, DEFAULT_REPLICAS,
+    FillService, TemplatePool
+)
+
+
+def main():
+    """Función principal."""
+    parser = argparse.ArgumentParser(description="Servicio HTTP de relleno de PDFs.")
+    parser.add_argument('templates', nargs='*', help="PDFs a registrar al arrancar")
+    parser.add_argument('--host', default='127.0.0.1', help="Dirección de escucha (por defecto: 127.0.0.1)")
+    parser.add_argument('--puerto', type=int, default=8080, help="Puerto (por defecto: 8080)")
+    parser.add_argument(
+        '--concurrencia',
+        type=int,
+        default=DEFAULT_MAX_CONCURRENCY,
+        help=f"Rellenados simultáneos (por defecto: {DEFAULT_MAX_CONCURRENCY})"
+    )
+    parser.add_argument(
+        '--max-pendientes',
+        type=int,
+        default=DEFAULT_MAX_PENDING,
+        help=f"Peticiones en curso antes de responder 503 (por defecto: {DEFAULT_MAX_PENDING})"
+    )
+    parser.add_argument(
+        '--max-templates',
+        type=int,
+        default=DEFAULT_MAX_TEMPLATES,
+        help=f"Templates en memoria (por defecto: {DEFAULT_MAX_TEMPLATES})"
+    )
+    parser.add_argument(
+        '--copias',
+        type=int,
+        default=DEFAULT_REPLICAS,
+        help=f"Copias precompiladas de cada template (por defecto: {DEFAULT_REPLICAS})"
+    )
+    parser.add_argument(
+        '--metricas',
+        action='store_true',
+        help="Registrar métricas y publicarlas en GET /metrics (formato Prometheus)"
+    )
+    args = parser.parse_args()
+
+    if args.metricas:
+        metrics.enable()
+
+    pool = TemplatePool(max_templates=args.max_templates, replicas=args.copias)
+    for path in args.templates:
+        info = pool.register(Path(path).read_bytes())
+        print(f"[INFO] {path}: template_id={info['template_id']} ({len(info['fields'])} campos)")
+
+    service = FillService(pool, max_concurrency=args.concurrencia, max_pending=args.max_pendientes)
+    print(f"[INFO] Escuchando en http://{args.host}:{args.puerto}")
+    try:
+        asyncio.run(service.serve_forever(args.host, args.puerto))
+    except KeyboardInterrupt:
+        pass
+    finally:
+        service.close()
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,51 @@
+"""
+Pruebas de la generación incremental de apariencias: solo se tocan los
+widgets de los campos rellenados, localizados por su página.
+"""
+
+from pypdf import PdfReader
+
+from conftest import build_form_pdf
+from utils import PDFFiller
+from utils.appearance import AppearanceCache, text_stream
+
+
+def test_only_filled_widgets_get_appearance(tmp_path):
+    form = build_form_pdf(str(tmp_path / 'largo.pdf'), num_pages=30, field_pages=(1, 15, 28))
+    output = str(tmp_path / 'salida.pdf')
+    filler = PDFFiller(form, verbose=False)
+
+    assert filler.template.apply_values(filler.template.new_writer(), {'p15_nombre': 'Ana'}) == 1
+    assert filler.fill_pdf({'p15_nombre': 'Ana (1)', 'p28_pais': 'Italia'}, output)
+
+    reader = PdfReader(output)
+    with_ap = {
+        annot.get_object()['/T']
+        for page in reader.pages
+        for annot in page.get('/Annots', [])
+        if annot.get_object()['/FT'] != '/Btn' and '/AP' in annot.get_object()
+    }
+    assert with_ap == {'p15_nombre', 'p28_pais'}
+
+    widget = reader.pages[15]['/Annots'][0].get_object()
+    assert widget['/V'] == 'Ana (1)'
+    assert b'(Ana \\(1\\)) Tj' in widget['/AP']['/N'].get_object().get_data()
+    assert reader.get_fields()['p28_pais']['/V'] == 'Italia'
+
+
+def test_appearance_cache_matches_uncached_and_is_bounded(form_pdf, tmp_path):
+    cache = AppearanceCache(maxsize=2)
+    for text in ['Ana', 'Luis (2)', 'Añá']:
+        assert cache.render(text, 200, 20, 'Helv', 10, '0 g', 1) == text_stream(text, 200, 20, 'Helv', 10, '0 g', 1)
+    assert (cache.hits, cache.misses) == (2, 1)
+
+    cache.render('x', 100, 20, 'Helv', 10, '0 g')
+    cache.render('x', 50, 20, 'Helv', 10, '0 g')
+    assert len(cache) == 2
+
+    filler = PDFFiller(form_pdf, verbose=False)
+    for i in range(3):
+        assert filler.fill_pdf({'p0_nombre': f'Ana {i}', 'p2_nombre': 'Luis'}, str(tmp_path / f'{i}.pdf'))
+    # Todos los campos de texto del formulario comparten /DA y geometría
+    assert len(filler.appearance_cache) == 1
+    assert filler.appearance_cache.hits == 5
@@ -0,0 +1,72 @@
+"""
+Pruebas del rellenado por lotes: nombres de archivo, resumen por filas y
+el script batch_fill.py sobre un CSV.
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+from pypdf import PdfReader
+
+from utils import PDFFiller
+
+ROOT = Path(__file__).parent
+
+
+def test_output_names_follow_pattern():
+    row = {'dni': '123/45', 'nombre': 'Ana'}
+
+    assert PDFFiller.build_output_name('documento_{index:05d}.pdf', 7, row) == 'documento_00007.pdf'
+    # Separadores de ruta fuera, extensión añadida y campos ausentes vacíos
+    assert PDFFiller.build_output_name('{dni}_{nombre}', 1, row) == '123_45_Ana.pdf'
+    assert PDFFiller.build_output_name('{index}_{apellido}.pdf', 2, row) == '2_.pdf'
+    # Un patrón inválido vuelve al nombre por defecto
+    assert PDFFiller.build_output_name('{index:d', 3, row) == 'documento_00003.pdf'
+
+
+def test_repeated_output_names_get_a_suffix():
+    used = set()
+    names = [PDFFiller.build_output_name('{dni}.pdf', i, {'dni': '1'}, used) for i in range(1, 4)]
+
+    assert names == ['1.pdf', '1_2.pdf', '1_3.pdf']
+    assert used == set(names)
+
+
+def test_fill_batch_summary_and_errors(form_pdf, tmp_path):
+    rows = [
+        {'p0_nombre': 'Ana', 'p0_dni': '1'},
+        {'campo_inexistente': 'x'},
+        {'p0_nombre': 'Luis', 'p0_dni': '1'},
+    ]
+
+    summary = PDFFiller(form_pdf, verbose=False).fill_batch(iter(rows), str(tmp_path), '{p0_dni}.pdf')
+
+    assert (summary['total'], summary['ok'], summary['failed']) == (3, 2, 1)
+    # La fila con el mismo DNI no sobrescribe a la primera
+    assert [Path(path).name for path in summary['outputs']] == ['1.pdf', '1_2.pdf']
+    assert PdfReader(summary['outputs'][1]).get_fields()['p0_nombre']['/V'] == 'Luis'
+
+    [(index, name, error)] = summary['errors']
+    assert (index, name) == (2, '.pdf')
+    assert 'coincide' in error
+
+
+def test_batch_fill_script(form_pdf, tmp_path):
+    csv_path = tmp_path / 'datos.csv'
+    csv_path.write_text('Nombre,País,Acepto\nAna,Francia,sí\nLuis,,no\n', encoding='utf-8')
+    mapping_path = tmp_path / 'mapeo.txt'
+    mapping_path.write_text('Nombre → p0_nombre\nPaís → p0_pais\nAcepto → p0_acepto\n', encoding='utf-8')
+    output_dir = tmp_path / 'salida'
+
+    result = subprocess.run(
+        [sys.executable, str(ROOT / 'batch_fill.py'), form_pdf, str(csv_path), str(mapping_path),
+         str(output_dir), '--patron', 'solicitud_{index}_{p0_nombre}.pdf'],
+        capture_output=True, text=True
+    )
+
+    assert result.returncode == 0, result.stdout + result.stderr
+    assert sorted(p.name for p in output_dir.iterdir()) == ['solicitud_1_Ana.pdf', 'solicitud_2_Luis.pdf']
+    fields = PdfReader(str(output_dir / 'solicitud_1_Ana.pdf')).get_fields()
+    assert fields['p0_pais']['/V'] == 'Francia'
+    assert fields['p0_acepto']['/V'] == '/On'
@@ -0,0 +1,62 @@
+"""
+Pruebas del ZIP de lote: un PDF por fila, sin entradas de las filas que
+fallan, y un manifiesto CSV con el resultado de cada fila.
+"""
+
+import csv
+import io
+import zipfile
+
+from pypdf import PdfReader
+
+from utils import PDFFiller
+
+
+def test_fill_zip_streams_pdfs_and_manifest(form_pdf):
+    filler = PDFFiller(form_pdf, verbose=False)
+    rows = (
+        {'p0_nombre': 'Ana', 'p0_dni': '1'},
+        {'p0_nombre': 'Luis', 'p0_dni': '1'},
+        {'otro_campo': 'x'},
+        {'p0_nombre': 'Eva', 'p0_dni': '3'},
+    )
+    buffer = io.BytesIO()
+
+    summary = filler.fill_zip(rows, buffer, filename_pattern='solicitud_{p0_dni}.pdf', flatten=True)
+
+    assert (summary['total'], summary['ok'], summary['failed']) == (4, 3, 1)
+    with zipfile.ZipFile(buffer) as archive:
+        names = archive.namelist()
+        # Los nombres repetidos se desambiguan y las filas fallidas no dejan entrada
+        assert names == ['solicitud_1.pdf', 'solicitud_1_2.pdf', 'solicitud_3.pdf', 'manifest.csv']
+
+        reader = PdfReader(io.BytesIO(archive.read('solicitud_1_2.pdf')))
+        assert 'Luis' in reader.pages[0].extract_text()
+
+        manifest = list(csv.DictReader(io.StringIO(archive.read('manifest.csv').decode('utf-8-sig'))))
+    assert [row['status'] for row in manifest] == ['ok', 'ok', 'error', 'ok']
+    assert manifest[2]['output'] == ''
+    assert 'coincide' in manifest[2]['error']
+    assert summary['errors'] == [(3, 'solicitud_.pdf', manifest[2]['error'])]
+    assert filler.verbose is False
+
+
+def test_fill_zip_drops_entries_of_rows_that_fail_midway(form_pdf, monkeypatch):
+    filler = PDFFiller(form_pdf, verbose=False)
+    fill_pdf = filler.fill_pdf
+
+    def failing_fill(row, output, **kwargs):
+        if row['p0_nombre'] == 'Luis':
+            output.write(b'%PDF-1.7 truncado')
+            raise OSError("disco lleno")
+        return fill_pdf(row, output, **kwargs)
+
+    monkeypatch.setattr(filler, 'fill_pdf', failing_fill)
+    buffer = io.BytesIO()
+
+    summary = filler.fill_zip([{'p0_nombre': 'Ana'}, {'p0_nombre': 'Luis'}], buffer)
+
+    assert summary['errors'] == [(2, 'documento_00002.pdf', 'OSError: disco lleno')]
+    with zipfile.ZipFile(buffer) as archive:
+        assert archive.testzip() is None
+        assert archive.namelist() == ['documento_00001.pdf', 'manifest.csv']
@@ -0,0 +1,73 @@
+"""
+Pruebas de la normalización por columnas y de su uso en los lotes en paralelo.
+"""
+
+import pytest
+
+from utils import PDFFiller, parallel_filler
+from utils.columnar import ColumnNormalizer
+
+
+def test_blank_lines_across_chunks_do_not_stop_reading(form_pdf):
+    template = PDFFiller(form_pdf, verbose=False).template
+    normalizer = ColumnNormalizer(template, {'Nombre': 'p0_nombre', 'Acepto': 'p0_acepto'},
+                                  use_pandas=False)
+    csv_data = 'Nombre,Acepto\nAna,sí\n' + '\n' * 5 + 'Luis,no\nEva,\n'
+
+    rows = list(normalizer.iter_rows(csv_data.encode('utf-8'), chunksize=2))
+
+    assert rows == [
+        {'p0_nombre': 'Ana', 'p0_acepto': '/On'},
+        {'p0_nombre': 'Luis', 'p0_acepto': '/Off'},
+        {'p0_nombre': 'Eva'}
+    ]
+
+
+def test_parallel_workers_skip_coercion_of_preprocessed_rows(form_pdf, tmp_path, monkeypatch):
+    worker_filler = PDFFiller(form_pdf, verbose=False)
+
+    def fail(data):
+        raise AssertionError("fila normalizada dos veces")
+
+    monkeypatch.setattr(worker_filler, '_process_data', fail)
+    monkeypatch.setattr(parallel_filler, '_worker_filler', worker_filler)
+    output = str(tmp_path / 'salida.pdf')
+
+    results = parallel_filler._fill_chunk([(1, {'p0_nombre': 'Ana'}, output, False, True)])
+
+    assert results[0]['success'], results[0]['error']
+
+
+def test_pandas_and_stdlib_paths_agree(form_pdf):
+    pytest.importorskip('pandas')
+    template = PDFFiller(form_pdf, verbose=False).template
+    mapping = {'Nombre': 'p0_nombre', 'Acepto': 'p0_acepto', 'País': 'p0_pais'}
+    csv_data = (
+        'Nombre,Acepto,País\n'
+        ' Ana ,sí,Francia\n'
+        + '\n' * 3 + '   \n\t\n' +  # bloques solo con líneas en blanco
+        'Luis,NO,Portugal\n'
+        'Eva,,\n'
+        ',x,Marte\n'
+        'Sin país,/On\n'
+    ).encode('utf-8')
+
+    results = {}
+    for use_pandas in (True, False):
+        for chunksize in (2, 5000):
+            normalizer = ColumnNormalizer(template, mapping, use_pandas=use_pandas)
+            rows = list(normalizer.iter_rows(csv_data, chunksize=chunksize))
+            results[use_pandas, chunksize] = (rows, normalizer.invalid_counts)
+
+    expected = (
+        [
+            {'p0_nombre': 'Ana', 'p0_acepto': '/On', 'p0_pais': 'Francia'},
+            {'p0_nombre': 'Luis', 'p0_acepto': '/Off'},
+            {'p0_nombre': 'Eva'},
+            {'p0_acepto': '/On'},
+            {'p0_nombre': 'Sin país', 'p0_acepto': '/On'},
+        ],
+        {'p0_pais': 2}
+    )
+    for key, result in results.items():
+        assert result == expected, key
@@ -0,0 +1,44 @@
+"""
+Pruebas de la lectura de CSV en streaming: valores tal cual, filas leídas
+de una en una y validación solo de la cabecera.
+"""
+
+import io
+
+from utils import CSVHandler
+
+
+MAPPING = 'Nombre → p0_nombre\nDNI → p0_dni\n'
+
+
+def test_rows_keep_values_as_written(tmp_path):
+    csv_path = tmp_path / 'datos.csv'
+    csv_path.write_bytes('\ufeffNombre,DNI\nAna,007\nLuis,\nEva,5,sobra\n'.encode('utf-8'))
+    mapping_path = tmp_path / 'mapeo.txt'
+    mapping_path.write_text(MAPPING, encoding='utf-8')
+
+    rows = list(CSVHandler.iter_rows_with_mapping(str(csv_path), str(mapping_path)))
+
+    # Sin conversiones de tipo; vacíos y columnas sobrantes se descartan
+    assert rows == [
+        {'p0_nombre': 'Ana', 'p0_dni': '007'},
+        {'p0_nombre': 'Luis'},
+        {'p0_nombre': 'Eva', 'p0_dni': '5'},
+    ]
+    assert CSVHandler.read_csv_with_mapping(str(csv_path), str(mapping_path)) == rows[0]
+
+
+def test_rows_are_streamed_and_header_read_alone():
+    data = ('Nombre,DNI\n' + 'Persona,12345678\n' * 200_000).encode('utf-8')
+    stream = io.BytesIO(data)
+
+    first = next(CSVHandler.iter_rows_with_mapping(stream, MAPPING.encode('utf-8')))
+    assert first == {'p0_nombre': 'Persona', 'p0_dni': '12345678'}
+    assert stream.tell() < len(data) // 10
+
+    assert CSVHandler.validate_csv_header(stream, ['Nombre', 'DNI', 'Pais']) == {
+        'valid': False, 'missing_fields': ['Pais'], 'extra_fields': []
+    }
+    assert stream.tell() < len(data) // 10
+
+    assert CSVHandler.validate_csv(stream, ['Nombre', 'DNI'])['num_rows'] == 200_000
@@ -0,0 +1,97 @@
+"""
+Pruebas del extractor: widgets de un campo en varias páginas (con y sin
+/P) y etiquetas con filtro de páginas, con la caché vacía y con la llena.
+"""
+
+from pypdf import PdfWriter
+from pypdf.generic import ArrayObject, DictionaryObject, FloatObject, NameObject
+
+from utils import PDFExtractor
+from utils.field_cache import FieldCache
+
+
+def _split_field(pdf_path: str, output_path: str, with_page_ref: bool = True) -> str:
+    """
+    Convierte p0_nombre en un campo con dos widgets: el original en la página
+    0 y otro en la página 2, a la altura de la etiqueta "Apellido:".
+    """
+    writer = PdfWriter(clone_from=pdf_path)
+    fields = writer._root_object['/AcroForm']['/Fields']
+    field_ref = next(ref for ref in fields if ref.get_object()['/T'] == 'p0_nombre')
+    field = field_ref.get_object()
+    page = writer.pages[2]
+
+    kids = ArrayObject()
+    for rect, page_ref in ((field['/Rect'], writer.pages[0].indirect_reference),
+                           ([200, 600, 400, 620], page.indirect_reference)):
+        kid = DictionaryObject({
+            NameObject('/Type'): NameObject('/Annot'),
+            NameObject('/Subtype'): NameObject('/Widget'),
+            NameObject('/Rect'): ArrayObject([FloatObject(v) for v in rect]),
+            NameObject('/Parent'): field_ref,
+        })
+        if with_page_ref:
+            kid[NameObject('/P')] = page_ref
+        kids.append(writer._add_object(kid))
+
+    # El widget original pasa a ser el primer hijo
+    annots = writer.pages[0]['/Annots']
+    annots[next(i for i, ref in enumerate(annots) if ref.idnum == field_ref.idnum)] = kids[0]
+    page['/Annots'].append(kids[1])
+    for key in ('/Type', '/Subtype', '/Rect', '/P'):
+        field.pop(NameObject(key), None)
+    field[NameObject('/Kids')] = kids
+
+    with open(output_path, 'wb') as f:
+        writer.write(f)
+    return output_path
+
+
+def test_page_filtered_labels_match_with_and_without_cache(form_pdf, tmp_path, monkeypatch):
+    pdf_path = _split_field(form_pdf, str(tmp_path / 'dos_paginas.pdf'))
+
+    cache = FieldCache(str(tmp_path / 'cache.sqlite'))
+    try:
+        extractor = PDFExtractor(pdf_path, cache=cache)
+        extracted = []
+        original = extractor._extract_text_with_positions
+
+        def tracking(page_num):
+            extracted.append(page_num)
+            return original(page_num)
+
+        monkeypatch.setattr(extractor, '_extract_text_with_positions', tracking)
+        miss = extractor.get_fields_with_labels(pages=[2])
+        assert extracted == [2]  # solo se extrae texto de la página pedida
+        assert cache.total_size() == 0  # las peticiones filtradas no se guardan
+
+        full = PDFExtractor(pdf_path, cache=cache).get_fields_with_labels()
+        hit = PDFExtractor(pdf_path, cache=cache).get_fields_with_labels(pages=[2])
+    finally:
+        cache.close()
+
+    def labels(fields):
+        return {name: data['label'] for name, data in fields.items()}
+
+    assert labels(miss) == labels(hit)
+    assert 'p0_nombre' in miss and 'p0_apellido' not in miss
+    # Con filtro la etiqueta sale del widget de la página 2; sin él, del primero
+    assert miss['p0_nombre']['label'] == 'Apellido'
+    assert full['p0_nombre']['label'] == 'Nombre'
+
+
+def test_field_reports_every_widget_and_its_page(form_pdf, tmp_path):
+    expected = [
+        {'page': 0, 'rect': (200.0, 650.0, 400.0, 670.0)},
+        {'page': 2, 'rect': (200.0, 600.0, 400.0, 620.0)},
+    ]
+
+    # Con /P en los widgets y sin él (la página sale de las /Annots)
+    for with_page_ref in (True, False):
+        pdf_path = _split_field(form_pdf, str(tmp_path / f'widgets_{with_page_ref}.pdf'),
+                                with_page_ref=with_page_ref)
+        fields = PDFExtractor(pdf_path).get_fields()
+
+        assert fields['p0_nombre']['widgets'] == expected
+        assert (fields['p0_nombre']['page'], fields['p0_nombre']['rect']) == (0, expected[0]['rect'])
+        assert fields['p2_dni']['widgets'] == [{'page': 2, 'rect': (200.0, 550.0, 400.0, 570.0)}]
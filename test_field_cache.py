@@ -0,0 +1,67 @@
+"""
+Pruebas de la caché de campos: aciertos y fallos, expulsión LRU por tamaño
+e invalidación al cambiar LABELING_VERSION.
+"""
+
+import itertools
+
+from utils import field_cache, pdf_extractor
+from utils.field_cache import FieldCache
+from utils.pdf_extractor import PDFExtractor
+
+
+def _entry(name: str, padding: int = 0):
+    return {name: {'type': 'text', 'page': 0, 'rect': (1.0, 2.0, 3.0, 4.0),
+                   'widgets': [{'page': 0, 'rect': (1.0, 2.0, 3.0, 4.0)}],
+                   'label': 'x' * padding}}
+
+
+def test_hit_miss_and_lru_eviction(tmp_path, monkeypatch):
+    # Reloj determinista para que last_access no empate
+    clock = itertools.count(1)
+    monkeypatch.setattr(field_cache.time, 'time', lambda: next(clock))
+
+    cache = FieldCache(str(tmp_path / 'cache.sqlite'), max_bytes=10 ** 6)
+    try:
+        assert cache.get('a', '1') is None
+        cache.put('a', '1', _entry('campo_a', 400))
+        assert cache.get('a', '1') == _entry('campo_a', 400)
+
+        # Cabe algo más de dos entradas
+        cache.max_bytes = cache.total_size() * 2 + 100
+        cache.put('b', '1', _entry('campo_b', 400))
+        cache.get('a', '1')  # 'a' pasa a ser la más reciente
+        cache.put('c', '1', _entry('campo_c', 400))
+
+        assert cache.get('b', '1') is None
+        assert cache.get('a', '1') is not None
+        assert cache.get('c', '1') is not None
+        assert cache.total_size() <= cache.max_bytes
+    finally:
+        cache.close()
+
+
+def test_labeling_version_change_invalidates_entries(form_pdf, tmp_path, monkeypatch):
+    cache = FieldCache(str(tmp_path / 'cache.sqlite'))
+    try:
+        fields = PDFExtractor(form_pdf, cache=cache).get_fields_with_labels()
+        pdf_hash = field_cache.file_hash(form_pdf)
+        assert cache.get(pdf_hash, pdf_extractor.LABELING_VERSION) == fields
+
+        # Un acierto no vuelve a extraer texto
+        cached_extractor = PDFExtractor(form_pdf, cache=cache)
+        monkeypatch.setattr(cached_extractor, '_extract_text_with_positions', None)
+        assert cached_extractor.get_fields_with_labels() == fields
+
+        # Con otra versión de la heurística la entrada antigua se descarta
+        stale = {name: dict(data, label='obsoleta') for name, data in fields.items()}
+        cache.put(pdf_hash, pdf_extractor.LABELING_VERSION, stale)
+        monkeypatch.setattr(pdf_extractor, 'LABELING_VERSION', 'nueva')
+        assert PDFExtractor(form_pdf, cache=cache).get_fields_with_labels() == fields
+        assert cache.get(pdf_hash, 'nueva') == fields
+
+        # Pedir una entrada con versión distinta la elimina
+        assert cache.get(pdf_hash, 'vieja') is None
+        assert cache.total_size() == 0
+    finally:
+        cache.close()
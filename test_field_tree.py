@@ -0,0 +1,87 @@
+"""
+Pruebas del árbol de campos memorizado: el AcroForm se recorre una sola vez
+por extractor, aunque se pidan info, nombres, tipos, rects y páginas. El
+rellenador no lo recorre: usa los campos del template compilado.
+"""
+
+from pypdf import PdfWriter
+from pypdf.generic import ArrayObject, DictionaryObject, NameObject, TextStringObject
+
+from utils import PDFExtractor, PDFFiller
+
+
+def _count_traversals(reader):
+    """Envuelve reader.get_fields y devuelve un contador de llamadas."""
+    calls = {'count': 0}
+    original = reader.get_fields
+
+    def counting_get_fields(*args, **kwargs):
+        calls['count'] += 1
+        return original(*args, **kwargs)
+
+    reader.get_fields = counting_get_fields
+    return calls
+
+
+def test_extractor_traverses_fields_once(form_pdf):
+    extractor = PDFExtractor(form_pdf)
+    calls = _count_traversals(extractor.reader)
+
+    info = extractor.get_pdf_info()
+    names = extractor.get_field_names()
+    fields = extractor.get_fields()
+    labelled = extractor.get_fields_with_labels()
+
+    assert calls['count'] == 1
+    assert info['num_fields'] == len(names) == len(fields) == len(labelled) == 10
+    assert info['has_form'] is True
+    assert labelled['p2_nombre']['page'] == 2
+    assert labelled['p2_nombre']['label'] == 'Nombre'
+
+
+def test_extractor_returns_independent_copies(form_pdf):
+    extractor = PDFExtractor(form_pdf)
+
+    labelled = extractor.get_fields_with_labels()
+    plain = extractor.get_fields()
+
+    assert 'label' in labelled['p0_nombre']
+    assert 'label' not in plain['p0_nombre']
+
+
+def _nest_field(pdf_path: str, output_path: str) -> str:
+    """Convierte p0_nombre en el hijo ``nombre`` de un campo padre ``persona``."""
+    writer = PdfWriter(clone_from=pdf_path)
+    fields = writer._root_object['/AcroForm']['/Fields']
+    index = next(i for i, ref in enumerate(fields) if ref.get_object()['/T'] == 'p0_nombre')
+    widget_ref = fields[index]
+
+    parent_ref = writer._add_object(DictionaryObject({
+        NameObject('/T'): TextStringObject('persona'),
+        NameObject('/Kids'): ArrayObject([widget_ref]),
+    }))
+    widget = widget_ref.get_object()
+    widget[NameObject('/T')] = TextStringObject('nombre')
+    widget[NameObject('/Parent')] = parent_ref
+    fields[index] = parent_ref
+
+    with open(output_path, 'wb') as f:
+        writer.write(f)
+    return output_path
+
+
+def test_filler_preview_matches_compiled_template(form_pdf, tmp_path):
+    filler = PDFFiller(_nest_field(form_pdf, str(tmp_path / 'jerarquico.pdf')), verbose=False)
+    calls = _count_traversals(filler.reader)
+
+    data = {'persona.nombre': 'Ana', 'p2_pais': 'Francia'}
+    fillable = filler.get_fillable_fields()
+    preview = filler.preview_filled_fields(data)
+
+    # Vista previa y relleno usan los mismos nombres: sin el nodo padre
+    assert calls['count'] == 0
+    assert set(fillable) == set(preview) == filler.template.field_names
+    assert 'persona' not in preview
+    assert preview['persona.nombre'] == 'Ana'
+    assert preview['p0_apellido'] == '[VACÍO]'
+    assert filler.fill_bytes(data) is not None
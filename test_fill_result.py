@@ -0,0 +1,40 @@
+"""
+Pruebas de FillResult: tiempos por etapa, contadores y mensajes propios de
+cada rellenado.
+"""
+
+import io
+import logging
+
+from utils import FillResult, PDFFiller
+
+
+def test_fill_pdf_returns_instrumented_result(form_pdf, caplog):
+    filler = PDFFiller(form_pdf, verbose=False)
+    data = {'p0_nombre': 'Ana', 'p0_dni': '', 'p0_acepto': 'sí', 'no_existe': 'x'}
+
+    with caplog.at_level(logging.INFO):
+        result = filler.fill_pdf(data, io.BytesIO(), flatten=True)
+
+    assert isinstance(result, FillResult) and result
+    assert filler.last_result is result
+    assert list(result.to_dict()['timings_ms']) == [
+        'parse', 'clone', 'resolve', 'coercion', 'appearance', 'flatten', 'write'
+    ]
+    assert result.counters['fields_filled'] == 2
+    assert result.counters['fields_skipped'] == 1
+    assert result.counters['fields_invalid'] == 1
+    assert result.counters['widgets'] == 2
+    assert '[WARNING] Campos no encontrados en PDF: no_existe' in result.log_text()
+    # Sin verbose los mensajes solo quedan en el resultado
+    assert not caplog.records
+
+    # El template ya está compilado: el segundo rellenado no tiene etapa
+    # parse, y sus mensajes no se mezclan con los del primero
+    first_messages = list(result.messages)
+    second = filler.fill_pdf({'no_existe': 'x'}, io.BytesIO())
+    assert not second
+    assert second.error == filler.last_error == "Ningún campo del CSV coincide con los campos del PDF"
+    assert 'parse' not in second.timings
+    assert 'Campos no encontrados' in second.log_text()
+    assert result.messages == first_messages
@@ -0,0 +1,34 @@
+"""
+Pruebas del aplanado: las apariencias quedan en el contenido de las páginas
+y no queda ningún campo interactivo.
+"""
+
+from pypdf import PdfReader
+
+from conftest import build_form_pdf
+from utils import PDFFiller
+
+
+def test_flatten_leaves_no_interactive_fields(tmp_path):
+    form = build_form_pdf(str(tmp_path / 'formulario.pdf'), num_pages=4, field_pages=(0, 2, 3))
+    output = str(tmp_path / 'aplanado.pdf')
+    filler = PDFFiller(form, verbose=False)
+
+    data = {'p0_nombre': 'Ana', 'p0_acepto': 'sí', 'p2_pais': 'Francia', 'p3_dni': '123'}
+    assert filler.fill_pdf(data, output, flatten=True)
+    assert filler.last_error is None
+
+    reader = PdfReader(output)
+    assert '/AcroForm' not in reader.trailer['/Root']
+    assert not reader.get_fields()
+    for page in reader.pages:
+        assert not [a for a in page.get('/Annots', []) if a.get_object()['/Subtype'] == '/Widget']
+
+    assert 'Ana' in reader.pages[0].extract_text()
+    assert 'Francia' in reader.pages[2].extract_text()
+    assert '123' in reader.pages[3].extract_text()
+    # Cada página tiene sus propios XObjects aunque los recursos fueran compartidos
+    assert len(reader.pages[0]['/Resources']['/XObject']) == 2
+    assert len(reader.pages[3]['/Resources']['/XObject']) == 2
+    # El template original no se modifica
+    assert filler.reader.get_fields()
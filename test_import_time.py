@@ -0,0 +1,68 @@
+"""
+Pruebas de importación (python -X importtime).
+
+Comprueba que los módulos del paquete no arrastran dependencias pesadas
+que no necesitan, para que los workers y los scripts cortos arranquen rápido.
+"""
+
+import subprocess
+import sys
+from pathlib import Path
+
+ROOT = Path(__file__).parent
+
+
+def _importtime(statement: str) -> dict:
+    """
+    Ejecuta ``statement`` en un intérprete nuevo con -X importtime.
+
+    Returns:
+        Diccionario {módulo: tiempo acumulado en µs}
+    """
+    result = subprocess.run(
+        [sys.executable, '-X', 'importtime', '-c', statement],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+
+    modules = {}
+    for line in result.stderr.splitlines():
+        if not line.startswith('import time:') or 'cumulative' in line:
+            continue
+        _, cumulative, name = line[len('import time:'):].split('|')
+        modules[name.strip()] = int(cumulative)
+    return modules
+
+
+def test_package_import_is_lazy():
+    modules = _importtime('import utils')
+
+    assert 'pypdf' not in modules
+    assert 'pandas' not in modules
+
+
+def test_filler_does_not_import_pandas():
+    modules = _importtime('from utils import PDFFiller')
+
+    assert 'pandas' not in modules
+    assert 'utils.csv_handler' not in modules
+    assert 'utils.pdf_extractor' not in modules
+
+
+def test_filler_does_not_load_metrics():
+    # Las métricas son opcionales: ni el módulo ni http.server se cargan
+    # al importar el rellenador
+    result = subprocess.run(
+        [sys.executable, '-c',
+         'import sys; from utils import PDFFiller; '
+         'print(",".join(m for m in ("http.server", "utils.metrics") if m in sys.modules))'],
+        cwd=ROOT, capture_output=True, text=True, check=True
+    )
+
+    assert result.stdout.strip() == ''
+
+
+def test_csv_handler_is_stdlib_only():
+    modules = _importtime('from utils import CSVHandler')
+
+    assert 'pandas' not in modules
+    assert 'pypdf' not in modules
@@ -0,0 +1,51 @@
+"""
+Pruebas del flujo completo en memoria: PDF, CSV y mapeo como bytes o
+streams, sin archivos intermedios.
+"""
+
+import io
+
+from pypdf import PdfReader
+
+from utils import CSVHandler, PDFExtractor, PDFFiller
+
+
+def test_extract_and_fill_without_files(form_pdf):
+    with open(form_pdf, 'rb') as f:
+        pdf_bytes = f.read()
+
+    fields = PDFExtractor(pdf_bytes).get_fields_with_labels(pages=[0])
+    files = CSVHandler.build_template_files(fields, include_info=True)
+    assert set(files) == {'plantilla.csv', 'mapeo.txt', 'mapeo.json', 'info.txt'}
+
+    header = CSVHandler.read_header(files['plantilla.csv'])
+    csv_bytes = (','.join(header) + '\n' + 'Ana,García,123,__YES__,Francia\n').encode('utf-8-sig')
+    mapping = io.BytesIO(files['mapeo.json'])
+    mapping.name = 'formulario_mapeo.json'
+
+    data = CSVHandler.read_csv_with_mapping(io.BytesIO(csv_bytes), mapping)
+    assert data['p0_nombre'] == 'Ana'
+    assert CSVHandler.load_mapping(files['mapeo.txt']) == CSVHandler.load_mapping(mapping)
+    assert CSVHandler.validate_csv(csv_bytes, header)['num_rows'] == 1
+
+    filler = PDFFiller(io.BytesIO(pdf_bytes), verbose=False)
+    output = filler.fill_bytes(data)
+    assert output is not None and filler.pdf_path is None
+
+    stream = io.BytesIO()
+    assert filler.fill_pdf(data, stream)
+    assert not stream.closed
+
+    for result in (output, stream.getvalue()):
+        values = PdfReader(io.BytesIO(result)).get_fields()
+        assert values['p0_nombre']['/V'] == 'Ana'
+        assert values['p0_pais']['/V'] == 'Francia'
+
+
+def test_text_streams_are_read_from_the_start():
+    data = 'a,b\n1,2\n3,4\n5,6\n'
+    text_stream = io.StringIO(data)
+    text_stream.readline()  # cabecera ya leída por el llamador
+
+    for source in (data.encode('utf-8'), io.BytesIO(data.encode('utf-8')), text_stream):
+        assert CSVHandler.validate_csv(source, ['a', 'b'])['num_rows'] == 3
@@ -0,0 +1,51 @@
+"""
+Pruebas del modo de salida incremental: bytes originales intactos y solo
+los objetos modificados añadidos al final.
+"""
+
+import io
+
+from pypdf import PdfReader, PdfWriter
+
+from utils import PDFFiller
+
+
+def _xref_stream_form(form_pdf: str) -> bytes:
+    """Reescribe el formulario con una actualización cuya sección xref es un stream."""
+    writer = PdfWriter(form_pdf, incremental=True)
+    writer.add_metadata({'/Title': 'Formulario'})
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def test_incremental_output_keeps_original_bytes(form_pdf):
+    with open(form_pdf, 'rb') as f:
+        original = f.read()
+
+    filler = PDFFiller(original, verbose=False, incremental=True)
+    output = filler.fill_bytes({'p0_nombre': 'Ana', 'p2_acepto': 'sí'})
+
+    assert output.startswith(original)
+    assert output.endswith(b'%%EOF\n')
+    fields = PdfReader(io.BytesIO(output), strict=True).get_fields()
+    assert fields['p0_nombre']['/V'] == 'Ana'
+    assert fields['p2_acepto']['/V'] == '/On'
+
+    # Por defecto se sigue reescribiendo el documento completo
+    full = filler.fill_bytes({'p0_nombre': 'Ana'}, incremental=False)
+    assert not full.startswith(original)
+
+
+def test_incremental_output_on_xref_stream_document(form_pdf):
+    original = _xref_stream_form(form_pdf)
+
+    output = PDFFiller(original, verbose=False, incremental=True).fill_bytes({'p2_pais': 'Italia'})
+
+    update = output[len(original):]
+    assert output.startswith(original)
+    assert b'/Type /XRef' in update and b'trailer' not in update
+
+    reader = PdfReader(io.BytesIO(output), strict=True)
+    assert reader.get_fields()['p2_pais']['/V'] == 'Italia'
+    assert reader.metadata.title == 'Formulario'
@@ -0,0 +1,84 @@
+"""
+Pruebas de la cola de trabajos: ejecución en procesos worker, progreso y
+estado persistido en SQLite entre reinicios.
+"""
+
+import csv
+import io
+import os
+import signal
+import sqlite3
+import time
+import zipfile
+
+from utils.jobs import DONE, FAILED, JobQueue, RUNNING
+
+
+def test_batch_job_runs_in_worker_and_survives_restart(form_pdf, tmp_path):
+    with open(form_pdf, 'rb') as f:
+        pdf = f.read()
+    jobs_dir = str(tmp_path / 'jobs')
+    csv_data = 'Nombre,Dni\nAna,1\nLuis,2\n'.encode('utf-8')
+    mapping = 'Nombre → p0_nombre\nDni → p0_dni\n'.encode('utf-8')
+
+    queue = JobQueue(jobs_dir, workers=1)
+    job_id = queue.submit_batch(pdf, csv_data, mapping, name='form.pdf', owner='sesion')
+    broken_id = queue.submit_fill(b'no es un pdf', {'p0_nombre': 'x'}, owner='otra')
+
+    job = queue.wait(job_id, timeout=60)
+    assert job['status'] == DONE
+    assert (job['done'], job['total'], job['failed']) == (2, 2, 0)
+    assert queue.wait(broken_id, timeout=60)['status'] == FAILED
+    assert [j['id'] for j in queue.list_jobs(owner='sesion')] == [job_id]
+
+    with zipfile.ZipFile(queue.result_path(job_id)) as archive:
+        manifest = list(csv.DictReader(io.StringIO(archive.read('manifest.csv').decode('utf-8-sig'))))
+    assert [row['status'] for row in manifest] == ['ok', 'ok']
+    queue.close()
+
+    # Un trabajo interrumpido (p.ej. por un reinicio) se reanuda al reabrir la cola
+    conn = sqlite3.connect(str(tmp_path / 'jobs' / 'jobs.sqlite'))
+    conn.execute("UPDATE jobs SET status = ? WHERE id = ?", (RUNNING, job_id))
+    conn.commit()
+    conn.close()
+
+    queue = JobQueue(jobs_dir, workers=1)
+    assert queue.wait(job_id, timeout=60)['status'] == DONE
+    assert queue.get(broken_id)['status'] == FAILED
+    queue.close()
+
+
+def _kill_workers(queue: JobQueue) -> None:
+    """Mata los procesos worker del pool, como haría el OOM killer."""
+    for process in list(queue._executor._processes.values()):
+        os.kill(process.pid, signal.SIGKILL)
+        process.join(timeout=10)
+
+
+def test_dead_worker_fails_its_job_and_pool_is_rebuilt(form_pdf, tmp_path):
+    with open(form_pdf, 'rb') as f:
+        pdf = f.read()
+    csv_data = ('Nombre,Dni\n' + 'Ana,1\n' * 2000).encode('utf-8')
+    mapping = 'Nombre → p0_nombre\nDni → p0_dni\n'.encode('utf-8')
+    queue = JobQueue(str(tmp_path / 'jobs'), workers=1)
+
+    # Un worker muere en mitad de un trabajo: el trabajo queda como fallido
+    job_id = queue.submit_batch(pdf, csv_data, mapping, owner='sesion')
+    deadline = time.monotonic() + 60
+    while queue.get(job_id)['status'] != RUNNING and time.monotonic() < deadline:
+        time.sleep(0.01)
+    _kill_workers(queue)
+
+    job = queue.wait(job_id, timeout=60)
+    assert job['status'] == FAILED
+    assert 'worker' in job['error']
+
+    # Los trabajos siguientes se ejecutan en un pool nuevo
+    fill_id = queue.submit_fill(pdf, {'p0_nombre': 'Ana'})
+    assert queue.wait(fill_id, timeout=60)['status'] == DONE
+
+    # También si el worker muere estando inactivo
+    _kill_workers(queue)
+    fill_id = queue.submit_fill(pdf, {'p0_nombre': 'Luis'})
+    assert queue.wait(fill_id, timeout=60)['status'] == DONE
+    queue.close()
@@ -0,0 +1,55 @@
+"""
+Pruebas del mapeo JSON versionado: ida y vuelta por disco, compatibilidad
+con el formato de texto y uso de sus metadatos al compilar el template.
+"""
+
+from pypdf import PdfReader
+
+from utils import CSVHandler, PDFExtractor, PDFFiller
+
+
+def test_mapping_round_trip(form_pdf, tmp_path):
+    fields = PDFExtractor(form_pdf).get_fields_with_labels()
+    csv_path = str(tmp_path / 'plantilla.csv')
+    CSVHandler.generate_template(fields, csv_path)
+
+    json_path = tmp_path / 'plantilla_mapeo.json'
+    mapping = CSVHandler.load_mapping_data(str(json_path))
+    assert mapping['fields']['p0_acepto'] == {
+        'type': 'checkbox', 'options': [], 'export_values': ['/On'], 'required': False
+    }
+    assert mapping['fields']['p0_pais']['options'] == fields['p0_pais']['options']
+
+    # Un JSON guardado con BOM (editores de Windows) se lee igual
+    bom_path = tmp_path / 'con_bom_mapeo.json'
+    bom_path.write_bytes(b'\xef\xbb\xbf' + json_path.read_bytes())
+    assert CSVHandler.load_mapping_data(str(bom_path)) == mapping
+
+    # El formato de texto antiguo da las mismas etiquetas, sin metadatos
+    legacy = CSVHandler.load_mapping_data(str(tmp_path / 'plantilla_mapeo.txt'))
+    assert legacy['labels'] == mapping['labels']
+    assert legacy['fields'] == {}
+
+
+def test_filler_uses_mapping_metadata(form_pdf, tmp_path):
+    fields = PDFExtractor(form_pdf).get_fields_with_labels()
+    mapping = CSVHandler.load_mapping_data(
+        CSVHandler.build_template_files(fields)['mapeo.json']
+    )
+
+    detected = PDFFiller(form_pdf, verbose=False).template
+    filler = PDFFiller(form_pdf, verbose=False, field_info=mapping['fields'])
+    template = filler.template
+
+    # Los estados de los checkboxes vienen del mapeo (no se leen los /AP)
+    assert template.fields['p0_acepto']['known_states']
+    assert template.value_tables == detected.value_tables
+    for name, field in detected.fields.items():
+        assert template.fields[name]['type'] == field['type']
+        assert template.fields[name]['options'] == field['options']
+
+    output = str(tmp_path / 'salida.pdf')
+    assert filler.fill_pdf({'p0_acepto': '__YES__', 'p0_pais': 'Francia'}, output)
+    values = PdfReader(output).get_fields()
+    assert values['p0_acepto']['/V'] == '/On'
+    assert values['p0_pais']['/V'] == 'Francia'
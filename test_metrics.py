@@ -0,0 +1,75 @@
+"""
+Pruebas del módulo de métricas: registro de extracciones, rellenados y
+lotes, y exposición en formato de texto de Prometheus.
+"""
+
+import io
+import urllib.request
+
+import pytest
+
+from utils import PDFExtractor, PDFFiller, ParallelFiller, metrics
+from utils.field_cache import FieldCache
+
+
+@pytest.fixture
+def registry():
+    yield metrics.enable()
+    metrics.disable()
+
+
+def test_metrics_are_recorded_and_exposed(form_pdf, tmp_path, registry):
+    cache = FieldCache(str(tmp_path / 'campos.sqlite'))
+    PDFExtractor(form_pdf, cache=cache).get_fields_with_labels()
+    PDFExtractor(form_pdf, cache=cache).get_fields_with_labels()
+    cache.close()
+
+    filler = PDFFiller(form_pdf, verbose=False)
+    rows = [{'p0_nombre': 'Ana'}, {'p0_nombre': 'Ana'}, {'otro': 'x'}]
+    filler.fill_zip(rows, io.BytesIO())
+
+    text = metrics.render()
+    assert '# TYPE mcmpdf_fill_seconds histogram' in text
+    assert 'mcmpdf_fill_seconds_count{status="ok"} 2' in text
+    assert 'mcmpdf_fill_seconds_count{status="error"} 1' in text
+    assert 'mcmpdf_fill_seconds_bucket{status="ok",le="+Inf"} 2' in text
+    assert 'mcmpdf_fill_failures_total{error_class="NoMatchingFields"} 1' in text
+    assert 'mcmpdf_extract_seconds_count{cached="false"} 1' in text
+    assert 'mcmpdf_cache_requests_total{cache="fields",result="hit"} 1' in text
+    assert 'mcmpdf_cache_requests_total{cache="appearance",result="hit"} 1' in text
+    assert 'mcmpdf_template_pages_count 2' in text
+    assert 'mcmpdf_batch_rows_total{status="ok"} 2' in text
+    assert 'mcmpdf_batch_rows_per_second_count 1' in text
+
+    server = metrics.serve(0)
+    try:
+        url = f"http://127.0.0.1:{server.server_address[1]}/metrics"
+        with urllib.request.urlopen(url, timeout=10) as response:
+            assert response.headers['Content-Type'].startswith('text/plain; version=0.0.4')
+            assert b'mcmpdf_batch_seconds_count 1' in response.read()
+    finally:
+        server.shutdown()
+        server.server_close()
+
+    path = tmp_path / 'mcmpdf.prom'
+    metrics.write(str(path))
+    assert path.read_text(encoding='utf-8') == metrics.render()
+
+
+def test_metrics_are_disabled_by_default(form_pdf):
+    assert metrics.registry() is None
+    assert PDFFiller(form_pdf, verbose=False).fill_bytes({'p0_nombre': 'Ana'})
+    assert metrics.render() == ''
+
+
+def test_parallel_fills_are_recorded_in_the_parent(form_pdf, tmp_path, registry):
+    rows = [{'p0_nombre': 'Ana'}, {'p0_nombre': 'Luis'}, {'otro': 'x'}]
+    results = ParallelFiller(form_pdf, workers=2, chunksize=1).fill_batch(rows, str(tmp_path))
+
+    # Los resultados públicos no llevan el FillResult interno
+    assert all('fill_result' not in result for result in results)
+    text = metrics.render()
+    assert 'mcmpdf_fill_seconds_count{status="ok"} 2' in text
+    assert 'mcmpdf_fill_seconds_count{status="error"} 1' in text
+    assert 'mcmpdf_fill_failures_total{error_class="NoMatchingFields"} 1' in text
+    assert 'mcmpdf_batch_rows_total{status="ok"} 2' in text
@@ -0,0 +1,49 @@
+"""
+Pruebas de la carga del template con mmap: los PDFs se escriben como
+actualización incremental sobre los bytes originales.
+"""
+
+from pypdf import PdfReader
+
+from utils import PDFFiller
+
+
+def test_mmap_fill_appends_to_original_bytes(form_pdf, tmp_path):
+    with open(form_pdf, 'rb') as f:
+        original = f.read()
+
+    filler = PDFFiller(form_pdf, verbose=False, use_mmap=True)
+    first = str(tmp_path / 'primero.pdf')
+    second = str(tmp_path / 'segundo.pdf')
+
+    assert filler.fill_pdf({'p0_nombre': 'Ana', 'p0_acepto': 'sí', 'p2_pais': 'Francia'}, first)
+    assert filler.fill_pdf({'p2_nombre': 'Luis'}, second)
+
+    for path in (first, second):
+        with open(path, 'rb') as f:
+            output = f.read()
+        # El template se copia byte a byte y solo se añade lo modificado
+        assert output.startswith(original)
+        assert len(output) - len(original) < 4096
+
+    fields = PdfReader(first).get_fields()
+    assert fields['p0_nombre']['/V'] == 'Ana'
+    assert fields['p0_acepto']['/V'] == '/On'
+    assert fields['p2_pais']['/V'] == 'Francia'
+
+    # Los cambios de un rellenado no se arrastran al siguiente
+    fields = PdfReader(second).get_fields()
+    assert fields['p2_nombre']['/V'] == 'Luis'
+    assert fields['p0_nombre'].get('/V') is None
+    assert fields['p0_acepto']['/V'] == '/Off'
+
+
+def test_mmap_fill_can_flatten(form_pdf, tmp_path):
+    output = str(tmp_path / 'aplanado.pdf')
+    filler = PDFFiller(form_pdf, verbose=False, use_mmap=True)
+
+    assert filler.fill_pdf({'p2_dni': '12345678Z'}, output, flatten=True)
+
+    reader = PdfReader(output)
+    assert not reader.get_fields()
+    assert '12345678Z' in reader.pages[2].extract_text()
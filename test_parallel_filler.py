@@ -0,0 +1,41 @@
+"""
+Pruebas del rellenado en paralelo con procesos reales: orden de los
+resultados, errores por fila y bloques en vuelo limitados.
+"""
+
+import os
+
+from pypdf import PdfReader
+
+from utils import ParallelFiller
+
+
+def test_parallel_batch_keeps_order_and_reports_bad_rows(form_pdf, tmp_path):
+    bad_index = 5
+    total = 30
+    pulled = []
+
+    def rows():
+        for i in range(1, total + 1):
+            pulled.append(i)
+            yield {'campo_inexistente': 'x'} if i == bad_index else {'p0_nombre': f'Persona {i}'}
+
+    filler = ParallelFiller(form_pdf, workers=2, chunksize=2)
+    results = filler.iter_fill(rows(), str(tmp_path))
+
+    first = next(results)
+    # Solo se leen las filas de los bloques en vuelo (2 por worker)
+    assert len(pulled) <= 2 * filler.workers * filler.chunksize
+    results = [first] + list(results)
+
+    assert [r['index'] for r in results] == list(range(1, total + 1))
+    for result in results:
+        if result['index'] == bad_index:
+            assert not result['success']
+            assert 'coincide' in result['error']
+            assert not os.path.exists(result['output'])
+        else:
+            assert result['success'], result['error']
+            assert result['error'] is None
+            fields = PdfReader(result['output']).get_fields()
+            assert fields['p0_nombre']['/V'] == f"Persona {result['index']}"
@@ -0,0 +1,150 @@
+"""
+Pruebas del servicio HTTP: registro de templates, relleno por JSON,
+respuestas 405 y 503 (esta última sin leer el cuerpo de la petición) y
+espera de las copias de un template sin ocupar hilos del pool.
+"""
+
+import asyncio
+import io
+import json
+import threading
+import urllib.error
+import urllib.request
+import zipfile
+
+from pypdf import PdfReader
+
+from conftest import build_form_pdf
+from utils.service import FillService, TemplatePool
+
+
+def _request(url, data=None, content_type='application/json'):
+    request = urllib.request.Request(url, data=data, headers={'Content-Type': content_type})
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            return response.status, response.read()
+    except urllib.error.HTTPError as e:
+        return e.code, e.read()
+
+
+async def _raw_head(port, request_head):
+    """
+    Envía solo la línea de petición y las cabeceras (sin cuerpo) y devuelve
+    el estado y las cabeceras de la respuesta.
+    """
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    try:
+        writer.write(request_head.encode('latin-1'))
+        await writer.drain()
+        head = await asyncio.wait_for(reader.readuntil(b'\r\n\r\n'), timeout=10)
+    finally:
+        writer.close()
+    lines = head.decode('latin-1').split('\r\n')
+    headers = dict(line.split(': ', 1) for line in lines[1:] if ': ' in line)
+    return int(lines[0].split(' ')[1]), headers
+
+
+def test_register_and_fill_over_http(form_pdf):
+    with open(form_pdf, 'rb') as f:
+        pdf = f.read()
+
+    async def scenario():
+        service = FillService(TemplatePool(max_templates=2, replicas=2), max_concurrency=2)
+        server = await service.start('127.0.0.1', 0)
+        base = f"http://127.0.0.1:{server.sockets[0].getsockname()[1]}"
+        loop = asyncio.get_running_loop()
+
+        def call(path, data=None, content_type='application/json'):
+            return loop.run_in_executor(None, _request, base + path, data, content_type)
+
+        try:
+            status, body = await call('/templates', pdf, 'application/pdf')
+            assert status == 201
+            template_id = json.loads(body)['template_id']
+            assert 'p0_nombre' in json.loads(body)['fields']
+
+            # Peticiones concurrentes contra el mismo template
+            rows = [{'p0_nombre': f'Persona {i}', 'p0_acepto': True} for i in range(6)]
+            results = await asyncio.gather(*(
+                call(f'/templates/{template_id}/fill', json.dumps(row).encode()) for row in rows
+            ))
+            for i, (status, body) in enumerate(results):
+                assert status == 200
+                fields = PdfReader(io.BytesIO(body)).get_fields()
+                assert fields['p0_nombre'].get('/V') == f'Persona {i}'
+                assert fields['p0_acepto'].get('/V') == '/On'
+
+            status, body = await call(f'/templates/{template_id}/fill?flatten=1', json.dumps(rows[:2]).encode())
+            assert status == 200
+            assert len(zipfile.ZipFile(io.BytesIO(body)).namelist()) == 3
+
+            assert (await call('/templates/desconocido/fill', b'{}'))[0] == 404
+            assert (await call(f'/templates/{template_id}/fill', b'no json'))[0] == 400
+
+            # Métodos no admitidos: 405 con la cabecera Allow
+            port = server.sockets[0].getsockname()[1]
+            status, headers = await _raw_head(port, f'GET /templates/{template_id}/fill HTTP/1.1\r\n\r\n')
+            assert (status, headers['Allow']) == (405, 'POST')
+            status, headers = await _raw_head(port, f'DELETE /templates/{template_id} HTTP/1.1\r\n\r\n')
+            assert (status, headers['Allow']) == (405, 'GET')
+
+            # Saturado: se rechaza en lugar de encolar sin límite, y antes de
+            # recibir el cuerpo (aquí el cliente no llega a enviarlo)
+            service.pending = service.max_pending
+            status, headers = await _raw_head(
+                port, f'POST /templates/{template_id}/fill HTTP/1.1\r\nContent-Length: 1000000\r\n\r\n'
+            )
+            assert (status, headers['Retry-After']) == (503, '1')
+            service.pending = 0
+        finally:
+            server.close()
+            await server.wait_closed()
+            service.close()
+
+    asyncio.run(scenario())
+
+
+def test_waiting_for_a_busy_template_does_not_hold_fill_threads(form_pdf, tmp_path):
+    other_pdf = build_form_pdf(str(tmp_path / 'otro.pdf'), num_pages=1, field_pages=(0,))
+    pool = TemplatePool(max_templates=2, replicas=1)
+    with open(form_pdf, 'rb') as f:
+        busy_id = pool.register(f.read())['template_id']
+    with open(other_pdf, 'rb') as f:
+        other_id = pool.register(f.read())['template_id']
+
+    # La única copia del template ocupado se queda bloqueada rellenando
+    release = threading.Event()
+    busy_filler = pool.get(busy_id)._fillers[0]
+    fill_bytes = busy_filler.fill_bytes
+
+    def blocked_fill_bytes(*args, **kwargs):
+        release.wait(timeout=30)
+        return fill_bytes(*args, **kwargs)
+
+    busy_filler.fill_bytes = blocked_fill_bytes
+
+    async def scenario():
+        service = FillService(pool, max_concurrency=2)
+        server = await service.start('127.0.0.1', 0)
+        body = json.dumps({'p0_nombre': 'Ana'}).encode()
+        try:
+            # Una petición rellenando y dos esperando la copia del template
+            busy = [asyncio.create_task(service._dispatch('POST', f'/templates/{busy_id}/fill', body))
+                    for _ in range(3)]
+            await asyncio.sleep(0.2)
+
+            status, data, content_type, _ = await asyncio.wait_for(
+                service._dispatch('POST', f'/templates/{other_id}/fill', body), timeout=10
+            )
+            assert (status, content_type) == (200, 'application/pdf')
+            assert not any(task.done() for task in busy)
+
+            release.set()
+            assert [result[0] for result in await asyncio.gather(*busy)] == [200, 200, 200]
+        finally:
+            release.set()
+            server.close()
+            await server.wait_closed()
+            service.close()
+
+    asyncio.run(scenario())
@@ -0,0 +1,80 @@
+"""
+Pruebas del template compilado: tablas de campos, widgets y valores, y
+aplicación de valores sobre los writers de new_writer().
+"""
+
+import io
+
+from pypdf import PdfReader, PdfWriter
+
+from utils.incremental import IncrementalWriter
+from utils.template import CompiledTemplate
+
+
+def _write(writer) -> bytes:
+    buffer = io.BytesIO()
+    writer.write(buffer)
+    return buffer.getvalue()
+
+
+def test_compiled_tables(form_pdf):
+    template = CompiledTemplate(form_pdf)
+
+    assert template.field_names == {
+        f'p{page}_{name}' for page in (0, 2) for name in ('nombre', 'apellido', 'dni', 'acepto', 'pais')
+    }
+    assert template.fields['p0_nombre']['type'] == 'text'
+    assert template.fields['p2_pais']['type'] == 'dropdown'
+    assert template.fields['p2_pais']['options'] == ['España', 'Francia', 'Italia']
+    assert template.fields['p0_acepto']['states'] == ['/On']
+
+    # Widgets por (página, índice en /Annots); la página 1 no tiene ninguno
+    assert template.fields['p2_pais']['widgets'] == [(2, 4)]
+    assert sorted(template.widgets_by_page) == [0, 2]
+    assert template.widgets_by_page[0][0] == (0, 'p0_nombre')
+
+    # Maquetación precalculada solo para texto y desplegables
+    layout = template.widget_layout[(0, 0)]
+    assert (layout['width'], layout['height'], layout['font'], layout['size']) == (200, 20, 'Helv', 10)
+    assert (0, 3) not in template.widget_layout
+
+    # Tablas de valores solo para checkboxes y radios
+    assert set(template.value_tables) == {'p0_acepto', 'p2_acepto'}
+    assert template.coerce('p0_acepto', ' sí ') == '/On'
+    assert template.coerce('p0_acepto', 'on') == '/On'
+    assert template.coerce('p0_acepto', 'no') == '/Off'
+    assert template.coerce('p0_nombre', 'sí') == 'sí'
+
+    assert template.pages_for({'p0_nombre': 'Ana', 'p2_dni': '1'}) == {
+        0: {'p0_nombre': 'Ana'}, 2: {'p2_dni': '1'}
+    }
+
+
+def test_apply_values_and_fill(form_pdf):
+    template = CompiledTemplate(form_pdf)
+    data = {'p0_nombre': 'Ana', 'p0_acepto': '/On', 'p2_pais': 'Francia'}
+
+    writer = template.new_writer()
+    assert isinstance(writer, PdfWriter)
+    assert template.apply_values(writer, data) == 3
+
+    fields = PdfReader(io.BytesIO(_write(writer))).get_fields()
+    assert fields['p0_nombre']['/V'] == 'Ana'
+    assert fields['p0_acepto']['/V'] == '/On'
+    assert fields['p2_pais']['/V'] == 'Francia'
+    assert fields['p0_apellido'].get('/V') in (None, '')
+
+    # fill() ignora los nombres que no existen en el template
+    fields = PdfReader(io.BytesIO(_write(template.fill({'p0_dni': '7', 'otro': 'x'})))).get_fields()
+    assert fields['p0_dni']['/V'] == '7'
+    assert 'otro' not in fields
+
+    # El writer incremental conserva los bytes del template y añade los cambios
+    with open(form_pdf, 'rb') as f:
+        original = f.read()
+    incremental = template.new_writer(incremental=True)
+    assert isinstance(incremental, IncrementalWriter)
+    template.apply_values(incremental, {'p0_nombre': 'Luis'})
+    output = _write(incremental)
+    assert output.startswith(original)
+    assert PdfReader(io.BytesIO(output)).get_fields()['p0_nombre']['/V'] == 'Luis'
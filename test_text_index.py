@@ -0,0 +1,79 @@
+"""
+Pruebas del índice en rejilla: debe dar el mismo texto que la búsqueda
+lineal sobre todos los textos de la página.
+"""
+
+import random
+
+from utils.text_index import TextGrid
+
+
+def _brute_force(text_elements, field_rect):
+    """Búsqueda lineal con la misma puntuación; los empates los gana el primero."""
+    field_left, field_bottom, field_right, field_top = field_rect
+    field_center_x = (field_left + field_right) / 2
+    field_center_y = (field_bottom + field_top) / 2
+
+    best_text, best_distance = None, None
+    for elem in text_elements:
+        text, x, y = elem['text'], elem['x'], elem['y']
+        if len(text) < 2 or text.isdigit():
+            continue
+
+        distance = abs(x - field_left) + abs(y - field_center_y)
+        if x < field_left and abs(y - field_center_y) < 50:
+            distance *= 0.5
+        elif y > field_top and abs(x - field_center_x) < 100:
+            distance *= 0.7
+
+        if best_distance is None or distance < best_distance:
+            best_text, best_distance = text, distance
+    return best_text
+
+
+def test_grid_matches_brute_force():
+    rng = random.Random(1234)
+
+    for _ in range(200):
+        # Coordenadas enteras en una rejilla gruesa para forzar empates
+        step = rng.choice([1, 25, 50])
+        text_elements = [
+            {'text': rng.choice(['Nombre:', 'DNI', 'x', '42', f'Texto {i}']),
+             'x': rng.randrange(0, 612, step), 'y': rng.randrange(0, 792, step)}
+            for i in range(rng.randint(0, 40))
+        ]
+        grid = TextGrid(text_elements, cell_size=rng.choice([10.0, 50.0, 120.0]))
+
+        for _ in range(10):
+            left = rng.randrange(-50, 650, step)
+            bottom = rng.randrange(-50, 830, step)
+            field_rect = (left, bottom, left + rng.choice([15, 200]), bottom + rng.choice([15, 20]))
+
+            assert grid.nearest(field_rect) == _brute_force(text_elements, field_rect)
+
+
+def test_grid_ties_go_to_first_text():
+    text_elements = [
+        {'text': 'Primero', 'x': 100, 'y': 710},
+        {'text': 'Segundo', 'x': 100, 'y': 690},
+    ]
+
+    # Ambos textos a la misma distancia ponderada del campo
+    assert TextGrid(text_elements).nearest((200, 690, 400, 710)) == 'Primero'
+    assert TextGrid(text_elements[::-1]).nearest((200, 690, 400, 710)) == 'Segundo'
+
+
+def test_grid_ties_across_rings_go_to_first_text():
+    # Con celdas de 50, "Cerca" está en la celda del campo y "Lejos",
+    # a la izquierda, dos anillos más allá, pero con la misma puntuación (30)
+    field_rect = (100, 90, 300, 110)
+    text_elements = [
+        {'text': 'Lejos', 'x': 40, 'y': 100},
+        {'text': 'Cerca', 'x': 130, 'y': 100},
+    ]
+
+    for elements in (text_elements, text_elements[::-1]):
+        for cell_size in (10.0, 30.0, 50.0):
+            expected = _brute_force(elements, field_rect)
+            assert expected == elements[0]['text']
+            assert TextGrid(elements, cell_size=cell_size).nearest(field_rect) == expected
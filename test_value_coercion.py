@@ -0,0 +1,26 @@
+"""
+Pruebas de las tablas de conversión de valores del template compilado.
+"""
+
+from pypdf import PdfReader
+
+from utils import PDFFiller
+
+
+def test_checkbox_uses_real_on_state(form_pdf, tmp_path):
+    filler = PDFFiller(form_pdf, verbose=False)
+    output = str(tmp_path / 'salida.pdf')
+
+    assert filler.fill_pdf({'p0_nombre': 'Ana', 'p0_acepto': '__YES__', 'p2_acepto': 'no'}, output)
+
+    fields = PdfReader(output).get_fields()
+    assert fields['p0_acepto']['/V'] == '/On'
+    assert fields['p2_acepto']['/V'] == '/Off'
+
+
+def test_text_fields_keep_checkbox_like_values(form_pdf):
+    filler = PDFFiller(form_pdf, verbose=False)
+
+    processed = filler._process_data({'p0_dni': '1', 'p0_nombre': 'X', 'p0_acepto': 'sí'})
+
+    assert processed == {'p0_dni': '1', 'p0_nombre': 'X', 'p0_acepto': '/On'}
@@ -1,9 +1,35 @@
 """
 Utils para PDF Form Filler.
+
+Las clases se importan bajo demanda: ``from utils import PDFFiller`` solo
+carga el módulo del rellenador (y pypdf), sin arrastrar el resto del paquete.
 """
 
-from .pdf_extractor import PDFExtractor
-from .csv_handler import CSVHandler
-from .pdf_filler import PDFFiller
+# Nombre exportado -> módulo que lo define
+_EXPORTS = {
+    'PDFExtractor': 'pdf_extractor',
+    'CSVHandler': 'csv_handler',
+    'PDFFiller': 'pdf_filler',
+    'ParallelFiller': 'parallel_filler',
+    'CompiledTemplate': 'template',
+    'FillResult': 'fill_result',
+}
+
+__all__ = list(_EXPORTS)
+
+
+def __getattr__(name):
+    """Importa la clase pedida la primera vez que se accede a ella."""
+    module_name = _EXPORTS.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    # __import__ (y no importlib) para que -X importtime registre el módulo
+    module = __import__(f"{__name__}.{module_name}", fromlist=[name])
+    value = getattr(module, name)
+    globals()[name] = value
+    return value
+
 
-__all__ = ['PDFExtractor', 'CSVHandler', 'PDFFiller']
+def __dir__():
+    return sorted(set(globals()) | set(__all__))
@@ -0,0 +1,235 @@
+"""
+Módulo para generar las apariencias (/AP) de los campos de texto y desplegables.
+"""
+
+from collections import OrderedDict
+from typing import Tuple
+import re
+
+
+# Tamaño de letra cuando /DA pide tamaño automático (0)
+AUTO_FONT_SIZE = 12.0
+# Margen interior del texto dentro del widget, en puntos
+PADDING = 2.0
+# Ancho medio aproximado de un carácter en Helvetica, en fracción del tamaño
+AVG_CHAR_WIDTH = 0.5
+
+_DA_FONT = re.compile(r'/([^\s/]+)\s+([\d.]+)\s+Tf')
+
+
+def parse_da(da: str) -> Tuple[str, float, str]:
+    """
+    Extrae fuente, tamaño y color de una cadena /DA.
+
+    Args:
+        da: Cadena de apariencia por defecto, p.ej. ``'/Helv 10 Tf 0 g'``
+
+    Returns:
+        Tupla (nombre de fuente sin barra, tamaño, operadores de color)
+    """
+    match = _DA_FONT.search(da or '')
+    if not match:
+        return 'Helv', 0.0, '0 g'
+
+    font_name = match.group(1)
+    font_size = float(match.group(2))
+    color = (da[:match.start()] + da[match.end():]).strip() or '0 g'
+    return font_name, font_size, color
+
+
+def escape_text(text: str) -> bytes:
+    """
+    Codifica un texto como cadena literal PDF, escapando ``\\``, ``(`` y ``)``.
+
+    Las fuentes estándar usan WinAnsiEncoding; los caracteres no
+    representables se sustituyen por ``?``.
+
+    Args:
+        text: Texto a escribir
+
+    Returns:
+        Cadena PDF entre paréntesis
+    """
+    raw = text.encode('cp1252', errors='replace')
+    raw = raw.replace(b'\\', b'\\\\').replace(b'(', b'\\(').replace(b')', b'\\)')
+    raw = raw.replace(b'\r', b'\\r').replace(b'\n', b'\\n')
+    return b'(' + raw + b')'
+
+
+def effective_font_size(font_size: float, height: float, multiline: bool) -> float:
+    """
+    Resuelve el tamaño de letra (los tamaños 0 son automáticos).
+
+    Args:
+        font_size: Tamaño pedido en /DA
+        height: Alto del widget
+        multiline: Si el campo es multilínea
+
+    Returns:
+        Tamaño de letra a usar
+    """
+    if font_size > 0:
+        return font_size
+    if multiline:
+        return AUTO_FONT_SIZE
+    return max(4.0, min(AUTO_FONT_SIZE, (height - 2 * PADDING) * 0.8))
+
+
+def stream_parts(width: float, height: float, font_name: str, font_size: float,
+                 color: str, multiline: bool = False) -> Tuple[bytes, bytes, float, float, float]:
+    """
+    Calcula las partes fijas del stream de apariencia de un widget.
+
+    Solo dependen de la geometría y de /DA, no del texto, así que pueden
+    reutilizarse para todos los valores que se escriban en widgets iguales.
+
+    Args:
+        width: Ancho del widget
+        height: Alto del widget
+        font_name: Nombre del recurso de fuente (sin barra)
+        font_size: Tamaño de letra (0 = automático)
+        color: Operadores de color de /DA
+        multiline: Si el campo es multilínea
+
+    Returns:
+        Tupla (prefijo, sufijo, tamaño efectivo, y de la primera línea, interlineado)
+    """
+    size = effective_font_size(font_size, height, multiline)
+
+    if multiline:
+        y = height - PADDING - size
+    else:
+        y = (height - size) / 2 + size * 0.22
+
+    prefix = (
+        f"/Tx BMC\nq\n{PADDING / 2:g} {PADDING / 2:g} {width - PADDING:g} {height - PADDING:g} re W n\n"
+        f"BT\n/{font_name} {size:g} Tf {color}\n"
+    ).encode('latin-1')
+    return prefix, b"ET\nQ\nEMC\n", size, y, size * 1.15
+
+
+def text_operators(text: str, width: float, size: float, y: float, leading: float,
+                   quadding: int = 0, multiline: bool = False) -> bytes:
+    """
+    Genera los operadores de posicionamiento y texto (``Td``/``Tj``).
+
+    Args:
+        text: Valor del campo
+        width: Ancho del widget
+        size: Tamaño de letra efectivo
+        y: Posición vertical de la primera línea
+        leading: Interlineado
+        quadding: Alineación /Q (0 izquierda, 1 centro, 2 derecha)
+        multiline: Si el campo es multilínea
+
+    Returns:
+        Bytes con los operadores de texto
+    """
+    lines = text.splitlines() if multiline else [text.replace('\n', ' ')]
+    parts = []
+
+    x_prev, y_prev = 0.0, 0.0
+    for line in lines or ['']:
+        line_width = len(line) * size * AVG_CHAR_WIDTH
+        if quadding == 1:
+            x = max(PADDING, (width - line_width) / 2)
+        elif quadding == 2:
+            x = max(PADDING, width - PADDING - line_width)
+        else:
+            x = PADDING
+
+        parts.append(f"{x - x_prev:.2f} {y - y_prev:.2f} Td ".encode('latin-1'))
+        parts.append(escape_text(line) + b" Tj\n")
+        x_prev, y_prev = x, y
+        y -= leading
+
+    return b''.join(parts)
+
+
+def text_stream(text: str, width: float, height: float, font_name: str,
+                font_size: float, color: str, quadding: int = 0,
+                multiline: bool = False) -> bytes:
+    """
+    Genera el contenido del stream de apariencia de un campo de texto.
+
+    Args:
+        text: Valor del campo
+        width: Ancho del widget
+        height: Alto del widget
+        font_name: Nombre del recurso de fuente (sin barra)
+        font_size: Tamaño de letra (0 = automático)
+        color: Operadores de color de /DA
+        quadding: Alineación /Q (0 izquierda, 1 centro, 2 derecha)
+        multiline: Si el campo es multilínea
+
+    Returns:
+        Bytes del stream de contenido
+    """
+    prefix, suffix, size, y, leading = stream_parts(width, height, font_name, font_size, color, multiline)
+    return prefix + text_operators(text, width, size, y, leading, quadding, multiline) + suffix
+
+
+class AppearanceCache:
+    """
+    Caché LRU de las partes fijas de los streams de apariencia.
+
+    La clave es (fuente, tamaño, color, ancho, alto, alineación, multilínea):
+    los widgets con la misma /DA y geometría comparten entrada, y en cada
+    rellenado solo se genera el operador de texto escapado.
+    """
+
+    def __init__(self, maxsize: int = 1024):
+        """
+        Inicializa la caché.
+
+        Args:
+            maxsize: Número máximo de entradas (las menos usadas se descartan)
+        """
+        self.maxsize = maxsize
+        self._entries: 'OrderedDict[tuple, Tuple[bytes, bytes, float, float, float]]' = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def render(self, text: str, width: float, height: float, font_name: str,
+               font_size: float, color: str, quadding: int = 0,
+               multiline: bool = False) -> bytes:
+        """
+        Igual que text_stream(), reutilizando las partes fijas cacheadas.
+
+        Args:
+            text: Valor del campo
+            width: Ancho del widget
+            height: Alto del widget
+            font_name: Nombre del recurso de fuente (sin barra)
+            font_size: Tamaño de letra (0 = automático)
+            color: Operadores de color de /DA
+            quadding: Alineación /Q (0 izquierda, 1 centro, 2 derecha)
+            multiline: Si el campo es multilínea
+
+        Returns:
+            Bytes del stream de contenido
+        """
+        key = (font_name, font_size, color, width, height, quadding, multiline)
+        entry = self._entries.get(key)
+
+        if entry is None:
+            self.misses += 1
+            entry = stream_parts(width, height, font_name, font_size, color, multiline)
+            self._entries[key] = entry
+            if len(self._entries) > self.maxsize:
+                self._entries.popitem(last=False)
+        else:
+            self.hits += 1
+            self._entries.move_to_end(key)
+
+        prefix, suffix, size, y, leading = entry
+        return prefix + text_operators(text, width, size, y, leading, quadding, multiline) + suffix
+
+    def clear(self) -> None:
+        """Vacía la caché y sus contadores."""
+        self._entries.clear()
+        self.hits = 0
+        self.misses = 0
@@ -0,0 +1,118 @@
+"""
+Módulo para empaquetar lotes de PDFs rellenados en un archivo ZIP.
+
+Cada PDF se genera en memoria y se copia a su entrada del ZIP solo si el
+rellenado termina bien (un fallo a medias no deja entradas truncadas), sin
+archivos temporales; al final se añade un manifiesto CSV con el resultado de
+cada fila.
+"""
+
+from typing import Any, BinaryIO, Callable, Dict, Iterable, Optional, Union
+import csv
+import io
+import logging
+import os
+import time
+import zipfile
+
+
+logger = logging.getLogger(__name__)
+
+
+MANIFEST_NAME = 'manifest.csv'
+MANIFEST_COLUMNS = ['index', 'output', 'status', 'error']
+
+
+def fill_zip(filler: Any, rows: Iterable[Dict[str, str]],
+             output: Union[str, os.PathLike, BinaryIO],
+             filename_pattern: str = 'documento_{index:05d}.pdf',
+             flatten: bool = False, preprocessed: bool = False,
+             incremental: Optional[bool] = None,
+             compression: int = zipfile.ZIP_DEFLATED,
+             progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+    """
+    Rellena un PDF por fila y los escribe en un ZIP, con un manifiesto CSV.
+
+    En memoria solo está el PDF que se está generando (y el manifiesto, una
+    línea por fila), así que ``rows`` puede ser un generador de cualquier
+    tamaño. Las filas que fallan no añaden entrada al ZIP.
+
+    Args:
+        filler: PDFFiller con el template
+        rows: Iterable de diccionarios {nombre_campo: valor}
+        output: Ruta del ZIP o stream binario donde escribirlo (no se cierra)
+        filename_pattern: Patrón del nombre de cada PDF (ver PDFFiller.fill_batch)
+        flatten: Si True, aplana cada PDF
+        preprocessed: Si True, las filas ya vienen normalizadas
+        incremental: Modo de escritura de cada PDF (ver PDFFiller.fill_pdf)
+        compression: Método de compresión del ZIP
+        progress: Función llamada con el resumen parcial tras cada fila
+
+    Returns:
+        Diccionario con {total, ok, failed, outputs, errors}; ``outputs`` son
+        los nombres de las entradas del ZIP y ``errors`` una lista de
+        (índice, nombre, error), como en PDFFiller.fill_batch
+    """
+    summary = {
+        'total': 0,
+        'ok': 0,
+        'failed': 0,
+        'outputs': [],
+        'errors': []
+    }
+    manifest = io.StringIO()
+    manifest_writer = csv.writer(manifest, lineterminator='\n')
+    manifest_writer.writerow(MANIFEST_COLUMNS)
+    used_names = {MANIFEST_NAME}
+
+    verbose = filler.verbose
+    filler.verbose = False
+    start = time.perf_counter()
+    buffer = io.BytesIO()
+
+    try:
+        with zipfile.ZipFile(output, 'w', compression=compression) as archive:
+            for index, row in enumerate(rows, start=1):
+                summary['total'] += 1
+                name = filler.build_output_name(filename_pattern, index, row, used_names)
+
+                buffer.seek(0)
+                buffer.truncate()
+                try:
+                    success = bool(filler.fill_pdf(row, buffer, flatten=flatten, preprocessed=preprocessed,
+                                                   incremental=incremental))
+                    error = None if success else filler.last_error
+                except Exception as e:
+                    success = False
+                    error = f"{type(e).__name__}: {e}"
+
+                if success:
+                    with archive.open(name, 'w', force_zip64=True) as entry:
+                        entry.write(buffer.getbuffer())
+                    summary['ok'] += 1
+                    summary['outputs'].append(name)
+                else:
+                    summary['failed'] += 1
+                    summary['errors'].append((index, name, error))
+
+                manifest_writer.writerow([
+                    index,
+                    name if success else '',
+                    'ok' if success else 'error',
+                    error or ''
+                ])
+
+                if progress is not None:
+                    progress(summary)
+                if verbose and index % 500 == 0:
+                    logger.info("%d filas procesadas (%d con error)", index, summary['failed'])
+
+            archive.writestr(MANIFEST_NAME, manifest.getvalue().encode('utf-8-sig'))
+    finally:
+        filler.verbose = verbose
+
+    from . import metrics
+    metrics.observe_batch(summary['total'], summary['failed'], time.perf_counter() - start)
+    if verbose:
+        logger.info("ZIP terminado: %d/%d PDFs generados", summary['ok'], summary['total'])
+    return summary
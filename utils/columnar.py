@@ -0,0 +1,200 @@
+"""
+Módulo de normalización de datos por columnas para rellenados por lotes.
+
+En lugar de procesar celda a celda al rellenar cada PDF, las filas del CSV se
+leen por bloques y cada columna se normaliza de una vez: vacíos/NaN, recorte
+de espacios, checkboxes a su estado PDF y validación de desplegables. Si
+pandas está instalado se usan sus operaciones vectorizadas; si no, una pasada
+por columna con la biblioteca estándar.
+"""
+
+from typing import Dict, List, Any, Iterator, Optional, Tuple
+import csv
+import itertools
+
+from .sources import Source, as_binary, open_text
+from .template import CompiledTemplate
+
+
+def _pandas():
+    """Devuelve el módulo pandas si está instalado (import diferido)."""
+    try:
+        import pandas
+        return pandas
+    except ImportError:
+        return None
+
+
+class ColumnNormalizer:
+    """Normaliza bloques de filas columna a columna usando los metadatos del template."""
+
+    def __init__(self, template: CompiledTemplate,
+                 label_to_technical: Optional[Dict[str, str]] = None,
+                 use_pandas: Optional[bool] = None):
+        """
+        Inicializa el normalizador.
+
+        Args:
+            template: Template compilado (tipos, opciones y tablas de valores)
+            label_to_technical: Mapeo etiqueta de columna -> nombre técnico
+            use_pandas: Forzar (True) o evitar (False) pandas; por defecto se
+                usa si está instalado
+        """
+        self.template = template
+        self.label_to_technical = label_to_technical or {}
+        self.pd = _pandas() if use_pandas is not False else None
+        if use_pandas and self.pd is None:
+            raise ImportError("pandas no está instalado")
+
+        # nombre técnico -> número de valores descartados por no ser una opción válida
+        self.invalid_counts: Dict[str, int] = {}
+
+    def _column_plan(self, labels: List[str]) -> List[Tuple[str, str, str, Any]]:
+        """
+        Decide cómo normalizar cada columna (se calcula una vez por cabecera).
+
+        Args:
+            labels: Columnas del CSV
+
+        Returns:
+            Lista de (etiqueta, nombre técnico, tipo, tabla/opciones)
+        """
+        plan = []
+        for label in labels:
+            name = self.label_to_technical.get(label, label)
+            field = self.template.fields.get(name)
+
+            if name in self.template.value_tables:
+                plan.append((label, name, 'state', self.template.value_tables[name]))
+            elif field is not None and field['type'] == 'dropdown' and field['options']:
+                plan.append((label, name, 'choice', frozenset(field['options'])))
+            else:
+                plan.append((label, name, 'text', None))
+        return plan
+
+    def normalize_columns(self, columns: Dict[str, List[Any]]) -> List[Dict[str, str]]:
+        """
+        Normaliza un bloque de datos en formato columnar.
+
+        Args:
+            columns: Diccionario {etiqueta: lista de valores}; todas las
+                listas con la misma longitud
+
+        Returns:
+            Lista de filas {nombre técnico: valor} listas para rellenar
+            (sin valores vacíos)
+        """
+        if self.pd is not None:
+            return self.normalize_frame(self.pd.DataFrame(columns, dtype=object))
+
+        plan = self._column_plan(list(columns))
+        normalized = {}
+
+        for label, name, kind, extra in plan:
+            values = [
+                '' if value is None or value != value else str(value).strip()
+                for value in columns[label]
+            ]
+
+            if kind == 'state':
+                values = [extra.get(value.upper(), value) if value else '' for value in values]
+            elif kind == 'choice':
+                invalid = sum(1 for value in values if value and value not in extra)
+                if invalid:
+                    self.invalid_counts[name] = self.invalid_counts.get(name, 0) + invalid
+                    values = [value if value in extra else '' for value in values]
+
+            normalized[name] = values
+
+        return self._to_rows(normalized)
+
+    def normalize_frame(self, df: Any) -> List[Dict[str, str]]:
+        """
+        Normaliza un DataFrame de pandas con operaciones vectorizadas.
+
+        Args:
+            df: DataFrame con columnas = etiquetas del CSV
+
+        Returns:
+            Lista de filas {nombre técnico: valor} listas para rellenar
+            (sin valores vacíos)
+        """
+        plan = self._column_plan([str(column) for column in df.columns])
+        normalized = {}
+
+        for (label, name, kind, extra), column in zip(plan, df.columns):
+            values = df[column].fillna('').astype(str).str.strip()
+
+            if kind == 'state':
+                mapped = values.str.upper().map(extra)
+                values = mapped.where(mapped.notna(), values)
+            elif kind == 'choice':
+                valid = values.isin(extra) | (values == '')
+                invalid = int((~valid).sum())
+                if invalid:
+                    self.invalid_counts[name] = self.invalid_counts.get(name, 0) + invalid
+                    values = values.where(valid, '')
+
+            normalized[name] = values.tolist()
+
+        return self._to_rows(normalized)
+
+    @staticmethod
+    def _to_rows(normalized: Dict[str, List[str]]) -> List[Dict[str, str]]:
+        """
+        Convierte columnas normalizadas en filas, descartando vacíos.
+
+        Args:
+            normalized: Diccionario {nombre técnico: lista de valores}
+
+        Returns:
+            Lista de filas {nombre técnico: valor}
+        """
+        names = list(normalized)
+        return [
+            {name: value for name, value in zip(names, values) if value}
+            for values in zip(*normalized.values())
+        ]
+
+    def iter_rows(self, csv_path: Source, chunksize: int = 5000) -> Iterator[Dict[str, str]]:
+        """
+        Lee el CSV por bloques y devuelve filas normalizadas una a una.
+
+        Args:
+            csv_path: Ruta al CSV (columnas = etiquetas), sus bytes o un
+                objeto tipo archivo
+            chunksize: Filas por bloque
+
+        Yields:
+            Filas {nombre técnico: valor} listas para rellenar
+        """
+        if self.pd is not None:
+            source = as_binary(csv_path)
+            if hasattr(source, 'seek'):
+                source.seek(0)
+            chunks = self.pd.read_csv(
+                source, encoding='utf-8-sig', dtype=str,
+                keep_default_na=False, chunksize=chunksize
+            )
+            for chunk in chunks:
+                yield from self.normalize_frame(chunk)
+            return
+
+        with open_text(csv_path) as f:
+            reader = csv.reader(f)
+            labels = next(reader, [])
+            while True:
+                raw_block = list(itertools.islice(reader, chunksize))
+                if not raw_block:
+                    break
+                # Las líneas en blanco (o solo con espacios, como hace pandas)
+                # se descartan, pero no terminan la lectura: un bloque solo con
+                # líneas en blanco no es el final del archivo
+                block = [row for row in raw_block if row and (len(row) > 1 or row[0].strip())]
+                if not block:
+                    continue
+                columns = {
+                    label: [row[i] if i < len(row) else '' for row in block]
+                    for i, label in enumerate(labels)
+                }
+                yield from self.normalize_columns(columns)
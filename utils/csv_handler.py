@@ -2,25 +2,59 @@
 Módulo para generar y leer plantillas CSV.
 """
 
-import pandas as pd
-from typing import Dict, List, Any
+import csv
+import io
+import json
+import os
+from functools import lru_cache
+from typing import Dict, List, Any, Iterator
+
+from .sources import Source, display_name, is_path, open_text, read_bytes
+
+
+# Identificador y versión del formato de mapeo JSON (_mapeo.json)
+MAPPING_FORMAT = 'mcmautopdf-mapping'
+MAPPING_VERSION = 1
+
+
+@lru_cache(maxsize=32)
+def _load_mapping_cached(mapping_path: str, mtime_ns: int, size: int) -> Dict[str, Any]:
+    """
+    Lee y parsea un archivo de mapeo una sola vez por versión del archivo.
+
+    La fecha de modificación y el tamaño forman parte de la clave, de modo
+    que un archivo reescrito se vuelve a leer.
+
+    Args:
+        mapping_path: Ruta al archivo de mapeo (.json o .txt)
+        mtime_ns: Fecha de modificación del archivo
+        size: Tamaño del archivo
+
+    Returns:
+        Diccionario {labels: {etiqueta: nombre}, fields: {nombre: metadatos}}
+    """
+    # utf-8-sig: los editores de Windows suelen guardar el JSON con BOM
+    with open(mapping_path, 'r', encoding='utf-8-sig') as f:
+        if mapping_path.lower().endswith('.json'):
+            return CSVHandler._parse_mapping_json(f.read())
+        return CSVHandler._parse_mapping_text(f)
 
 
 class CSVHandler:
     """Maneja la generación y lectura de plantillas CSV."""
 
     @staticmethod
-    def generate_template(fields: Dict[str, Any], output_path: str) -> None:
+    def _label_mapping(fields: Dict[str, Any]) -> Dict[str, str]:
         """
-        Genera un CSV template usando las etiquetas detectadas de los campos.
+        Asigna a cada campo una etiqueta de columna única.
 
         Args:
             fields: Diccionario de campos {nombre: {tipo, valor, opciones, label, ...}}
-            output_path: Ruta donde guardar el CSV
+
+        Returns:
+            Diccionario etiqueta -> nombre técnico (en el orden de los campos)
         """
-        # Crear mapeo de etiquetas a nombres técnicos
         label_to_technical = {}
-        labels = []
 
         for field_name, field_data in fields.items():
             label = field_data.get('label', field_name)
@@ -28,13 +62,28 @@ class CSVHandler:
             # Si hay duplicados, agregar número
             original_label = label
             counter = 2
-            while label in labels:
+            while label in label_to_technical:
                 label = f"{original_label} {counter}"
                 counter += 1
 
-            labels.append(label)
             label_to_technical[label] = field_name
 
+        return label_to_technical
+
+    @staticmethod
+    def build_template_files(fields: Dict[str, Any], include_info: bool = False) -> Dict[str, bytes]:
+        """
+        Genera en memoria la plantilla CSV y sus archivos de mapeo.
+
+        Args:
+            fields: Diccionario de campos {nombre: {tipo, valor, opciones, label, ...}}
+            include_info: Si True, incluye también el archivo de información
+
+        Returns:
+            Diccionario {'plantilla.csv', 'mapeo.txt', 'mapeo.json'[, 'info.txt']: bytes}
+        """
+        label_to_technical = CSVHandler._label_mapping(fields)
+
         # Crear fila de ejemplo
         example_row = {}
         for label, field_name in label_to_technical.items():
@@ -48,17 +97,128 @@ class CSVHandler:
             else:
                 example_row[label] = ''
 
-        # Crear DataFrame y guardar
-        df = pd.DataFrame([example_row])
-        df.to_csv(output_path, index=False, encoding='utf-8-sig')
+        # CSV (cabecera + fila de ejemplo)
+        csv_buffer = io.StringIO()
+        writer = csv.DictWriter(csv_buffer, fieldnames=list(example_row.keys()), lineterminator='\n')
+        writer.writeheader()
+        writer.writerow(example_row)
+
+        # Mapeo en texto, para referencia
+        mapping_lines = [
+            "=== MAPEO DE CAMPOS ===\n",
+            "Mapeo automático de etiquetas a nombres técnicos del PDF\n\n"
+        ]
+        for label, tech_name in label_to_technical.items():
+            mapping_lines.append(f"{label} → {tech_name}\n")
+
+        files = {
+            'plantilla.csv': csv_buffer.getvalue().encode('utf-8-sig'),
+            'mapeo.txt': ''.join(mapping_lines).encode('utf-8'),
+            # Mapeo completo (con tipos y opciones) en formato JSON
+            'mapeo.json': CSVHandler.mapping_json_text(label_to_technical, fields).encode('utf-8')
+        }
+        if include_info:
+            files['info.txt'] = CSVHandler._info_text(fields).encode('utf-8')
+        return files
+
+    @staticmethod
+    def generate_template(fields: Dict[str, Any], output_path: str) -> None:
+        """
+        Genera un CSV template usando las etiquetas detectadas de los campos.
+
+        Junto al CSV se guardan ``_mapeo.txt`` y ``_mapeo.json``.
+
+        Args:
+            fields: Diccionario de campos {nombre: {tipo, valor, opciones, label, ...}}
+            output_path: Ruta donde guardar el CSV
+        """
+        files = CSVHandler.build_template_files(fields)
+
+        with open(output_path, 'wb') as f:
+            f.write(files['plantilla.csv'])
+        with open(output_path.replace('.csv', '_mapeo.txt'), 'wb') as f:
+            f.write(files['mapeo.txt'])
+        with open(output_path.replace('.csv', '_mapeo.json'), 'wb') as f:
+            f.write(files['mapeo.json'])
+
+    @staticmethod
+    def mapping_json_text(label_to_technical: Dict[str, str], fields: Dict[str, Any]) -> str:
+        """
+        Serializa el mapeo en formato JSON versionado.
+
+        Además de la etiqueta y el nombre técnico, cada campo lleva su tipo,
+        sus opciones y los valores de exportación de checkboxes/radios.
+
+        Args:
+            label_to_technical: Mapeo etiqueta -> nombre técnico
+            fields: Diccionario de campos (resultado de get_fields_with_labels)
+
+        Returns:
+            Texto JSON compacto
+        """
+        entries = []
+        for label, field_name in label_to_technical.items():
+            field_data = fields.get(field_name, {})
+            entries.append({
+                'label': label,
+                'name': field_name,
+                'type': field_data.get('type', 'unknown'),
+                'options': list(field_data.get('options') or []),
+                'export_values': list(field_data.get('export_values') or []),
+                'required': bool(field_data.get('required', False))
+            })
+
+        return json.dumps({
+            'format': MAPPING_FORMAT,
+            'version': MAPPING_VERSION,
+            'fields': entries
+        }, ensure_ascii=False, separators=(',', ':'))
 
-        # Guardar mapeo en archivo adicional para referencia
-        mapping_path = output_path.replace('.csv', '_mapeo.txt')
+    @staticmethod
+    def write_mapping_json(label_to_technical: Dict[str, str], fields: Dict[str, Any],
+                           mapping_path: str) -> None:
+        """
+        Guarda el mapeo en formato JSON versionado (ver mapping_json_text).
+
+        Args:
+            label_to_technical: Mapeo etiqueta -> nombre técnico
+            fields: Diccionario de campos (resultado de get_fields_with_labels)
+            mapping_path: Ruta donde guardar el JSON
+        """
         with open(mapping_path, 'w', encoding='utf-8') as f:
-            f.write("=== MAPEO DE CAMPOS ===\n")
-            f.write("Mapeo automático de etiquetas a nombres técnicos del PDF\n\n")
-            for label, tech_name in label_to_technical.items():
-                f.write(f"{label} → {tech_name}\n")
+            f.write(CSVHandler.mapping_json_text(label_to_technical, fields))
+
+    @staticmethod
+    def _info_text(fields: Dict[str, Any]) -> str:
+        """
+        Genera el texto del archivo de información de campos.
+
+        Args:
+            fields: Diccionario de campos
+
+        Returns:
+            Texto con tipo, obligatoriedad y valores admitidos de cada campo
+        """
+        lines = ["=== INFORMACIÓN DE CAMPOS ===\n\n"]
+
+        for field_name, field_data in fields.items():
+            label = field_data.get('label', field_name)
+
+            lines.append(f"📝 {label}\n")
+            lines.append(f"   Nombre técnico: {field_name}\n")
+            lines.append(f"   Tipo: {field_data['type']}\n")
+
+            if field_data.get('required'):
+                lines.append(f"   ⚠️  CAMPO REQUERIDO\n")
+
+            if field_data['type'] == 'checkbox':
+                lines.append(f"   Valores: __YES__ o __NO__\n")
+            elif field_data['type'] == 'dropdown' and field_data['options']:
+                lines.append(f"   Opciones: {', '.join(field_data['options'])}\n")
+
+            lines.append("\n")
+
+        return ''.join(lines)
 
     @staticmethod
     def generate_template_with_info(fields: Dict[str, Any], output_path: str) -> None:
@@ -75,67 +235,129 @@ class CSVHandler:
         # Añadir archivo de información adicional
         info_path = output_path.replace('.csv', '_info.txt')
         with open(info_path, 'w', encoding='utf-8') as f:
-            f.write("=== INFORMACIÓN DE CAMPOS ===\n\n")
+            f.write(CSVHandler._info_text(fields))
+
+    @staticmethod
+    def load_mapping_data(mapping_path: Source) -> Dict[str, Any]:
+        """
+        Lee un archivo de mapeo (.json o .txt) con caché.
+
+        El archivo se parsea una sola vez mientras no cambie; las llamadas
+        siguientes devuelven el resultado memorizado. No modificar el
+        diccionario devuelto. Los mapeos en memoria (bytes u objetos tipo
+        archivo) se parsean en cada llamada; el formato JSON se reconoce por
+        la extensión de ``name`` o por el contenido.
+
+        Args:
+            mapping_path: Ruta al archivo de mapeo, sus bytes o un objeto
+                tipo archivo
+
+        Returns:
+            Diccionario {labels: {etiqueta: nombre}, fields: {nombre: {type,
+            options, export_values, required}}}. Los mapeos .txt no tienen
+            metadatos de campo (``fields`` vacío).
+        """
+        try:
+            if not is_path(mapping_path):
+                text = read_bytes(mapping_path).decode('utf-8-sig')
+                if display_name(mapping_path).lower().endswith('.json') or text.lstrip().startswith('{'):
+                    return CSVHandler._parse_mapping_json(text)
+                return CSVHandler._parse_mapping_text(text.splitlines())
+
+            stat = os.stat(mapping_path)
+            return _load_mapping_cached(os.path.abspath(mapping_path), stat.st_mtime_ns, stat.st_size)
+        except Exception as e:
+            raise ValueError(f"Error al leer archivo de mapeo: {e}")
+
+    @staticmethod
+    def load_mapping(mapping_path: Source) -> Dict[str, str]:
+        """
+        Lee el archivo de mapeo etiqueta → nombre técnico.
 
-            for field_name, field_data in fields.items():
-                label = field_data.get('label', field_name)
+        Args:
+            mapping_path: Ruta al archivo de mapeo (.json o .txt), sus bytes
+                o un objeto tipo archivo
+
+        Returns:
+            Diccionario con etiqueta -> nombre técnico
+        """
+        return dict(CSVHandler.load_mapping_data(mapping_path)['labels'])
 
-                f.write(f"📝 {label}\n")
-                f.write(f"   Nombre técnico: {field_name}\n")
-                f.write(f"   Tipo: {field_data['type']}\n")
+    @staticmethod
+    def _parse_mapping_text(lines) -> Dict[str, Any]:
+        """
+        Parsea el mapeo en texto (``etiqueta → nombre_técnico`` por línea).
 
-                if field_data.get('required'):
-                    f.write(f"   ⚠️  CAMPO REQUERIDO\n")
+        Se separa por la última flecha, así que las etiquetas que contienen
+        "→" se conservan.
 
-                if field_data['type'] == 'checkbox':
-                    f.write(f"   Valores: __YES__ o __NO__\n")
-                elif field_data['type'] == 'dropdown' and field_data['options']:
-                    f.write(f"   Opciones: {', '.join(field_data['options'])}\n")
+        Args:
+            lines: Iterable de líneas del archivo
+
+        Returns:
+            Diccionario {labels, fields} (fields vacío)
+        """
+        label_to_technical = {}
+        for line in lines:
+            line = line.strip()
+            if '→' in line:
+                label, tech_name = line.rsplit('→', 1)
+                label = label.strip()
+                tech_name = tech_name.strip()
+                if label and tech_name:
+                    label_to_technical[label] = tech_name
 
-                f.write("\n")
+        return {'labels': label_to_technical, 'fields': {}}
 
     @staticmethod
-    def read_csv_with_mapping(csv_path: str, mapping_path: str) -> Dict[str, str]:
+    def _parse_mapping_json(text: str) -> Dict[str, Any]:
         """
-        Lee un CSV y lo convierte usando el archivo de mapeo.
+        Parsea el mapeo en formato JSON.
 
         Args:
-            csv_path: Ruta al CSV con datos
-            mapping_path: Ruta al archivo de mapeo
+            text: Contenido del archivo
 
         Returns:
-            Diccionario con nombres técnicos -> valores
+            Diccionario {labels, fields}
         """
-        # Leer mapeo
+        data = json.loads(text)
+        if data.get('format') != MAPPING_FORMAT:
+            raise ValueError("El archivo no es un mapeo de PDF Form Filler")
+        if data.get('version', 0) > MAPPING_VERSION:
+            raise ValueError(f"Versión de mapeo no soportada: {data.get('version')}")
+
         label_to_technical = {}
-        try:
-            with open(mapping_path, 'r', encoding='utf-8') as f:
-                for line in f:
-                    line = line.strip()
-                    if '→' in line:
-                        parts = line.split('→')
-                        if len(parts) == 2:
-                            label = parts[0].strip()
-                            tech_name = parts[1].strip()
-                            label_to_technical[label] = tech_name
-        except Exception as e:
-            raise ValueError(f"Error al leer archivo de mapeo: {e}")
+        field_info = {}
+        for entry in data.get('fields', []):
+            label_to_technical[entry['label']] = entry['name']
+            field_info[entry['name']] = {
+                'type': entry.get('type', 'unknown'),
+                'options': entry.get('options', []),
+                'export_values': entry.get('export_values', []),
+                'required': entry.get('required', False)
+            }
 
-        # Leer CSV
-        df = pd.read_csv(csv_path, encoding='utf-8-sig')
-        if len(df) == 0:
-            return {}
+        return {'labels': label_to_technical, 'fields': field_info}
 
-        # Obtener primera fila
-        row_data = df.iloc[0].to_dict()
+    @staticmethod
+    def _row_to_technical(row_data: Dict[str, Any],
+                          label_to_technical: Dict[str, str]) -> Dict[str, str]:
+        """
+        Convierte una fila del CSV (etiquetas) a nombres técnicos.
 
-        # Convertir a nombres técnicos
+        Args:
+            row_data: Fila del CSV {etiqueta: valor}
+            label_to_technical: Mapeo etiqueta -> nombre técnico
+
+        Returns:
+            Diccionario con nombres técnicos -> valores (sin vacíos)
+        """
         technical_data = {}
         for label, value in row_data.items():
             tech_name = label_to_technical.get(label, label)
 
-            # Limpiar valores NaN
-            if pd.isna(value):
+            # Limpiar valores vacíos (celdas ausentes o NaN)
+            if value is None or (isinstance(value, float) and value != value):
                 value = ''
             else:
                 value = str(value)
@@ -146,20 +368,92 @@ class CSVHandler:
         return technical_data
 
     @staticmethod
-    def validate_csv(csv_path: str, expected_fields: List[str]) -> Dict[str, Any]:
+    def read_csv_with_mapping(csv_path: Source, mapping_path: Source) -> Dict[str, str]:
         """
-        Valida que el CSV contenga los campos esperados.
+        Lee un CSV y lo convierte usando el archivo de mapeo.
+
+        Solo se lee la primera fila de datos.
+
+        Args:
+            csv_path: Ruta al CSV con datos, sus bytes o un objeto tipo archivo
+            mapping_path: Ruta al archivo de mapeo, sus bytes o un objeto tipo archivo
+
+        Returns:
+            Diccionario con nombres técnicos -> valores
+        """
+        for row in CSVHandler.iter_rows_with_mapping(csv_path, mapping_path):
+            return row
+        return {}
+
+    @staticmethod
+    def iter_rows(csv_path: Source) -> Iterator[Dict[str, str]]:
+        """
+        Recorre las filas del CSV de una en una, sin cargar el archivo en memoria.
+
+        Los valores se devuelven tal cual aparecen en el archivo (texto),
+        sin conversiones de tipo.
+
+        Args:
+            csv_path: Ruta al CSV, sus bytes o un objeto tipo archivo
+
+        Yields:
+            Un diccionario {etiqueta: valor} por fila
+        """
+        with open_text(csv_path) as f:
+            yield from csv.DictReader(f)
+
+    @staticmethod
+    def iter_rows_with_mapping(csv_path: Source, mapping_path: Source) -> Iterator[Dict[str, str]]:
+        """
+        Recorre todas las filas del CSV convertidas con el archivo de mapeo.
+
+        El mapeo se lee una sola vez y el CSV se lee fila a fila, de modo
+        que la memoria usada no depende del número de filas.
+
+        Args:
+            csv_path: Ruta al CSV con datos, sus bytes o un objeto tipo archivo
+            mapping_path: Ruta al archivo de mapeo, sus bytes o un objeto tipo archivo
+
+        Yields:
+            Un diccionario {nombre técnico: valor} por cada fila
+        """
+        label_to_technical = CSVHandler.load_mapping(mapping_path)
+
+        for row_data in CSVHandler.iter_rows(csv_path):
+            # Las columnas sobrantes de filas mal formadas llegan con clave None
+            row_data.pop(None, None)
+            yield CSVHandler._row_to_technical(row_data, label_to_technical)
+
+    @staticmethod
+    def read_header(csv_path: Source) -> List[str]:
+        """
+        Lee solo la cabecera del CSV.
+
+        Args:
+            csv_path: Ruta al CSV, sus bytes o un objeto tipo archivo
+
+        Returns:
+            Lista con los nombres de columna (vacía si el archivo está vacío)
+        """
+        with open_text(csv_path) as f:
+            return next(csv.reader(f), [])
+
+    @staticmethod
+    def validate_csv_header(csv_path: Source, expected_fields: List[str]) -> Dict[str, Any]:
+        """
+        Valida que la cabecera del CSV contenga los campos esperados.
+
+        Solo lee la primera línea del archivo, sin recorrer los datos.
 
         Args:
-            csv_path: Ruta al CSV
+            csv_path: Ruta al CSV, sus bytes o un objeto tipo archivo
             expected_fields: Lista de campos que debe contener
 
         Returns:
-            Diccionario con resultado de validación
+            Diccionario con resultado de validación (sin num_rows)
         """
         try:
-            df = pd.read_csv(csv_path, encoding='utf-8-sig')
-            csv_fields = list(df.columns)
+            csv_fields = CSVHandler.read_header(csv_path)
 
             missing = set(expected_fields) - set(csv_fields)
             extra = set(csv_fields) - set(expected_fields)
@@ -167,9 +461,38 @@ class CSVHandler:
             return {
                 'valid': len(missing) == 0,
                 'missing_fields': list(missing),
-                'extra_fields': list(extra),
-                'num_rows': len(df)
+                'extra_fields': list(extra)
+            }
+        except Exception as e:
+            return {
+                'valid': False,
+                'error': str(e)
             }
+
+    @staticmethod
+    def validate_csv(csv_path: Source, expected_fields: List[str]) -> Dict[str, Any]:
+        """
+        Valida que el CSV contenga los campos esperados.
+
+        Las filas se cuentan recorriendo el archivo en streaming.
+
+        Args:
+            csv_path: Ruta al CSV, sus bytes o un objeto tipo archivo
+            expected_fields: Lista de campos que debe contener
+
+        Returns:
+            Diccionario con resultado de validación
+        """
+        result = CSVHandler.validate_csv_header(csv_path, expected_fields)
+        if 'error' in result:
+            return result
+
+        try:
+            with open_text(csv_path) as f:
+                reader = csv.reader(f)
+                next(reader, None)
+                result['num_rows'] = sum(1 for row in reader if row)
+            return result
         except Exception as e:
             return {
                 'valid': False,
@@ -0,0 +1,192 @@
+"""
+Módulo con una caché persistente de campos y etiquetas detectadas.
+
+Las entradas se indexan por el SHA-256 del contenido del PDF, de modo que
+el mismo formulario subido varias veces solo se analiza la primera vez.
+"""
+
+from typing import Dict, Any, Optional
+import hashlib
+import json
+import os
+import sqlite3
+import threading
+import time
+
+
+DEFAULT_CACHE_PATH = os.path.join(
+    os.path.expanduser('~'), '.cache', 'mcmautopdf', 'fields.sqlite'
+)
+
+
+def content_hash(data: bytes) -> str:
+    """
+    Calcula el hash de contenido de un PDF.
+
+    Args:
+        data: Bytes del PDF
+
+    Returns:
+        SHA-256 en hexadecimal
+    """
+    return hashlib.sha256(data).hexdigest()
+
+
+def file_hash(path: str, block_size: int = 1 << 20) -> str:
+    """
+    Calcula el hash de contenido de un archivo leyéndolo por bloques.
+
+    Args:
+        path: Ruta al archivo
+        block_size: Tamaño de bloque de lectura
+
+    Returns:
+        SHA-256 en hexadecimal
+    """
+    digest = hashlib.sha256()
+    with open(path, 'rb') as f:
+        for block in iter(lambda: f.read(block_size), b''):
+            digest.update(block)
+    return digest.hexdigest()
+
+
+class FieldCache:
+    """Caché en SQLite de campos/etiquetas por hash de PDF, con expulsión LRU por tamaño."""
+
+    def __init__(self, path: str = DEFAULT_CACHE_PATH, max_bytes: int = 64 * 1024 * 1024):
+        """
+        Abre (o crea) la caché.
+
+        Args:
+            path: Ruta al archivo SQLite
+            max_bytes: Tamaño máximo total de las entradas serializadas
+        """
+        self.path = path
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+
+        if os.path.dirname(path):
+            os.makedirs(os.path.dirname(path), exist_ok=True)
+
+        self._conn = sqlite3.connect(path, check_same_thread=False)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS fields ("
+            " hash TEXT PRIMARY KEY,"
+            " version TEXT NOT NULL,"
+            " data TEXT NOT NULL,"
+            " size INTEGER NOT NULL,"
+            " last_access REAL NOT NULL)"
+        )
+        self._conn.commit()
+
+    def get(self, pdf_hash: str, version: str) -> Optional[Dict[str, Dict[str, Any]]]:
+        """
+        Obtiene los campos guardados para un PDF.
+
+        Las entradas generadas con otra versión de la heurística de
+        etiquetado se consideran obsoletas y se eliminan.
+
+        Args:
+            pdf_hash: Hash de contenido del PDF
+            version: Versión actual de la heurística de etiquetado
+
+        Returns:
+            Diccionario de campos o None si no está en caché
+        """
+        with self._lock:
+            row = self._conn.execute(
+                "SELECT data, version FROM fields WHERE hash = ?",
+                (pdf_hash,)
+            ).fetchone()
+            if row is None:
+                return None
+
+            if row[1] != version:
+                self._conn.execute("DELETE FROM fields WHERE hash = ?", (pdf_hash,))
+                self._conn.commit()
+                return None
+
+            self._conn.execute(
+                "UPDATE fields SET last_access = ? WHERE hash = ?",
+                (time.time(), pdf_hash)
+            )
+            self._conn.commit()
+
+        return self._deserialize(row[0])
+
+    def put(self, pdf_hash: str, version: str, fields: Dict[str, Dict[str, Any]]) -> None:
+        """
+        Guarda los campos de un PDF y expulsa las entradas menos usadas si
+        se supera el tamaño máximo.
+
+        Args:
+            pdf_hash: Hash de contenido del PDF
+            version: Versión de la heurística de etiquetado usada
+            fields: Diccionario de campos (resultado de get_fields_with_labels)
+        """
+        data = json.dumps(fields, ensure_ascii=False, default=str)
+        size = len(data.encode('utf-8'))
+
+        with self._lock:
+            self._conn.execute(
+                "INSERT OR REPLACE INTO fields (hash, version, data, size, last_access)"
+                " VALUES (?, ?, ?, ?, ?)",
+                (pdf_hash, version, data, size, time.time())
+            )
+            self._evict()
+            self._conn.commit()
+
+    def clear(self) -> None:
+        """Elimina todas las entradas."""
+        with self._lock:
+            self._conn.execute("DELETE FROM fields")
+            self._conn.commit()
+
+    def total_size(self) -> int:
+        """
+        Tamaño total de las entradas guardadas.
+
+        Returns:
+            Suma de los tamaños serializados en bytes
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM fields").fetchone()
+        return int(row[0])
+
+    def _evict(self) -> None:
+        """Expulsa las entradas con acceso más antiguo hasta caber en max_bytes."""
+        total = self._conn.execute("SELECT COALESCE(SUM(size), 0) FROM fields").fetchone()[0]
+        if total <= self.max_bytes:
+            return
+
+        rows = self._conn.execute(
+            "SELECT hash, size FROM fields ORDER BY last_access ASC"
+        ).fetchall()
+        for pdf_hash, size in rows:
+            if total <= self.max_bytes:
+                break
+            self._conn.execute("DELETE FROM fields WHERE hash = ?", (pdf_hash,))
+            total -= size
+
+    @staticmethod
+    def _deserialize(data: str) -> Dict[str, Dict[str, Any]]:
+        """
+        Reconstruye el diccionario de campos desde JSON.
+
+        Args:
+            data: JSON guardado
+
+        Returns:
+            Diccionario de campos con los rect como tuplas
+        """
+        fields = json.loads(data)
+        for field_data in fields.values():
+            if field_data.get('rect') is not None:
+                field_data['rect'] = tuple(field_data['rect'])
+            for widget in field_data.get('widgets', []):
+                widget['rect'] = tuple(widget['rect'])
+        return fields
+
+    def close(self) -> None:
+        """Cierra la conexión con la base de datos."""
+        self._conn.close()
@@ -0,0 +1,110 @@
+"""
+Módulo con el resultado instrumentado de un rellenado.
+
+FillResult reúne lo que antes solo se imprimía por consola: el éxito o el
+error, los mensajes de progreso, el tiempo de cada etapa y los contadores
+de campos. Cada llamada a fill_pdf tiene su propio resultado, así que
+varias sesiones o hilos no mezclan sus mensajes.
+"""
+
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+import logging
+import time
+
+
+# Etapas de un rellenado, en orden de ejecución
+STAGES = ('parse', 'clone', 'resolve', 'coercion', 'appearance', 'flatten', 'write')
+
+# Contadores de un rellenado
+COUNTERS = (
+    'fields_filled', 'fields_skipped', 'fields_invalid', 'widgets', 'flattened',
+    'appearance_cache_hits', 'appearance_cache_misses'
+)
+
+
+class FillResult:
+    """
+    Resultado de un rellenado: éxito, error, mensajes, tiempos y contadores.
+
+    Se evalúa como True si el rellenado terminó bien, de modo que el código
+    que trataba el retorno de fill_pdf como booleano sigue funcionando.
+    """
+
+    def __init__(self, output: Optional[str] = None):
+        """
+        Inicializa un resultado vacío.
+
+        Args:
+            output: Nombre del destino del PDF (ruta o descripción del stream)
+        """
+        self.success = False
+        self.error: Optional[str] = None
+        # Clase del error (nombre de la excepción, o NoFormFields /
+        # NoMatchingFields si los datos no se pueden rellenar)
+        self.error_class: Optional[str] = None
+        self.output = output
+        # Segundos por etapa (solo las etapas que llegaron a ejecutarse)
+        self.timings: Dict[str, float] = {}
+        self.counters: Dict[str, int] = dict.fromkeys(COUNTERS, 0)
+        # (nivel de logging, mensaje)
+        self.messages: List[Tuple[int, str]] = []
+
+    def __bool__(self) -> bool:
+        return self.success
+
+    def __repr__(self) -> str:
+        state = 'ok' if self.success else f'error={self.error!r}'
+        return f"FillResult({state}, total={self.total_time * 1000:.1f} ms)"
+
+    @contextmanager
+    def stage(self, name: str) -> Iterator[None]:
+        """
+        Mide el tiempo de una etapa (se acumula si la etapa se repite).
+
+        Args:
+            name: Nombre de la etapa (ver STAGES)
+        """
+        start = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.timings[name] = self.timings.get(name, 0.0) + time.perf_counter() - start
+
+    @property
+    def total_time(self) -> float:
+        """Suma de los tiempos de todas las etapas, en segundos."""
+        return sum(self.timings.values())
+
+    def log(self, level: int, message: str) -> None:
+        """Añade un mensaje al resultado."""
+        self.messages.append((level, message))
+
+    def log_text(self) -> str:
+        """
+        Mensajes del rellenado como texto, una línea ``[NIVEL] mensaje`` cada uno.
+
+        Returns:
+            Texto de los mensajes
+        """
+        return '\n'.join(f"[{logging.getLevelName(level)}] {message}" for level, message in self.messages)
+
+    def to_dict(self) -> Dict[str, Any]:
+        """
+        Representación serializable (p.ej. para logs en JSON).
+
+        Returns:
+            Diccionario {success, error, error_class, output, timings_ms,
+            total_ms, counters}
+        """
+        return {
+            'success': self.success,
+            'error': self.error,
+            'error_class': self.error_class,
+            'output': self.output,
+            'timings_ms': {
+                name: round(self.timings[name] * 1000, 3) for name in STAGES if name in self.timings
+            },
+            'total_ms': round(self.total_time * 1000, 3),
+            'counters': dict(self.counters)
+        }
@@ -0,0 +1,209 @@
+"""
+Módulo para aplanar formularios: incrusta las apariencias de los widgets en
+el contenido de cada página y elimina el AcroForm.
+"""
+
+from pypdf import PdfWriter
+from pypdf.generic import (
+    ArrayObject, DecodedStreamObject, DictionaryObject, IndirectObject,
+    NameObject, StreamObject
+)
+from typing import List, Optional, Tuple
+
+
+# Bits de /F que ocultan la anotación
+ANNOT_HIDDEN = 2
+ANNOT_NOVIEW = 32
+
+
+def _normal_appearance(widget: DictionaryObject):
+    """
+    Devuelve la apariencia normal visible del widget.
+
+    Args:
+        widget: Anotación /Widget
+
+    Returns:
+        Stream /AP /N (referencia indirecta u objeto directo), o None si no
+        hay nada que dibujar
+    """
+    ap = widget.get('/AP')
+    if ap is None:
+        return None
+    normal = ap.get_object().get('/N')
+    if normal is None:
+        return None
+
+    if not isinstance(normal.get_object(), StreamObject):
+        # Checkbox/radio: un stream por estado, se elige con /AS
+        state = widget.get('/AS')
+        if state is None:
+            return None
+        normal = normal.get_object().get(state)
+        if normal is None:
+            return None
+
+    return normal if isinstance(normal.get_object(), StreamObject) else None
+
+
+def _placement(rect: List[float], bbox: List[float],
+               matrix: Optional[List[float]]) -> Tuple[float, ...]:
+    """
+    Matriz ``cm`` que lleva la /BBox (transformada por /Matrix) al /Rect.
+
+    Args:
+        rect: /Rect del widget
+        bbox: /BBox del stream de apariencia
+        matrix: /Matrix del stream (None = identidad)
+
+    Returns:
+        Tupla (a, b, c, d, e, f)
+    """
+    a, b, c, d, e, f = matrix or (1, 0, 0, 1, 0, 0)
+    corners = [
+        (x * a + y * c + e, x * b + y * d + f)
+        for x in (bbox[0], bbox[2]) for y in (bbox[1], bbox[3])
+    ]
+    min_x = min(x for x, _ in corners)
+    max_x = max(x for x, _ in corners)
+    min_y = min(y for _, y in corners)
+    max_y = max(y for _, y in corners)
+
+    rx0, rx1 = sorted((rect[0], rect[2]))
+    ry0, ry1 = sorted((rect[1], rect[3]))
+    sx = (rx1 - rx0) / (max_x - min_x) if max_x != min_x else 1.0
+    sy = (ry1 - ry0) / (max_y - min_y) if max_y != min_y else 1.0
+
+    return (sx, 0.0, 0.0, sy, rx0 - min_x * sx, ry0 - min_y * sy)
+
+
+def _inherited_resources(page) -> DictionaryObject:
+    """Diccionario /Resources de la página, buscándolo en /Parent si no lo tiene."""
+    node = page
+    while node is not None:
+        resources = node.get('/Resources')
+        if resources is not None:
+            return resources.get_object()
+        parent = node.get('/Parent')
+        node = parent.get_object() if parent is not None else None
+    return DictionaryObject()
+
+
+def _content_stream(writer: PdfWriter, data: bytes):
+    """Añade un stream de contenido al writer y devuelve su referencia."""
+    stream = DecodedStreamObject()
+    stream.set_data(data)
+    return writer._add_object(stream)
+
+
+def flatten_page(writer: PdfWriter, page) -> int:
+    """
+    Aplana los widgets de una página en una sola pasada por sus anotaciones.
+
+    Cada apariencia visible se registra como XObject de la página y se
+    dibuja con ``q cm Do Q`` en un stream añadido al final del contenido.
+    El contenido original no se analiza ni se reescribe: se envuelve entre
+    ``q``/``Q`` para aislar su estado gráfico. Las anotaciones que no son
+    widgets se conservan.
+
+    Args:
+        writer: PdfWriter al que pertenece la página
+        page: Página a aplanar
+
+    Returns:
+        Número de widgets eliminados de la página
+    """
+    annots = page.get('/Annots')
+    if annots is None:
+        return 0
+
+    annots = annots.get_object()
+    kept = ArrayObject()
+    operators = []
+    xobjects = {}
+    removed = 0
+
+    for annot_ref in annots:
+        annot = annot_ref.get_object()
+        if annot.get('/Subtype') != '/Widget':
+            kept.append(annot_ref)
+            continue
+
+        removed += 1
+        flags = int(annot.get('/F', 0))
+        if flags & (ANNOT_HIDDEN | ANNOT_NOVIEW) or '/Rect' not in annot:
+            continue
+
+        appearance = _normal_appearance(annot)
+        if appearance is None:
+            continue
+
+        stream = appearance.get_object()
+        stream[NameObject('/Type')] = NameObject('/XObject')
+        stream[NameObject('/Subtype')] = NameObject('/Form')
+        rect = [float(v) for v in annot['/Rect']]
+        if '/BBox' in stream:
+            bbox = [float(v) for v in stream['/BBox']]
+        else:
+            bbox = [0.0, 0.0, abs(rect[2] - rect[0]), abs(rect[3] - rect[1])]
+        matrix = [float(v) for v in stream['/Matrix']] if '/Matrix' in stream else None
+
+        name = f'/FlatW{len(xobjects)}'
+        xobjects[name] = appearance if isinstance(appearance, IndirectObject) \
+            else writer._add_object(stream)
+        cm = ' '.join(f'{v:.4f}' for v in _placement(rect, bbox, matrix))
+        operators.append(f'q {cm} cm {name} Do Q')
+
+    if kept:
+        page[NameObject('/Annots')] = kept
+    else:
+        del page['/Annots']
+
+    if not operators:
+        return removed
+
+    # Los recursos pueden estar compartidos entre páginas o heredados de
+    # /Pages: se copian en la página antes de añadir los XObjects
+    resources = DictionaryObject(_inherited_resources(page))
+    page_xobjects = resources.get('/XObject')
+    page_xobjects = DictionaryObject(page_xobjects.get_object() if page_xobjects is not None else {})
+    for name, ref in xobjects.items():
+        page_xobjects[NameObject(name)] = ref
+    resources[NameObject('/XObject')] = page_xobjects
+    page[NameObject('/Resources')] = resources
+
+    contents = page.get('/Contents')
+    new_contents = ArrayObject([_content_stream(writer, b'q\n')])
+    if contents is not None:
+        contents_obj = contents.get_object()
+        if isinstance(contents_obj, ArrayObject):
+            new_contents.extend(contents_obj)
+        else:
+            new_contents.append(
+                contents if isinstance(contents, IndirectObject) else writer._add_object(contents_obj)
+            )
+    new_contents.append(_content_stream(writer, ('Q\n' + '\n'.join(operators) + '\n').encode('latin-1')))
+    page[NameObject('/Contents')] = new_contents
+
+    return removed
+
+
+def flatten_writer(writer: PdfWriter) -> int:
+    """
+    Aplana todas las páginas y elimina el AcroForm del documento.
+
+    Args:
+        writer: PdfWriter con el formulario ya rellenado
+
+    Returns:
+        Número total de widgets aplanados
+    """
+    removed = 0
+    for page in writer.pages:
+        removed += flatten_page(writer, page)
+
+    root = writer.root_object
+    if '/AcroForm' in root:
+        del root['/AcroForm']
+
+    return removed
@@ -0,0 +1,307 @@
+"""
+Módulo para escribir PDFs como actualización incremental.
+
+IncrementalWriter expone la parte de la interfaz de PdfWriter que usan
+CompiledTemplate.apply_values y flatten_writer (``pages``, ``root_object``,
+``_add_object``, ``set_need_appearances_writer`` y ``write``), pero sin
+clonar el documento: los objetos se copian del reader solo cuando se
+acceden. Al escribir, los bytes originales se copian tal cual y se añaden
+únicamente los objetos nuevos o modificados, una nueva sección xref (tabla
+o stream, según use el original) y un trailer con /Prev. Las firmas
+existentes siguen siendo válidas porque los bytes firmados no cambian.
+"""
+
+from pypdf import PdfReader
+from pypdf.generic import (
+    ArrayObject, BooleanObject, DecodedStreamObject, DictionaryObject,
+    EncodedStreamObject, IndirectObject, NameObject, NumberObject, PdfObject,
+    StreamObject
+)
+from typing import Any, BinaryIO, Dict, Iterator, List, Optional, Tuple
+import io
+import re
+import struct
+
+
+# Tamaño de bloque al copiar los bytes del documento original
+COPY_BLOCK_SIZE = 1 << 20
+
+_STARTXREF = re.compile(rb'startxref\s+(\d+)')
+
+
+def find_startxref(data: Any) -> int:
+    """
+    Localiza el offset de la última sección xref del documento.
+
+    Args:
+        data: Bytes (o mmap) del PDF
+
+    Returns:
+        Offset indicado tras el último ``startxref``
+    """
+    tail_start = max(0, len(data) - 2048)
+    matches = list(_STARTXREF.finditer(bytes(data[tail_start:])))
+    if not matches:
+        raise ValueError("No se encontró 'startxref' al final del PDF")
+    return int(matches[-1].group(1))
+
+
+class _Pages:
+    """Secuencia de páginas del IncrementalWriter (copias bajo demanda)."""
+
+    def __init__(self, writer: 'IncrementalWriter', refs: List[IndirectObject]):
+        self._writer = writer
+        self._refs = refs
+
+    def __len__(self) -> int:
+        return len(self._refs)
+
+    def __getitem__(self, index: int) -> DictionaryObject:
+        return self._writer.get_object(self._refs[index])
+
+    def __iter__(self) -> Iterator[DictionaryObject]:
+        for index in range(len(self._refs)):
+            yield self[index]
+
+
+class IncrementalWriter:
+    """Acumula cambios sobre un PdfReader y los escribe como actualización incremental."""
+
+    def __init__(self, reader: PdfReader, data: Any):
+        """
+        Inicializa el writer.
+
+        Args:
+            reader: PdfReader del documento original (no se modifica)
+            data: Bytes originales del documento (bytes, memoryview o mmap)
+        """
+        if reader.is_encrypted:
+            raise ValueError("La actualización incremental no admite PDFs cifrados")
+
+        self.reader = reader
+        self.data = data
+        self._prev = find_startxref(data)
+        # La actualización usa el mismo tipo de sección xref que el original
+        self.uses_xref_stream = bytes(data[self._prev:self._prev + 4]) != b'xref'
+        # idnum -> (generación, copia del objeto)
+        self._objects: Dict[int, Tuple[int, PdfObject]] = {}
+        self._next_id = int(reader.trailer['/Size'])
+        self._root_ref = self._rebind(reader.trailer.raw_get('/Root'))
+        self.pages = _Pages(self, [self._rebind(page.indirect_reference) for page in reader.pages])
+
+    def _rebind(self, ref: IndirectObject) -> IndirectObject:
+        """Referencia equivalente que apunta a este writer."""
+        return IndirectObject(ref.idnum, ref.generation, self)
+
+    def _detach(self, obj: Any) -> Any:
+        """
+        Copia profunda de un objeto del reader; las referencias pasan a este writer.
+
+        Los datos de los streams se comparten sin decodificar.
+        """
+        if isinstance(obj, IndirectObject):
+            return self._rebind(obj)
+        if isinstance(obj, StreamObject):
+            copy = DecodedStreamObject() if isinstance(obj, DecodedStreamObject) else EncodedStreamObject()
+            copy._data = obj._data
+            for key, value in obj.items():
+                copy[NameObject(key)] = self._detach(value)
+            return copy
+        if isinstance(obj, DictionaryObject):
+            return DictionaryObject({NameObject(key): self._detach(value) for key, value in obj.items()})
+        if isinstance(obj, ArrayObject):
+            return ArrayObject(self._detach(value) for value in obj)
+        return obj
+
+    def get_object(self, ref: IndirectObject) -> Optional[PdfObject]:
+        """
+        Devuelve el objeto de una referencia, copiándolo del reader la primera vez.
+
+        Args:
+            ref: Referencia indirecta (de este writer o del reader)
+
+        Returns:
+            Objeto modificable propio de este writer
+        """
+        entry = self._objects.get(ref.idnum)
+        if entry is None:
+            original = self.reader.get_object(IndirectObject(ref.idnum, ref.generation, self.reader))
+            copy = self._detach(original)
+            if copy is not None and hasattr(copy, 'indirect_reference'):
+                copy.indirect_reference = IndirectObject(ref.idnum, ref.generation, self)
+            entry = (ref.generation, copy)
+            self._objects[ref.idnum] = entry
+        return entry[1]
+
+    def _add_object(self, obj: PdfObject) -> IndirectObject:
+        """
+        Añade un objeto nuevo al documento.
+
+        Args:
+            obj: Objeto a añadir
+
+        Returns:
+            Referencia indirecta al objeto
+        """
+        ref = IndirectObject(self._next_id, 0, self)
+        self._next_id += 1
+        obj.indirect_reference = ref
+        self._objects[ref.idnum] = (0, obj)
+        return ref
+
+    @property
+    def root_object(self) -> DictionaryObject:
+        """Catálogo del documento (copia modificable)."""
+        return self.get_object(self._root_ref)
+
+    def set_need_appearances_writer(self, state: bool = True) -> None:
+        """Fija /NeedAppearances en el AcroForm, como PdfWriter."""
+        acro_form = self.root_object.get('/AcroForm')
+        if acro_form is None:
+            return
+        acro_form.get_object()[NameObject('/NeedAppearances')] = BooleanObject(state)
+
+    @staticmethod
+    def _serialize(obj: PdfObject) -> bytes:
+        """Serialización PDF de un objeto."""
+        buffer = io.BytesIO()
+        obj.write_to_stream(buffer)
+        return buffer.getvalue()
+
+    def changed_objects(self) -> List[Tuple[int, int, bytes]]:
+        """
+        Objetos nuevos o que difieren del original.
+
+        Returns:
+            Lista ordenada de (idnum, generación, serialización)
+        """
+        size = int(self.reader.trailer['/Size'])
+        changed = []
+
+        for idnum in sorted(self._objects):
+            generation, obj = self._objects[idnum]
+            if obj is None:
+                continue
+            serialized = self._serialize(obj)
+            if idnum < size:
+                original = self.reader.get_object(IndirectObject(idnum, generation, self.reader))
+                if original is not None and self._serialize(original) == serialized:
+                    continue
+            changed.append((idnum, generation, serialized))
+
+        return changed
+
+    def _copy_original(self, stream: BinaryIO) -> int:
+        """Copia los bytes originales por bloques y devuelve cuántos se escribieron."""
+        view = memoryview(self.data)
+        try:
+            for start in range(0, len(view), COPY_BLOCK_SIZE):
+                stream.write(view[start:start + COPY_BLOCK_SIZE])
+            return len(view)
+        finally:
+            view.release()
+
+    def write(self, stream: BinaryIO) -> None:
+        """
+        Escribe el documento original seguido de la actualización incremental.
+
+        Args:
+            stream: Stream binario de salida
+        """
+        position = self._copy_original(stream)
+        changed = self.changed_objects()
+        if not changed:
+            return
+
+        if bytes(self.data[-1:]) not in (b'\n', b'\r'):
+            stream.write(b'\n')
+            position += 1
+
+        offsets = []
+        for idnum, generation, serialized in changed:
+            offsets.append((idnum, generation, position))
+            chunk = b'%d %d obj\n' % (idnum, generation) + serialized + b'\nendobj\n'
+            stream.write(chunk)
+            position += len(chunk)
+
+        xref_position = position
+        if self.uses_xref_stream:
+            stream.write(self._xref_stream(offsets, xref_position))
+        else:
+            stream.write(self._xref_table(offsets))
+            stream.write(b'trailer\n' + self._serialize(self._trailer()))
+        stream.write(b'\nstartxref\n%d\n%%%%EOF\n' % xref_position)
+
+    @staticmethod
+    def _subsections(offsets: List[Tuple[int, int, int]]) -> List[List[Tuple[int, int, int]]]:
+        """Agrupa las entradas (ordenadas por idnum) en rangos de ids consecutivos."""
+        groups: List[List[Tuple[int, int, int]]] = []
+        for entry in offsets:
+            if groups and groups[-1][-1][0] + 1 == entry[0]:
+                groups[-1].append(entry)
+            else:
+                groups.append([entry])
+        return groups
+
+    @classmethod
+    def _xref_table(cls, offsets: List[Tuple[int, int, int]]) -> bytes:
+        """
+        Tabla xref clásica con una subsección por cada rango de ids consecutivos.
+
+        Empieza con la entrada 0 (cabeza de la lista de objetos libres), como
+        esperan los lectores que validan la tabla.
+
+        Args:
+            offsets: Lista ordenada de (idnum, generación, offset)
+
+        Returns:
+            Bytes de la sección xref
+        """
+        parts = [b'xref\n0 1\n0000000000 65535 f\r\n']
+        for group in cls._subsections(offsets):
+            parts.append(b'%d %d\n' % (group[0][0], len(group)))
+            for _, generation, offset in group:
+                parts.append(b'%010d %05d n\r\n' % (offset, generation))
+        return b''.join(parts)
+
+    def _xref_stream(self, offsets: List[Tuple[int, int, int]], position: int) -> bytes:
+        """
+        Sección xref como stream (/Type /XRef), para documentos que ya las usan.
+
+        El propio stream ocupa el siguiente idnum libre y se incluye en su tabla.
+
+        Args:
+            offsets: Lista ordenada de (idnum, generación, offset)
+            position: Offset donde se escribe el stream
+
+        Returns:
+            Bytes del objeto stream de la sección xref
+        """
+        idnum = self._next_id
+        entries = offsets + [(idnum, 0, position)]
+        groups = self._subsections(entries)
+
+        xref = DecodedStreamObject()
+        xref.update(self._trailer())
+        xref[NameObject('/Size')] = NumberObject(idnum + 1)
+        xref[NameObject('/Type')] = NameObject('/XRef')
+        xref[NameObject('/W')] = ArrayObject([NumberObject(1), NumberObject(4), NumberObject(2)])
+        xref[NameObject('/Index')] = ArrayObject(
+            NumberObject(value) for group in groups for value in (group[0][0], len(group))
+        )
+        xref.set_data(b''.join(
+            struct.pack('>BIH', 1, offset, generation) for _, generation, offset in entries
+        ))
+        return b'%d 0 obj\n' % idnum + self._serialize(xref) + b'\nendobj'
+
+    def _trailer(self) -> DictionaryObject:
+        """Diccionario del trailer de la actualización, encadenado al anterior con /Prev."""
+        trailer = DictionaryObject({
+            NameObject('/Size'): NumberObject(self._next_id),
+            NameObject('/Root'): self._root_ref,
+            NameObject('/Prev'): NumberObject(self._prev),
+        })
+        for key in ('/Info', '/ID'):
+            if key in self.reader.trailer:
+                trailer[NameObject(key)] = self._detach(self.reader.trailer.raw_get(key))
+        return trailer
@@ -0,0 +1,500 @@
+"""
+Módulo con una cola de trabajos de relleno/extracción en segundo plano.
+
+Los trabajos se ejecutan en un pool de procesos (con prioridad baja), de
+modo que los lotes largos no bloquean la sesión que los lanza ni compiten
+por el GIL con las sesiones interactivas. El estado de cada trabajo se
+guarda en SQLite y sus archivos en una carpeta propia: los trabajos
+pendientes o interrumpidos se vuelven a encolar al reiniciar.
+"""
+
+from concurrent.futures import Future, ProcessPoolExecutor
+from concurrent.futures.process import BrokenProcessPool
+from typing import Any, Dict, List, Optional, Set
+import json
+import multiprocessing
+import os
+import shutil
+import sqlite3
+import threading
+import time
+import uuid
+import zipfile
+
+
+DEFAULT_JOBS_DIR = os.path.join(
+    os.path.expanduser('~'), '.cache', 'mcmautopdf', 'jobs'
+)
+
+# Estados de un trabajo
+QUEUED = 'queued'
+RUNNING = 'running'
+DONE = 'done'
+FAILED = 'failed'
+
+# Prioridad (nice) de los procesos worker frente a la aplicación
+WORKER_NICENESS = 10
+
+# Intervalo mínimo entre actualizaciones de progreso en la base de datos
+PROGRESS_INTERVAL = 0.5
+
+
+def _connect(db_path: str) -> sqlite3.Connection:
+    """Abre la base de datos de trabajos (en modo WAL: lectores y escritores concurrentes)."""
+    conn = sqlite3.connect(db_path, timeout=30, check_same_thread=False)
+    conn.execute("PRAGMA journal_mode=WAL")
+    return conn
+
+
+def _update(conn: sqlite3.Connection, job_id: str, **values: Any) -> None:
+    """Actualiza columnas de un trabajo y su marca de tiempo."""
+    values['updated'] = time.time()
+    columns = ', '.join(f"{name} = ?" for name in values)
+    conn.execute(f"UPDATE jobs SET {columns} WHERE id = ?", (*values.values(), job_id))
+    conn.commit()
+
+
+def _init_worker() -> None:
+    """Baja la prioridad del proceso worker para no quitar CPU a la interfaz."""
+    if hasattr(os, 'nice'):
+        try:
+            os.nice(WORKER_NICENESS)
+        except OSError:
+            pass
+
+
+def _run_job(db_path: str, job_dir: str, job_id: str) -> None:
+    """
+    Ejecuta un trabajo dentro de un proceso worker.
+
+    El estado, el progreso y el resultado se escriben directamente en la
+    base de datos; los errores quedan registrados en el propio trabajo.
+
+    Args:
+        db_path: Ruta a la base de datos de trabajos
+        job_dir: Carpeta con las entradas del trabajo
+        job_id: Identificador del trabajo
+    """
+    # Importaciones aquí: el proceso principal no necesita pypdf para encolar
+    from .csv_handler import CSVHandler
+    from .pdf_extractor import PDFExtractor
+    from .pdf_filler import PDFFiller
+    from .sources import read_bytes
+
+    conn = _connect(db_path)
+    try:
+        row = conn.execute("SELECT kind, params FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        if row is None:
+            return
+        kind, params = row[0], json.loads(row[1])
+        _update(conn, job_id, status=RUNNING, done=0, failed=0, error=None)
+
+        pdf_path = os.path.join(job_dir, 'entrada.pdf')
+        result_path = os.path.join(job_dir, params['result'])
+
+        try:
+            if kind == 'extract':
+                extractor = PDFExtractor(pdf_path)
+                fields = extractor.get_fields_with_labels()
+                files = CSVHandler.build_template_files(fields, include_info=True)
+                with zipfile.ZipFile(result_path, 'w', compression=zipfile.ZIP_DEFLATED) as archive:
+                    for name, data in files.items():
+                        archive.writestr(name, data)
+                _update(conn, job_id, status=DONE, done=1, total=1)
+
+            elif kind == 'fill':
+                filler = PDFFiller(pdf_path, verbose=False)
+                if not filler.fill_pdf(params['data'], result_path, flatten=params['flatten']):
+                    raise RuntimeError(filler.last_error)
+                _update(conn, job_id, status=DONE, done=1, total=1)
+
+            elif kind == 'batch':
+                csv_path = os.path.join(job_dir, 'datos.csv')
+                mapping = read_bytes(os.path.join(job_dir, 'mapeo'))
+                total = sum(1 for _ in CSVHandler.iter_rows(csv_path))
+                _update(conn, job_id, total=total)
+
+                last_update = [time.monotonic()]
+
+                def progress(summary: Dict[str, Any]) -> None:
+                    now = time.monotonic()
+                    if now - last_update[0] >= PROGRESS_INTERVAL:
+                        last_update[0] = now
+                        _update(conn, job_id, done=summary['total'], failed=summary['failed'])
+
+                field_info = CSVHandler.load_mapping_data(mapping)['fields']
+                filler = PDFFiller(pdf_path, verbose=False, field_info=field_info)
+                rows = CSVHandler.iter_rows_with_mapping(csv_path, mapping)
+                summary = filler.fill_zip(rows, result_path, filename_pattern=params['pattern'],
+                                          flatten=params['flatten'], progress=progress)
+                _update(conn, job_id, status=DONE, done=summary['total'],
+                        total=summary['total'], failed=summary['failed'])
+
+            else:
+                raise ValueError(f"Tipo de trabajo desconocido: {kind}")
+
+        except Exception as e:
+            _update(conn, job_id, status=FAILED, error=f"{type(e).__name__}: {e}")
+    finally:
+        conn.close()
+
+
+class JobQueue:
+    """Cola persistente de trabajos ejecutados por un pool de procesos."""
+
+    def __init__(self, jobs_dir: str = DEFAULT_JOBS_DIR, workers: int = 2):
+        """
+        Abre (o crea) la cola y reanuda los trabajos pendientes.
+
+        Args:
+            jobs_dir: Carpeta con la base de datos y los archivos de cada trabajo
+            workers: Número de procesos worker
+        """
+        self.jobs_dir = jobs_dir
+        self.db_path = os.path.join(jobs_dir, 'jobs.sqlite')
+        self.workers = max(1, workers)
+        # Reentrante: el callback de un futuro ya terminado se ejecuta dentro de _dispatch
+        self._lock = threading.RLock()
+        self._executor: Optional[ProcessPoolExecutor] = None
+        # Trabajos reenviados tras la caída de un worker (solo se reintentan una vez)
+        self._retried: Set[str] = set()
+        self._closed = False
+
+        os.makedirs(jobs_dir, exist_ok=True)
+        self._conn = _connect(self.db_path)
+        self._conn.execute(
+            "CREATE TABLE IF NOT EXISTS jobs ("
+            " id TEXT PRIMARY KEY,"
+            " kind TEXT NOT NULL,"
+            " owner TEXT,"
+            " name TEXT NOT NULL,"
+            " params TEXT NOT NULL,"
+            " status TEXT NOT NULL,"
+            " done INTEGER NOT NULL DEFAULT 0,"
+            " total INTEGER,"
+            " failed INTEGER NOT NULL DEFAULT 0,"
+            " error TEXT,"
+            " created REAL NOT NULL,"
+            " updated REAL NOT NULL)"
+        )
+        self._conn.commit()
+        self._resume()
+
+    def _resume(self) -> None:
+        """Vuelve a encolar los trabajos pendientes o interrumpidos por un reinicio."""
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) ORDER BY created",
+                (QUEUED, RUNNING)
+            ).fetchall()
+            for (job_id,) in rows:
+                _update(self._conn, job_id, status=QUEUED)
+            for (job_id,) in rows:
+                self._dispatch(job_id)
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Pool de procesos actual (lo crea si no existe o se descartó por roto)."""
+        if self._executor is None:
+            # spawn: hacer fork de un servidor con hilos (Streamlit) no es seguro
+            self._executor = ProcessPoolExecutor(
+                max_workers=self.workers,
+                mp_context=multiprocessing.get_context('spawn'),
+                initializer=_init_worker
+            )
+        return self._executor
+
+    def _discard_executor(self, executor: ProcessPoolExecutor) -> None:
+        """Descarta un pool roto para que el siguiente envío cree uno nuevo."""
+        if self._executor is executor:
+            self._executor = None
+
+    def _dispatch(self, job_id: str) -> bool:
+        """
+        Envía un trabajo al pool de procesos (con self._lock tomado).
+
+        Si el pool está roto (un worker murió, p.ej. por falta de memoria),
+        se crea uno nuevo y se reintenta. Si el envío falla igualmente, el
+        trabajo se marca como fallido en lugar de quedarse en cola.
+
+        Args:
+            job_id: Identificador del trabajo
+
+        Returns:
+            True si el trabajo quedó encolado en el pool
+        """
+        error: Optional[BaseException] = None
+        for _ in range(2):
+            executor = self._get_executor()
+            try:
+                future = executor.submit(_run_job, self.db_path, self._job_dir(job_id), job_id)
+            except BrokenProcessPool as e:
+                self._discard_executor(executor)
+                error = e
+                continue
+            except RuntimeError as e:
+                # Pool cerrado (la cola se está cerrando)
+                error = e
+                break
+            future.add_done_callback(lambda f: self._on_finished(job_id, executor, f))
+            return True
+
+        _update(self._conn, job_id, status=FAILED,
+                error=f"No se pudo encolar el trabajo: {type(error).__name__}: {error}")
+        return False
+
+    def _on_finished(self, job_id: str, executor: ProcessPoolExecutor, future: Future) -> None:
+        """
+        Marca como fallido un trabajo cuyo proceso terminó sin registrar el resultado.
+
+        Si el pool se rompió, se descarta; los trabajos que aún no habían
+        empezado se vuelven a enviar (una sola vez) a un pool nuevo.
+        """
+        error = future.exception() if not future.cancelled() else None
+        if error is None:
+            return
+        with self._lock:
+            if self._closed:
+                return
+            message = f"{type(error).__name__}: {error}"
+            if isinstance(error, BrokenProcessPool):
+                self._discard_executor(executor)
+                row = self._conn.execute("SELECT status FROM jobs WHERE id = ?", (job_id,)).fetchone()
+                if row is not None and row[0] == QUEUED and job_id not in self._retried:
+                    self._retried.add(job_id)
+                    self._dispatch(job_id)
+                    return
+                message = "El proceso worker terminó inesperadamente (¿falta de memoria?)"
+            _update(self._conn, job_id, status=FAILED, error=message)
+
+    def _job_dir(self, job_id: str) -> str:
+        """Carpeta con las entradas y el resultado de un trabajo."""
+        return os.path.join(self.jobs_dir, job_id)
+
+    def _submit(self, kind: str, name: str, files: Dict[str, bytes],
+                params: Dict[str, Any], owner: Optional[str]) -> str:
+        """
+        Guarda las entradas de un trabajo, lo registra y lo encola.
+
+        Args:
+            kind: Tipo de trabajo ('extract', 'fill' o 'batch')
+            name: Nombre legible (p.ej. el del PDF subido)
+            files: Archivos de entrada {nombre: contenido}
+            params: Parámetros del trabajo (serializables en JSON)
+            owner: Identificador de quien lo lanza (p.ej. la sesión)
+
+        Returns:
+            Identificador del trabajo
+        """
+        job_id = uuid.uuid4().hex
+        job_dir = self._job_dir(job_id)
+        os.makedirs(job_dir)
+        for file_name, data in files.items():
+            with open(os.path.join(job_dir, file_name), 'wb') as f:
+                f.write(data)
+
+        now = time.time()
+        with self._lock:
+            self._conn.execute(
+                "INSERT INTO jobs (id, kind, owner, name, params, status, created, updated)"
+                " VALUES (?, ?, ?, ?, ?, ?, ?, ?)",
+                (job_id, kind, owner, name, json.dumps(params, ensure_ascii=False), QUEUED, now, now)
+            )
+            self._conn.commit()
+            # Con el lock tomado: nadie ve el trabajo en cola si el envío falla
+            self._dispatch(job_id)
+        return job_id
+
+    def submit_extract(self, pdf: bytes, name: str = 'documento.pdf',
+                       owner: Optional[str] = None) -> str:
+        """
+        Encola la extracción de campos; el resultado es un ZIP con la
+        plantilla CSV, los mapeos y el archivo INFO.
+
+        Args:
+            pdf: Bytes del PDF
+            name: Nombre del PDF
+            owner: Identificador de quien lo lanza
+
+        Returns:
+            Identificador del trabajo
+        """
+        return self._submit('extract', name, {'entrada.pdf': pdf},
+                            {'result': 'plantilla.zip'}, owner)
+
+    def submit_fill(self, pdf: bytes, data: Dict[str, str], name: str = 'documento.pdf',
+                    flatten: bool = False, owner: Optional[str] = None) -> str:
+        """
+        Encola el relleno de un PDF.
+
+        Args:
+            pdf: Bytes del PDF template
+            data: Diccionario {nombre_campo: valor}
+            name: Nombre del PDF
+            flatten: Si True, aplana el PDF generado
+            owner: Identificador de quien lo lanza
+
+        Returns:
+            Identificador del trabajo
+        """
+        return self._submit('fill', name, {'entrada.pdf': pdf},
+                            {'result': 'rellenado.pdf', 'data': data, 'flatten': flatten}, owner)
+
+    def submit_batch(self, pdf: bytes, csv_data: bytes, mapping: bytes,
+                     name: str = 'documento.pdf',
+                     filename_pattern: str = 'documento_{index:05d}.pdf',
+                     flatten: bool = False, owner: Optional[str] = None) -> str:
+        """
+        Encola un lote: un PDF por fila del CSV, empaquetados en un ZIP con
+        manifiesto (ver PDFFiller.fill_zip).
+
+        Args:
+            pdf: Bytes del PDF template
+            csv_data: Bytes del CSV con datos
+            mapping: Bytes del archivo de mapeo (.txt o .json)
+            name: Nombre del PDF
+            filename_pattern: Patrón del nombre de cada PDF
+            flatten: Si True, aplana cada PDF
+            owner: Identificador de quien lo lanza
+
+        Returns:
+            Identificador del trabajo
+        """
+        files = {'entrada.pdf': pdf, 'datos.csv': csv_data, 'mapeo': mapping}
+        params = {'result': 'lote.zip', 'pattern': filename_pattern, 'flatten': flatten}
+        return self._submit('batch', name, files, params, owner)
+
+    @staticmethod
+    def _row_to_job(row: tuple) -> Dict[str, Any]:
+        """Convierte una fila de la tabla en el diccionario público del trabajo."""
+        job_id, kind, owner, name, params, status, done, total, failed, error, created, updated = row
+        return {
+            'id': job_id,
+            'kind': kind,
+            'owner': owner,
+            'name': name,
+            'status': status,
+            'done': done,
+            'total': total,
+            'failed': failed,
+            'error': error,
+            'result': json.loads(params)['result'],
+            'created': created,
+            'updated': updated
+        }
+
+    def get(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Obtiene el estado de un trabajo.
+
+        Args:
+            job_id: Identificador del trabajo
+
+        Returns:
+            Diccionario {id, kind, owner, name, status, done, total, failed,
+            error, result, created, updated} o None si no existe
+        """
+        with self._lock:
+            row = self._conn.execute("SELECT * FROM jobs WHERE id = ?", (job_id,)).fetchone()
+        return self._row_to_job(row) if row is not None else None
+
+    def list_jobs(self, owner: Optional[str] = None, limit: int = 50) -> List[Dict[str, Any]]:
+        """
+        Lista los trabajos más recientes.
+
+        Args:
+            owner: Si se indica, solo los trabajos de ese propietario
+            limit: Número máximo de trabajos
+
+        Returns:
+            Lista de trabajos (ver get), del más reciente al más antiguo
+        """
+        with self._lock:
+            if owner is None:
+                rows = self._conn.execute(
+                    "SELECT * FROM jobs ORDER BY created DESC LIMIT ?", (limit,)
+                ).fetchall()
+            else:
+                rows = self._conn.execute(
+                    "SELECT * FROM jobs WHERE owner = ? ORDER BY created DESC LIMIT ?", (owner, limit)
+                ).fetchall()
+        return [self._row_to_job(row) for row in rows]
+
+    def result_path(self, job_id: str) -> Optional[str]:
+        """
+        Ruta del resultado de un trabajo terminado.
+
+        Args:
+            job_id: Identificador del trabajo
+
+        Returns:
+            Ruta al archivo, o None si el trabajo no ha terminado bien
+        """
+        job = self.get(job_id)
+        if job is None or job['status'] != DONE:
+            return None
+        path = os.path.join(self._job_dir(job_id), job['result'])
+        return path if os.path.exists(path) else None
+
+    def wait(self, job_id: str, timeout: Optional[float] = None,
+             interval: float = 0.2) -> Optional[Dict[str, Any]]:
+        """
+        Espera a que un trabajo termine (bien o con error).
+
+        Args:
+            job_id: Identificador del trabajo
+            timeout: Tiempo máximo de espera en segundos (None = sin límite)
+            interval: Intervalo de sondeo en segundos
+
+        Returns:
+            Estado final del trabajo, o el último estado si se agotó el tiempo
+        """
+        deadline = None if timeout is None else time.monotonic() + timeout
+        while True:
+            job = self.get(job_id)
+            if job is None or job['status'] in (DONE, FAILED):
+                return job
+            if deadline is not None and time.monotonic() >= deadline:
+                return job
+            time.sleep(interval)
+
+    def cleanup(self, max_age: float = 7 * 24 * 3600) -> int:
+        """
+        Elimina los trabajos terminados más antiguos y sus archivos.
+
+        Args:
+            max_age: Antigüedad máxima en segundos desde la última actualización
+
+        Returns:
+            Número de trabajos eliminados
+        """
+        limit = time.time() - max_age
+        with self._lock:
+            rows = self._conn.execute(
+                "SELECT id FROM jobs WHERE status IN (?, ?) AND updated < ?",
+                (DONE, FAILED, limit)
+            ).fetchall()
+            for (job_id,) in rows:
+                self._conn.execute("DELETE FROM jobs WHERE id = ?", (job_id,))
+            self._conn.commit()
+
+        for (job_id,) in rows:
+            shutil.rmtree(self._job_dir(job_id), ignore_errors=True)
+        return len(rows)
+
+    def close(self, wait: bool = True) -> None:
+        """
+        Detiene el pool de procesos y cierra la base de datos.
+
+        Los trabajos que no lleguen a terminar se reanudan al volver a abrir
+        la cola.
+
+        Args:
+            wait: Si True, espera a que terminen los trabajos en curso
+        """
+        with self._lock:
+            executor, self._executor = self._executor, None
+            self._closed = True
+        if executor is not None:
+            executor.shutdown(wait=wait, cancel_futures=not wait)
+        with self._lock:
+            self._conn.close()
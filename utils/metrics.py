@@ -0,0 +1,337 @@
+"""
+Módulo opcional de métricas en formato de texto de Prometheus.
+
+Las métricas están desactivadas por defecto: mientras no se llame a
+``enable()``, las funciones ``observe_*`` no hacen nada. Una vez activadas,
+se pueden publicar en un endpoint HTTP local (``serve``) o volcar a un
+archivo (``write``, compatible con el textfile collector de node_exporter).
+
+Solo usa la biblioteca estándar. Las métricas son por proceso: los workers
+de ParallelFiller devuelven el FillResult de cada fila y el proceso
+principal lo registra; los de la cola de trabajos no las comparten.
+"""
+
+from typing import TYPE_CHECKING, Dict, Iterable, List, Optional, Tuple
+import os
+import threading
+
+if TYPE_CHECKING:
+    from http.server import ThreadingHTTPServer
+
+
+# Límites de los histogramas
+LATENCY_BUCKETS = (
+    0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0
+)
+PAGE_BUCKETS = (1, 2, 5, 10, 20, 50, 100, 200, 500)
+FIELD_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000)
+THROUGHPUT_BUCKETS = (1, 5, 10, 25, 50, 100, 250, 500, 1000, 2500)
+
+CONTENT_TYPE = 'text/plain; version=0.0.4; charset=utf-8'
+
+
+def _format_labels(names: Tuple[str, ...], values: Tuple[str, ...], extra: str = '') -> str:
+    """Etiquetas ``{a="1",b="2"}`` (con los valores escapados)."""
+    parts = [
+        '{}="{}"'.format(name, str(value).replace('\\', '\\\\').replace('"', '\\"').replace('\n', '\\n'))
+        for name, value in zip(names, values)
+    ]
+    if extra:
+        parts.append(extra)
+    return '{' + ','.join(parts) + '}' if parts else ''
+
+
+def _format_value(value: float) -> str:
+    """Número en el formato de la exposición de texto."""
+    if value == float('inf'):
+        return '+Inf'
+    return repr(float(value)) if isinstance(value, float) and not value.is_integer() else str(int(value))
+
+
+class Counter:
+    """Contador monótono, opcionalmente con etiquetas."""
+
+    kind = 'counter'
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+        self._lock = threading.Lock()
+
+    def inc(self, amount: float = 1, **labels: str) -> None:
+        """Incrementa el contador de la combinación de etiquetas dada."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def samples(self) -> List[str]:
+        """Líneas de muestra del contador."""
+        with self._lock:
+            items = sorted(self._values.items())
+        return [f"{self.name}{_format_labels(self.labelnames, key)} {_format_value(value)}"
+                for key, value in items]
+
+
+class Histogram:
+    """Histograma con límites fijos, opcionalmente con etiquetas."""
+
+    kind = 'histogram'
+
+    def __init__(self, name: str, documentation: str, buckets: Iterable[float],
+                 labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.buckets = tuple(sorted(buckets)) + (float('inf'),)
+        self.labelnames = tuple(labelnames)
+        # etiquetas -> (conteos por límite, suma, total)
+        self._values: Dict[Tuple[str, ...], List] = {}
+        self._lock = threading.Lock()
+
+    def observe(self, value: float, **labels: str) -> None:
+        """Registra una observación."""
+        key = tuple(str(labels[name]) for name in self.labelnames)
+        with self._lock:
+            entry = self._values.get(key)
+            if entry is None:
+                entry = self._values[key] = [[0] * len(self.buckets), 0.0, 0]
+            for index, bound in enumerate(self.buckets):
+                if value <= bound:
+                    entry[0][index] += 1
+                    break
+            entry[1] += value
+            entry[2] += 1
+
+    def samples(self) -> List[str]:
+        """Líneas de muestra: límites acumulados, suma y total."""
+        with self._lock:
+            items = sorted(
+                (key, (list(counts), total, count)) for key, (counts, total, count) in self._values.items()
+            )
+
+        lines = []
+        for key, (counts, total, count) in items:
+            cumulative = 0
+            for bound, bucket_count in zip(self.buckets, counts):
+                cumulative += bucket_count
+                labels = _format_labels(self.labelnames, key, f'le="{_format_value(bound)}"')
+                lines.append(f"{self.name}_bucket{labels} {cumulative}")
+            labels = _format_labels(self.labelnames, key)
+            lines.append(f"{self.name}_sum{labels} {_format_value(total)}")
+            lines.append(f"{self.name}_count{labels} {count}")
+        return lines
+
+
+class MetricsRegistry:
+    """Métricas de extracción, relleno, cachés y lotes."""
+
+    def __init__(self, prefix: str = 'mcmpdf'):
+        """
+        Crea las métricas.
+
+        Args:
+            prefix: Prefijo de los nombres de las métricas
+        """
+        self.extract_seconds = Histogram(
+            f'{prefix}_extract_seconds', "Latencia de get_fields_with_labels", LATENCY_BUCKETS, ('cached',))
+        self.fill_seconds = Histogram(
+            f'{prefix}_fill_seconds', "Latencia de fill_pdf", LATENCY_BUCKETS, ('status',))
+        self.fill_stage_seconds = Histogram(
+            f'{prefix}_fill_stage_seconds', "Latencia de cada etapa de fill_pdf", LATENCY_BUCKETS, ('stage',))
+        self.template_pages = Histogram(
+            f'{prefix}_template_pages', "Páginas por template analizado", PAGE_BUCKETS)
+        self.template_fields = Histogram(
+            f'{prefix}_template_fields', "Campos por template analizado", FIELD_BUCKETS)
+        self.fields_total = Counter(
+            f'{prefix}_fill_fields_total', "Campos procesados al rellenar", ('result',))
+        self.fill_failures_total = Counter(
+            f'{prefix}_fill_failures_total', "Rellenados fallidos por clase de error", ('error_class',))
+        self.cache_requests_total = Counter(
+            f'{prefix}_cache_requests_total', "Consultas a las cachés", ('cache', 'result'))
+        self.batch_rows_total = Counter(
+            f'{prefix}_batch_rows_total', "Filas procesadas en lotes", ('status',))
+        self.batch_rows_per_second = Histogram(
+            f'{prefix}_batch_rows_per_second', "Rendimiento de cada lote (filas/s)", THROUGHPUT_BUCKETS)
+        self.batch_seconds = Histogram(
+            f'{prefix}_batch_seconds', "Duración de cada lote", LATENCY_BUCKETS + (120.0, 300.0, 900.0, 3600.0))
+
+        self.metrics = [
+            self.extract_seconds, self.fill_seconds, self.fill_stage_seconds,
+            self.template_pages, self.template_fields, self.fields_total,
+            self.fill_failures_total, self.cache_requests_total, self.batch_rows_total,
+            self.batch_rows_per_second, self.batch_seconds
+        ]
+
+    def render(self) -> str:
+        """
+        Todas las métricas en el formato de texto de Prometheus.
+
+        Returns:
+            Texto de la exposición
+        """
+        lines = []
+        for metric in self.metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.samples())
+        return '\n'.join(lines) + '\n'
+
+
+# Registro activo (None = métricas desactivadas)
+_registry: Optional[MetricsRegistry] = None
+_enable_lock = threading.Lock()
+
+
+def enable() -> MetricsRegistry:
+    """
+    Activa las métricas del proceso (si ya estaban activas, no hace nada).
+
+    Returns:
+        Registro de métricas activo
+    """
+    global _registry
+    with _enable_lock:
+        if _registry is None:
+            _registry = MetricsRegistry()
+        return _registry
+
+
+def disable() -> None:
+    """Desactiva las métricas y descarta los valores registrados."""
+    global _registry
+    _registry = None
+
+
+def registry() -> Optional[MetricsRegistry]:
+    """Registro activo, o None si las métricas están desactivadas."""
+    return _registry
+
+
+def observe_extraction(seconds: float, pages: int, fields: int, cached: Optional[bool]) -> None:
+    """
+    Registra una llamada a get_fields_with_labels.
+
+    Args:
+        seconds: Duración de la llamada
+        pages: Páginas del PDF
+        fields: Campos devueltos
+        cached: True/False si se consultó la caché de campos (None si no hay caché)
+    """
+    reg = _registry
+    if reg is None:
+        return
+    reg.extract_seconds.observe(seconds, cached='true' if cached else 'false')
+    reg.template_pages.observe(pages)
+    reg.template_fields.observe(fields)
+    if cached is not None:
+        reg.cache_requests_total.inc(cache='fields', result='hit' if cached else 'miss')
+
+
+def observe_fill(result) -> None:
+    """
+    Registra un rellenado a partir de su FillResult.
+
+    Args:
+        result: FillResult de fill_pdf
+    """
+    reg = _registry
+    if reg is None:
+        return
+    reg.fill_seconds.observe(result.total_time, status='ok' if result else 'error')
+    for stage, seconds in result.timings.items():
+        reg.fill_stage_seconds.observe(seconds, stage=stage)
+
+    counters = result.counters
+    reg.fields_total.inc(counters['fields_filled'], result='filled')
+    reg.fields_total.inc(counters['fields_skipped'], result='skipped')
+    reg.fields_total.inc(counters['fields_invalid'], result='invalid')
+    reg.cache_requests_total.inc(counters['appearance_cache_hits'], cache='appearance', result='hit')
+    reg.cache_requests_total.inc(counters['appearance_cache_misses'], cache='appearance', result='miss')
+
+    if not result:
+        reg.fill_failures_total.inc(error_class=result.error_class or 'Unknown')
+
+
+def observe_batch(rows: int, failed: int, seconds: float) -> None:
+    """
+    Registra un lote terminado.
+
+    Args:
+        rows: Filas procesadas
+        failed: Filas con error
+        seconds: Duración del lote
+    """
+    reg = _registry
+    if reg is None:
+        return
+    reg.batch_rows_total.inc(rows - failed, status='ok')
+    reg.batch_rows_total.inc(failed, status='error')
+    reg.batch_seconds.observe(seconds)
+    if rows and seconds > 0:
+        reg.batch_rows_per_second.observe(rows / seconds)
+
+
+def render() -> str:
+    """
+    Exposición de texto de las métricas activas.
+
+    Returns:
+        Texto en formato Prometheus (vacío si están desactivadas)
+    """
+    reg = _registry
+    return reg.render() if reg is not None else ''
+
+
+def write(path: str) -> None:
+    """
+    Vuelca las métricas a un archivo de forma atómica.
+
+    Args:
+        path: Ruta del archivo (p.ej. ``*.prom`` para el textfile collector)
+    """
+    temp_path = f"{path}.tmp"
+    with open(temp_path, 'w', encoding='utf-8') as f:
+        f.write(render())
+    os.replace(temp_path, path)
+
+
+def serve(port: int = 9464, host: str = '127.0.0.1') -> 'ThreadingHTTPServer':
+    """
+    Activa las métricas y las publica en ``http://host:port/metrics`` desde
+    un hilo en segundo plano.
+
+    http.server se importa aquí y no al cargar el módulo, para que los
+    procesos que no publican métricas no paguen su importación.
+
+    Args:
+        port: Puerto de escucha (0 = uno libre)
+        host: Dirección de escucha
+
+    Returns:
+        Servidor HTTP (``server.shutdown()`` lo detiene)
+    """
+    from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+    class _MetricsHandler(BaseHTTPRequestHandler):
+        """Responde GET /metrics con la exposición de texto."""
+
+        def do_GET(self) -> None:
+            if self.path.split('?', 1)[0] != '/metrics':
+                self.send_error(404)
+                return
+            body = render().encode('utf-8')
+            self.send_response(200)
+            self.send_header('Content-Type', CONTENT_TYPE)
+            self.send_header('Content-Length', str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+    enable()
+    server = ThreadingHTTPServer((host, port), _MetricsHandler)
+    thread = threading.Thread(target=server.serve_forever, name='metrics', daemon=True)
+    thread.start()
+    return server
@@ -0,0 +1,220 @@
+"""
+Módulo para rellenar lotes de PDFs en paralelo usando varios procesos.
+"""
+
+from concurrent.futures import ProcessPoolExecutor
+from collections import deque
+from typing import Dict, Any, List, Iterable, Iterator, Optional, Tuple
+import io
+import os
+import time
+
+from .pdf_filler import PDFFiller
+from .sources import Source, is_path, read_bytes
+
+
+# PDFFiller del proceso worker (uno por proceso, creado al arrancar)
+_worker_filler: Optional[PDFFiller] = None
+# Si True, el worker devuelve el FillResult de cada fila para que el proceso
+# principal registre sus métricas (las de los workers no se comparten)
+_worker_collects_metrics = False
+
+
+def _init_worker(template_bytes: Optional[bytes], mmap_path: Optional[str] = None,
+                 incremental: Optional[bool] = None,
+                 field_info: Optional[Dict[str, Dict[str, Any]]] = None,
+                 collect_metrics: bool = False) -> None:
+    """
+    Inicializa un proceso worker parseando el template una sola vez.
+
+    Args:
+        template_bytes: Contenido del PDF template (None si se usa mmap_path)
+        mmap_path: Ruta del template para proyectarlo en memoria; los
+            workers comparten así las páginas de la caché del sistema
+        incremental: Modo de escritura (ver PDFFiller)
+        field_info: Metadatos de campo del mapeo (ver PDFFiller)
+        collect_metrics: Devolver el FillResult de cada fila (ver _fill_chunk)
+    """
+    global _worker_filler, _worker_collects_metrics
+    _worker_collects_metrics = collect_metrics
+    if mmap_path is not None:
+        _worker_filler = PDFFiller(mmap_path, verbose=False, use_mmap=True, incremental=incremental,
+                                   field_info=field_info)
+    else:
+        _worker_filler = PDFFiller(io.BytesIO(template_bytes), verbose=False, incremental=incremental,
+                                   field_info=field_info)
+
+
+def _fill_chunk(tasks: List[Tuple[int, Dict[str, str], str, bool, bool]]) -> List[Dict[str, Any]]:
+    """
+    Rellena un bloque de filas dentro de un proceso worker.
+
+    Cada fila se procesa por separado: un error en una fila no afecta al resto.
+
+    Args:
+        tasks: Lista de (índice, datos, ruta_salida, aplanar, preprocesado)
+
+    Returns:
+        Lista de resultados, uno por fila y en el mismo orden. Si el worker
+        recoge métricas, cada resultado lleva además su ``fill_result``
+    """
+    results = []
+    for index, row, output_path, flatten, preprocessed in tasks:
+        fill_result = None
+        try:
+            fill_result = _worker_filler.fill_pdf(row, output_path, flatten=flatten,
+                                                  preprocessed=preprocessed)
+            success = bool(fill_result)
+            error = None if success else _worker_filler.last_error
+        except Exception as e:
+            success = False
+            error = f"{type(e).__name__}: {e}"
+
+        result = {
+            'index': index,
+            'output': output_path,
+            'success': success,
+            'error': error
+        }
+        if _worker_collects_metrics and fill_result is not None:
+            result['fill_result'] = fill_result
+        results.append(result)
+    return results
+
+
+class ParallelFiller:
+    """Rellena lotes de PDFs repartiendo bloques de filas entre varios procesos."""
+
+    def __init__(self, pdf_path: Source, workers: Optional[int] = None, chunksize: int = 25,
+                 use_mmap: bool = False, incremental: Optional[bool] = None,
+                 field_info: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        Inicializa el rellenador paralelo.
+
+        Args:
+            pdf_path: Ruta al PDF template, sus bytes o un objeto tipo archivo
+            workers: Número de procesos (por defecto, uno por CPU)
+            chunksize: Número de filas que procesa cada tarea
+            use_mmap: Si True (solo con rutas), cada worker proyecta el
+                template en memoria en vez de recibir una copia (ver PDFFiller)
+            incremental: Escribir cada PDF como actualización incremental
+                (por defecto, solo con use_mmap)
+            field_info: Metadatos de campo de un mapeo JSON (ver PDFFiller)
+        """
+        self.pdf_path = pdf_path
+        self.workers = workers or os.cpu_count() or 1
+        self.chunksize = max(1, chunksize)
+
+        if use_mmap:
+            if not is_path(pdf_path):
+                raise ValueError("use_mmap requiere la ruta del template")
+            self._initargs = (None, os.fspath(pdf_path), incremental, field_info)
+        else:
+            # El template se lee una vez y se envía a cada worker al arrancar
+            self._initargs = (read_bytes(pdf_path), None, incremental, field_info)
+
+    def iter_fill(self, rows: Iterable[Dict[str, str]], output_dir: str,
+                  filename_pattern: str = 'documento_{index:05d}.pdf',
+                  flatten: bool = False, preprocessed: bool = False) -> Iterator[Dict[str, Any]]:
+        """
+        Rellena un PDF por fila y devuelve los resultados en el orden de las filas.
+
+        Las filas se consumen de forma perezosa: solo hay unos pocos bloques
+        en vuelo por worker, así que ``rows`` puede ser un generador de
+        cualquier tamaño.
+
+        Args:
+            rows: Iterable de diccionarios {nombre_campo: valor}
+            output_dir: Carpeta donde guardar los PDFs generados
+            filename_pattern: Patrón del nombre de archivo (ver PDFFiller.fill_batch)
+            flatten: Si True, aplana cada PDF generado
+            preprocessed: Si True, las filas ya vienen normalizadas (p.ej.
+                por ColumnNormalizer) y los workers no las vuelven a convertir
+
+        Yields:
+            Un diccionario {index, output, success, error} por fila, en orden
+        """
+        # Importación diferida: las métricas son opcionales
+        from . import metrics
+
+        os.makedirs(output_dir, exist_ok=True)
+        max_in_flight = self.workers * 2
+        start = time.perf_counter()
+        total = failed = 0
+        # Las métricas de cada rellenado se registran aquí, con los
+        # FillResult que devuelven los workers
+        collect_metrics = metrics.registry() is not None
+
+        with ProcessPoolExecutor(max_workers=self.workers,
+                                 initializer=_init_worker,
+                                 initargs=self._initargs + (collect_metrics,)) as executor:
+            pending = deque()
+
+            def drain():
+                nonlocal total, failed
+                for result in pending.popleft().result():
+                    fill_result = result.pop('fill_result', None)
+                    if fill_result is not None:
+                        metrics.observe_fill(fill_result)
+                    total += 1
+                    failed += not result['success']
+                    yield result
+
+            for chunk in self._iter_chunks(rows, output_dir, filename_pattern, flatten, preprocessed):
+                pending.append(executor.submit(_fill_chunk, chunk))
+
+                # Limitar los bloques en vuelo para no cargar todo el CSV
+                while len(pending) >= max_in_flight:
+                    yield from drain()
+
+            while pending:
+                yield from drain()
+
+        metrics.observe_batch(total, failed, time.perf_counter() - start)
+
+    def fill_batch(self, rows: Iterable[Dict[str, str]], output_dir: str,
+                   filename_pattern: str = 'documento_{index:05d}.pdf',
+                   flatten: bool = False, preprocessed: bool = False) -> List[Dict[str, Any]]:
+        """
+        Rellena un PDF por fila en paralelo.
+
+        Args:
+            rows: Iterable de diccionarios {nombre_campo: valor}
+            output_dir: Carpeta donde guardar los PDFs generados
+            filename_pattern: Patrón del nombre de archivo (ver PDFFiller.fill_batch)
+            flatten: Si True, aplana cada PDF generado
+            preprocessed: Si True, las filas ya vienen normalizadas
+
+        Returns:
+            Lista de resultados {index, output, success, error}, en el orden de las filas
+        """
+        return list(self.iter_fill(rows, output_dir, filename_pattern, flatten, preprocessed))
+
+    def _iter_chunks(self, rows: Iterable[Dict[str, str]], output_dir: str,
+                     filename_pattern: str, flatten: bool,
+                     preprocessed: bool) -> Iterator[List[Tuple[int, Dict[str, str], str, bool, bool]]]:
+        """
+        Agrupa las filas en bloques de tareas para los workers.
+
+        Args:
+            rows: Iterable de filas
+            output_dir: Carpeta de salida
+            filename_pattern: Patrón del nombre de archivo
+            flatten: Si True, aplana cada PDF
+            preprocessed: Si True, las filas ya vienen normalizadas
+
+        Yields:
+            Bloques de (índice, datos, ruta_salida, aplanar, preprocesado)
+        """
+        chunk = []
+        used_names = set()
+        for index, row in enumerate(rows, start=1):
+            output_name = PDFFiller.build_output_name(filename_pattern, index, row, used_names)
+            chunk.append((index, row, os.path.join(output_dir, output_name), flatten, preprocessed))
+
+            if len(chunk) >= self.chunksize:
+                yield chunk
+                chunk = []
+
+        if chunk:
+            yield chunk
@@ -3,43 +3,107 @@ Módulo para extraer campos de formularios PDF y detectar sus etiquetas.
 """
 
 from pypdf import PdfReader
-from typing import Dict, List, Any, Tuple
+from typing import Dict, List, Any, Tuple, Optional, Union, Iterable
+import logging
 import re
+import time
+
+from .field_cache import FieldCache
+from .sources import Source, as_binary, is_path, map_file, source_hash
+from .text_index import TextGrid
+
+
+# Versión de la heurística de etiquetado. Cambiarla invalida las entradas
+# guardadas en FieldCache con la versión anterior.
+LABELING_VERSION = '4'
+
+logger = logging.getLogger(__name__)
 
 
 class PDFExtractor:
     """Extrae campos de formularios PDF y detecta etiquetas cercanas automáticamente."""
 
-    def __init__(self, pdf_path: str):
+    def __init__(self, pdf_path: Source, cache: Optional[FieldCache] = None,
+                 use_mmap: bool = False):
         """
         Inicializa el extractor.
 
         Args:
-            pdf_path: Ruta al archivo PDF
+            pdf_path: Ruta al archivo PDF, sus bytes o un objeto tipo archivo
+            cache: Caché persistente de campos/etiquetas (opcional)
+            use_mmap: Si True (solo con rutas), el PDF se proyecta en memoria
+                en lugar de leerse entero; solo se cargan los objetos usados
+        """
+        self.source = pdf_path
+        # Ruta en disco (None si el PDF llega en memoria)
+        self.pdf_path = pdf_path if is_path(pdf_path) else None
+        if use_mmap and self.pdf_path is None:
+            raise ValueError("use_mmap requiere la ruta del PDF")
+        self.reader = PdfReader(map_file(pdf_path) if use_mmap else as_binary(pdf_path))
+        self.cache = cache
+        # Referencia de anotación -> índice de página (se construye una vez)
+        self._annot_pages: Optional[Dict[int, int]] = None
+        # Referencia de página -> índice de página (se construye una vez)
+        self._page_indices: Optional[Dict[int, int]] = None
+        # Árbol de campos memorizado (un único recorrido del AcroForm)
+        self._raw_fields: Optional[Dict[str, Any]] = None
+        self._has_form: Optional[bool] = None
+        self._fields: Optional[Dict[str, Dict[str, Any]]] = None
+        # Índices de texto por página, extraídos bajo demanda
+        self._page_grids: Dict[int, TextGrid] = {}
+
+    def _get_raw_fields(self) -> Dict[str, Any]:
         """
-        self.pdf_path = pdf_path
-        self.reader = PdfReader(pdf_path)
+        Recorre el AcroForm una sola vez y memoriza el resultado.
+
+        Returns:
+            Diccionario nombre -> Field de pypdf (vacío si no hay formulario)
+        """
+        if self._raw_fields is None:
+            raw_fields = self.reader.get_fields()
+            self._has_form = raw_fields is not None
+            self._raw_fields = raw_fields or {}
+        return self._raw_fields
 
     def get_fields(self) -> Dict[str, Any]:
         """
         Extrae todos los campos del PDF.
 
+        El árbol de campos se recorre una sola vez por extractor; cada
+        llamada devuelve una copia que el llamador puede modificar.
+
         Returns:
             Diccionario con nombre_campo: {tipo, valor, opciones, rect, page}
         """
-        fields = {}
+        if self._fields is None:
+            self._fields = self._build_fields()
 
-        if self.reader.get_fields() is None:
-            return fields
+        return {name: dict(info) for name, info in self._fields.items()}
 
-        for field_name, field_data in self.reader.get_fields().items():
+    def _build_fields(self) -> Dict[str, Dict[str, Any]]:
+        """
+        Construye la información de todos los campos a partir del árbol memorizado.
+
+        Returns:
+            Diccionario con nombre_campo: {tipo, valor, opciones, rect, page, widgets}
+        """
+        fields = {}
+
+        for field_name, field_data in self._get_raw_fields().items():
+            widgets = self._get_field_widgets(field_data)
+            field_type = self._get_field_type(field_data)
             field_info = {
-                'type': self._get_field_type(field_data),
+                'type': field_type,
                 'value': field_data.get('/V', ''),
                 'options': self._get_field_options(field_data),
                 'required': field_data.get('/Ff', 0) & 2 == 2,
-                'rect': self._get_field_rect(field_data),
-                'page': self._get_field_page(field_data)
+                'rect': widgets[0]['rect'] if widgets else None,
+                'page': widgets[0]['page'] if widgets else 0,
+                'widgets': widgets,
+                'export_values': (
+                    self._get_export_values(field_data)
+                    if field_type in ('checkbox', 'radio') else []
+                )
             }
             fields[field_name] = field_info
 
@@ -52,8 +116,7 @@ class PDFExtractor:
         Returns:
             Lista con nombres de campos
         """
-        fields = self.get_fields()
-        return list(fields.keys())
+        return list(self._get_raw_fields().keys())
 
     def _get_field_type(self, field_data: Dict) -> str:
         """
@@ -96,57 +159,133 @@ class PDFExtractor:
             return [opt if isinstance(opt, str) else opt[1] for opt in options]
         return []
 
-    def _get_field_rect(self, field_data: Dict) -> Tuple[float, float, float, float]:
+    def _get_export_values(self, field_data: Dict) -> List[str]:
         """
-        Obtiene el rectángulo (bounding box) del campo.
+        Obtiene los estados "activo" de un checkbox/radio desde sus /AP.
+
+        Muchos formularios usan estados como /On o /1 en lugar de /Yes.
 
         Args:
             field_data: Datos del campo del PDF
 
         Returns:
-            Tupla (left, bottom, right, top) o None si no existe
+            Lista de nombres de estado (p.ej. ['/On']), sin /Off
         """
+        export_values = []
+
         try:
-            # Buscar /Rect en diferentes ubicaciones posibles
-            if '/Rect' in field_data:
-                rect = field_data['/Rect']
-                return (float(rect[0]), float(rect[1]), float(rect[2]), float(rect[3]))
-
-            # Buscar en anotaciones
-            if '/Kids' in field_data and len(field_data['/Kids']) > 0:
-                kid = field_data['/Kids'][0].get_object()
-                if '/Rect' in kid:
-                    rect = kid['/Rect']
-                    return (float(rect[0]), float(rect[1]), float(rect[2]), float(rect[3]))
-        except:
+            field_ref = getattr(field_data, 'indirect_reference', None)
+            field_obj = field_ref.get_object() if field_ref is not None else field_data
+            widgets = [field_obj] if '/AP' in field_obj else [
+                kid.get_object() for kid in field_obj.get('/Kids', [])
+            ]
+
+            for widget in widgets:
+                normal = widget.get('/AP', {}).get('/N', {})
+                normal = normal.get_object() if hasattr(normal, 'get_object') else normal
+                # Un stream (botón pulsador) no tiene estados con nombre
+                if hasattr(normal, 'get_data') or not hasattr(normal, 'keys'):
+                    continue
+                for state in normal.keys():
+                    if state != '/Off' and state not in export_values:
+                        export_values.append(str(state))
+        except Exception:
             pass
 
+        return export_values
+
+    def _build_page_maps(self) -> None:
+        """
+        Construye una sola vez los mapas de referencias a índices de página.
+
+        Se indexan tanto las páginas (para resolver /P de los widgets) como
+        las anotaciones de cada página (para widgets sin /P).
+        """
+        self._page_indices = {}
+        self._annot_pages = {}
+
+        for i, page in enumerate(self.reader.pages):
+            if page.indirect_reference is not None:
+                self._page_indices[page.indirect_reference.idnum] = i
+
+            annots = page.get('/Annots')
+            if not annots:
+                continue
+            for annot in annots.get_object():
+                if hasattr(annot, 'idnum'):
+                    self._annot_pages[annot.idnum] = i
+
+    def _get_widget_page(self, widget_ref: Any, widget: Dict) -> Optional[int]:
+        """
+        Obtiene el índice de página de un widget con una búsqueda en diccionario.
+
+        Args:
+            widget_ref: Referencia indirecta del widget (o None)
+            widget: Diccionario del widget
+
+        Returns:
+            Número de página (0-indexed) o None si no se puede determinar
+        """
+        if self._page_indices is None:
+            self._build_page_maps()
+
+        page_ref = widget.get('/P')
+        if page_ref is not None and hasattr(page_ref, 'idnum'):
+            page_num = self._page_indices.get(page_ref.idnum)
+            if page_num is not None:
+                return page_num
+
+        if widget_ref is not None and hasattr(widget_ref, 'idnum'):
+            return self._annot_pages.get(widget_ref.idnum)
+
         return None
 
-    def _get_field_page(self, field_data: Dict) -> int:
+    @staticmethod
+    def _rect_tuple(rect: Any) -> Tuple[float, float, float, float]:
+        """Convierte un /Rect en tupla (left, bottom, right, top)."""
+        return (float(rect[0]), float(rect[1]), float(rect[2]), float(rect[3]))
+
+    def _get_field_widgets(self, field_data: Dict) -> List[Dict[str, Any]]:
         """
-        Obtiene el número de página del campo.
+        Obtiene todos los widgets de un campo con su página y rectángulo.
+
+        Un campo puede tener un único widget fusionado con el propio campo
+        o varios widgets en /Kids, incluso en páginas distintas.
 
         Args:
             field_data: Datos del campo del PDF
 
         Returns:
-            Número de página (0-indexed) o 0 si no se puede determinar
+            Lista de {page, rect}, en el orden de los widgets
         """
+        widgets = []
+
         try:
-            # Buscar en anotaciones
-            if '/Kids' in field_data and len(field_data['/Kids']) > 0:
-                kid = field_data['/Kids'][0].get_object()
-                if '/P' in kid:
-                    page_obj = kid['/P']
-                    # Buscar el índice de la página
-                    for i, page in enumerate(self.reader.pages):
-                        if page.indirect_reference == page_obj:
-                            return i
-        except:
+            # Los Field de pypdf solo copian algunos atributos; /Rect y /P
+            # están en el diccionario original
+            field_ref = getattr(field_data, 'indirect_reference', None)
+            field_obj = field_ref.get_object() if field_ref is not None else field_data
+
+            if '/Rect' in field_obj:
+                candidates = [(field_ref, field_obj)]
+            else:
+                candidates = []
+                for kid_ref in field_obj.get('/Kids', []):
+                    kid = kid_ref.get_object()
+                    # Los hijos con /T son subcampos, no widgets de este campo
+                    if '/Rect' in kid and '/T' not in kid:
+                        candidates.append((kid_ref, kid))
+
+            for widget_ref, widget in candidates:
+                page_num = self._get_widget_page(widget_ref, widget)
+                widgets.append({
+                    'page': page_num if page_num is not None else 0,
+                    'rect': self._rect_tuple(widget['/Rect'])
+                })
+        except Exception:
             pass
 
-        return 0
+        return widgets
 
     def _extract_text_with_positions(self, page_num: int) -> List[Dict[str, Any]]:
         """
@@ -182,12 +321,12 @@ class PDFExtractor:
         try:
             page.extract_text(visitor_text=visitor_body)
         except Exception as e:
-            print(f"[WARNING] Error al extraer texto de página {page_num}: {e}")
+            logger.warning("Error al extraer texto de página %d: %s", page_num, e)
 
         return text_elements
 
     def _find_nearest_text(self, field_rect: Tuple[float, float, float, float],
-                          text_elements: List[Dict[str, Any]]) -> str:
+                          text_elements: Union[TextGrid, List[Dict[str, Any]]]) -> str:
         """
         Encuentra el texto más cercano a un campo.
 
@@ -195,7 +334,8 @@ class PDFExtractor:
 
         Args:
             field_rect: Rectángulo del campo (left, bottom, right, top)
-            text_elements: Lista de elementos de texto con posiciones
+            text_elements: Índice TextGrid de la página, o lista de elementos
+                de texto con posiciones (se indexa al vuelo)
 
         Returns:
             Texto más cercano o None
@@ -203,87 +343,167 @@ class PDFExtractor:
         if not field_rect or not text_elements:
             return None
 
-        field_left, field_bottom, field_right, field_top = field_rect
-        field_center_x = (field_left + field_right) / 2
-        field_center_y = (field_bottom + field_top) / 2
+        if not isinstance(text_elements, TextGrid):
+            text_elements = TextGrid(text_elements)
 
-        # Buscar texto cercano
-        candidates = []
+        nearest = text_elements.nearest(field_rect)
+        if nearest is None:
+            return None
 
-        for elem in text_elements:
-            text = elem['text']
-            x = elem['x']
-            y = elem['y']
+        # Limpiar el texto
+        text = nearest.strip()
+        # Eliminar dos puntos al final
+        text = re.sub(r':$', '', text)
+        # Limpiar caracteres especiales innecesarios
+        text = re.sub(r'[*_]', '', text)
 
-            # Ignorar texto muy corto o que parece ser un valor de campo
-            if len(text) < 2 or text.isdigit():
-                continue
+        return text.strip()
 
-            # Calcular distancia al campo
-            # Priorizar texto a la izquierda o arriba
-            distance = abs(x - field_left) + abs(y - field_center_y)
+    def _get_page_text_index(self, page_num: int) -> TextGrid:
+        """
+        Obtiene el índice de texto de una página, extrayéndolo solo la primera vez.
 
-            # Si el texto está a la izquierda del campo, darle prioridad
-            if x < field_left and abs(y - field_center_y) < 50:
-                distance *= 0.5  # Reducir distancia para dar prioridad
+        Args:
+            page_num: Número de página (0-indexed)
 
-            # Si el texto está arriba del campo, también es bueno
-            elif y > field_top and abs(x - field_center_x) < 100:
-                distance *= 0.7
+        Returns:
+            TextGrid con los textos de la página
+        """
+        grid = self._page_grids.get(page_num)
+        if grid is None:
+            grid = TextGrid(self._extract_text_with_positions(page_num))
+            self._page_grids[page_num] = grid
+        return grid
+
+    def get_fields_with_labels(self, field_names: Optional[Iterable[str]] = None,
+                               pages: Optional[Iterable[int]] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Obtiene campos con etiquetas detectadas automáticamente.
 
-            candidates.append({
-                'text': text,
-                'distance': distance,
-                'x': x,
-                'y': y
-            })
+        El texto solo se extrae de las páginas que contienen widgets de los
+        campos pedidos, y cada página se extrae una sola vez por extractor.
 
-        # Ordenar por distancia y tomar el más cercano
-        if candidates:
-            candidates.sort(key=lambda c: c['distance'])
-            nearest = candidates[0]
+        Si el extractor tiene caché, el resultado se busca primero por el
+        hash del contenido del PDF y solo se calcula si no está guardado.
 
-            # Limpiar el texto
-            text = nearest['text'].strip()
-            # Eliminar dos puntos al final
-            text = re.sub(r':$', '', text)
-            # Limpiar caracteres especiales innecesarios
-            text = re.sub(r'[*_]', '', text)
+        Args:
+            field_names: Si se indica, solo se devuelven estos campos
+            pages: Si se indica, solo se devuelven los campos con algún
+                widget en estas páginas (0-indexed), y la etiqueta es la del
+                primero de esos widgets; no se extrae texto de otras páginas
 
-            return text.strip()
+        Returns:
+            Diccionario con campos y sus etiquetas detectadas
+        """
+        # Importación diferida: las métricas son opcionales
+        from . import metrics
+
+        start = time.perf_counter()
+        page_filter = set(pages) if pages is not None else None
+        name_filter = set(field_names) if field_names is not None else None
+        full_request = page_filter is None and name_filter is None
+
+        pdf_hash = None
+        if self.cache is not None:
+            pdf_hash = source_hash(self.source)
+            cached = self.cache.get(pdf_hash, LABELING_VERSION)
+            if cached is not None:
+                fields = self._select_fields(cached, name_filter, page_filter)
+                if page_filter is not None:
+                    for field_name, field_data in fields.items():
+                        field_data['label'] = self._field_label(field_name, field_data, page_filter)
+                metrics.observe_extraction(time.perf_counter() - start, len(self.reader.pages),
+                                           len(fields), cached=True)
+                return fields
+
+        fields = self._select_fields(self.get_fields(), name_filter, page_filter)
+
+        # Detectar etiquetas junto a cada widget de las páginas pedidas; la
+        # del campo es la del primero. Las de todos los widgets se guardan en
+        # caché para poder responder también a peticiones filtradas
+        for field_name, field_data in fields.items():
+            widgets = [dict(widget) for widget in field_data.get('widgets', [])]
+            for widget in widgets:
+                if page_filter is None or widget['page'] in page_filter:
+                    widget['label'] = self._widget_label(field_name, widget)
 
-        return None
+            field_data['widgets'] = widgets
+            field_data['label'] = self._field_label(field_name, field_data, page_filter)
 
-    def get_fields_with_labels(self) -> Dict[str, Dict[str, Any]]:
+        # Solo se guardan en caché los resultados completos
+        if self.cache is not None and full_request:
+            self.cache.put(pdf_hash, LABELING_VERSION, fields)
+
+        metrics.observe_extraction(time.perf_counter() - start, len(self.reader.pages), len(fields),
+                                   cached=False if self.cache is not None else None)
+        return fields
+
+    @staticmethod
+    def _select_fields(fields: Dict[str, Dict[str, Any]],
+                       name_filter: Optional[set],
+                       page_filter: Optional[set]) -> Dict[str, Dict[str, Any]]:
         """
-        Obtiene campos con etiquetas detectadas automáticamente.
+        Filtra los campos por nombre y/o por página.
+
+        Args:
+            fields: Diccionario de campos
+            name_filter: Nombres a conservar (None = todos)
+            page_filter: Páginas a conservar (None = todas)
 
         Returns:
-            Diccionario con campos y sus etiquetas detectadas
+            Diccionario de campos filtrado
         """
-        fields = self.get_fields()
-
-        # Extraer texto por página
-        page_texts = {}
-        for page_num in range(len(self.reader.pages)):
-            page_texts[page_num] = self._extract_text_with_positions(page_num)
+        if name_filter is None and page_filter is None:
+            return fields
 
-        # Detectar etiquetas para cada campo
+        selected = {}
         for field_name, field_data in fields.items():
-            page_num = field_data.get('page', 0)
-            field_rect = field_data.get('rect')
+            if name_filter is not None and field_name not in name_filter:
+                continue
+            if page_filter is not None and not any(
+                widget['page'] in page_filter for widget in field_data.get('widgets', [])
+            ):
+                continue
+            selected[field_name] = field_data
+        return selected
+
+    def _widget_label(self, field_name: str, widget: Dict[str, Any]) -> str:
+        """
+        Detecta la etiqueta junto a un widget.
+
+        Args:
+            field_name: Nombre técnico del campo
+            widget: Widget {page, rect}
 
-            label = None
-            if field_rect and page_num in page_texts:
-                label = self._find_nearest_text(field_rect, page_texts[page_num])
+        Returns:
+            Texto más cercano o, si no hay, el nombre del campo limpio
+        """
+        label = None
+        if widget.get('rect'):
+            label = self._find_nearest_text(widget['rect'], self._get_page_text_index(widget['page']))
 
-            # Si no encontramos etiqueta, usar el nombre del campo limpio
-            if not label or len(label) < 2:
-                label = self._clean_field_name(field_name)
+        # Si no encontramos etiqueta, usar el nombre del campo limpio
+        if not label or len(label) < 2:
+            label = self._clean_field_name(field_name)
+        return label
 
-            fields[field_name]['label'] = label
+    def _field_label(self, field_name: str, field_data: Dict[str, Any],
+                     page_filter: Optional[set]) -> str:
+        """
+        Elige la etiqueta del campo: la del primer widget de las páginas pedidas.
 
-        return fields
+        Args:
+            field_name: Nombre técnico del campo
+            field_data: Datos del campo con las etiquetas de sus widgets
+            page_filter: Páginas permitidas (None = todas)
+
+        Returns:
+            Etiqueta del campo
+        """
+        for widget in field_data.get('widgets', []):
+            if (page_filter is None or widget['page'] in page_filter) and 'label' in widget:
+                return widget['label']
+        return self._clean_field_name(field_name)
 
     def _clean_field_name(self, field_name: str) -> str:
         """
@@ -314,11 +534,12 @@ class PDFExtractor:
         Returns:
             Diccionario con información del PDF
         """
+        field_names = self.get_field_names()
         info = {
             'num_pages': len(self.reader.pages),
-            'num_fields': len(self.get_fields()),
-            'has_form': self.reader.get_fields() is not None,
-            'field_names': self.get_field_names()
+            'num_fields': len(field_names),
+            'has_form': self._has_form,
+            'field_names': field_names
         }
 
         return info
@@ -349,4 +570,4 @@ if __name__ == "__main__":
             if data['required']:
                 print(f"  ⚠️  REQUERIDO")
     else:
-        print("Uso: python pdf_extractor.py <archivo.pdf>")
+        print("Uso: python -m utils.pdf_extractor <archivo.pdf>")
@@ -3,54 +3,178 @@ Módulo para rellenar formularios PDF con datos.
 """
 
 from pypdf import PdfReader, PdfWriter
-from typing import Dict, Any, List
+from typing import Dict, Any, Callable, List, Iterable, Optional, Set, Union, BinaryIO
+import io
+import logging
+import os
+import re
+import time
+
+from . import bundle
+from .appearance import AppearanceCache
+from .fill_result import FillResult
+from .flatten import flatten_writer
+from .sources import Source, as_binary, display_name, is_path, map_file, open_output
+from .template import CompiledTemplate
+
+
+logger = logging.getLogger(__name__)
 
 
 class PDFFiller:
     """Rellena formularios PDF con datos proporcionados."""
 
-    def __init__(self, pdf_path: str):
+    def __init__(self, pdf_path: Source, verbose: bool = True, appearance_cache_size: int = 1024,
+                 use_mmap: bool = False, incremental: Optional[bool] = None,
+                 field_info: Optional[Dict[str, Dict[str, Any]]] = None):
         """
         Inicializa el rellenador.
 
         Args:
-            pdf_path: Ruta al PDF template
+            pdf_path: Ruta al PDF template, sus bytes o un objeto tipo archivo
+            verbose: Si True, emite los mensajes de progreso por el logger
+                del módulo (siempre quedan en el FillResult de cada rellenado)
+            appearance_cache_size: Máximo de entradas de la caché de apariencias
+            use_mmap: Si True (solo con rutas), el template se proyecta en
+                memoria en lugar de leerse entero
+            incremental: Si True, cada PDF se escribe como actualización
+                incremental: los bytes del template se copian tal cual y solo
+                se añaden los objetos modificados (mantiene válidas las firmas
+                del template). Por defecto, True solo con use_mmap. Sin él,
+                cada rellenado clona el documento completo y su coste crece
+                con el número de páginas; para un coste por rellenado que no
+                dependa del tamaño del template hay que usar incremental=True
+            field_info: Metadatos de campo de un mapeo JSON
+                (``CSVHandler.load_mapping_data(...)['fields']``): el template
+                usa sus tipos y estados en lugar de detectarlos en el PDF
         """
-        self.pdf_path = pdf_path
-        self.reader = PdfReader(pdf_path)
+        # Ruta en disco (None si el template llega en memoria)
+        self.pdf_path = pdf_path if is_path(pdf_path) else None
+        if use_mmap and self.pdf_path is None:
+            raise ValueError("use_mmap requiere la ruta del template")
+        self.mmap = map_file(pdf_path) if use_mmap else None
+        self.incremental = use_mmap if incremental is None else incremental
+        self.reader = PdfReader(self.mmap if self.mmap is not None else as_binary(pdf_path))
+        self.verbose = verbose
+        # Motivo del último fallo de fill_pdf (None si terminó bien)
+        self.last_error: Optional[str] = None
+        # Resultado instrumentado del último fill_pdf
+        self.last_result: Optional[FillResult] = None
+        self._template: Optional[CompiledTemplate] = None
+        self._field_info = field_info
+        # Partes fijas de las apariencias por (fuente, tamaño, rect, alineación),
+        # compartidas entre todos los rellenados de este template
+        self.appearance_cache = AppearanceCache(appearance_cache_size)
+
+    @property
+    def template(self) -> CompiledTemplate:
+        """Template compilado (se analiza una sola vez, en el primer uso)."""
+        if self._template is None:
+            self._template = CompiledTemplate(self.reader, self._field_info)
+        return self._template
+
+    def _log(self, message: str, level: int = logging.INFO,
+             result: Optional[FillResult] = None) -> None:
+        """
+        Registra un mensaje de progreso.
 
-    def fill_pdf(self, data: Dict[str, str], output_path: str, flatten: bool = False) -> bool:
+        El mensaje se guarda en el resultado del rellenado (si lo hay) y, en
+        modo verbose, se emite por el logger del módulo.
+        """
+        if result is not None:
+            result.log(level, message)
+        if self.verbose:
+            logger.log(level, message)
+
+    def fill_pdf(self, data: Dict[str, str], output_path: Union[str, os.PathLike, BinaryIO],
+                 flatten: bool = False, preprocessed: bool = False,
+                 incremental: Optional[bool] = None) -> FillResult:
         """
         Rellena el PDF con los datos proporcionados.
 
         Args:
             data: Diccionario con {nombre_campo: valor}
-            output_path: Ruta donde guardar el PDF rellenado
+            output_path: Ruta donde guardar el PDF rellenado, o cualquier
+                stream binario con ``write`` (no se cierra)
             flatten: Si True, el PDF se "aplana" (no se pueden editar los campos después)
+            preprocessed: Si True, ``data`` ya viene normalizado (p.ej. por
+                ColumnNormalizer) y no se vuelve a procesar
+            incremental: Escribir como actualización incremental (por
+                defecto, el modo elegido al crear el rellenador). Aplanar
+                elimina el AcroForm, así que invalida las firmas del template
 
         Returns:
-            True si se rellenó correctamente, False si hubo error
+            FillResult con mensajes, tiempos por etapa y contadores; se
+            evalúa como True si se rellenó correctamente (también queda en
+            ``last_result``)
         """
-        try:
-            writer = PdfWriter()
-
-            # Copiar todas las páginas del PDF original
-            for page in self.reader.pages:
-                writer.add_page(page)
-
-            # Obtener los campos disponibles en el PDF
-            pdf_fields = writer.get_fields()
-            if not pdf_fields:
-                print("[ERROR] El PDF no tiene campos de formulario")
-                return False
+        result = FillResult(display_name(output_path))
+        self.last_result = result
+        self.last_error = None
+        if incremental is None:
+            incremental = self.incremental
 
-            print(f"[INFO] PDF tiene {len(pdf_fields)} campos disponibles")
-            print(f"[INFO] CSV tiene {len(data)} valores para rellenar")
-
-            # Procesar datos
-            processed_data = self._process_data(data)
+        try:
+            self._fill(result, data, output_path, flatten, preprocessed, incremental)
+        except Exception as e:
+            result.error = f"{type(e).__name__}: {e}"
+            result.error_class = type(e).__name__
+            self._log(f"Error al rellenar PDF: {e}", logging.ERROR, result)
+            if self.verbose:
+                logger.debug("Traza del error", exc_info=True)
+
+        self.last_error = result.error
+        # Importación diferida: las métricas son opcionales y no deben
+        # cargarse al importar el rellenador
+        from . import metrics
+        metrics.observe_fill(result)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug("fill_pdf %s", 'ok' if result else 'error', extra={'fill_result': result.to_dict()})
+        return result
+
+    def _fill(self, result: FillResult, data: Dict[str, str],
+              output_path: Union[str, os.PathLike, BinaryIO],
+              flatten: bool, preprocessed: bool, incremental: bool) -> None:
+        """
+        Etapas de fill_pdf; el éxito o el motivo del fallo quedan en ``result``.
 
-            # Filtrar solo los datos que corresponden a campos existentes
+        Args:
+            result: Resultado a completar
+            data: Diccionario con {nombre_campo: valor}
+            output_path: Ruta o stream de salida
+            flatten: Si True, aplanar
+            preprocessed: Si True, ``data`` ya viene normalizado
+            incremental: Escribir como actualización incremental
+        """
+        # El template se compila una sola vez (solo cuenta en el primer rellenado)
+        if self._template is None:
+            with result.stage('parse'):
+                self.template
+
+        # Clonar el documento completo (páginas + AcroForm) desde el
+        # template ya compilado
+        with result.stage('clone'):
+            writer = self.template.new_writer(incremental=incremental)
+
+        # Obtener los campos disponibles en el PDF (resueltos una sola vez)
+        with result.stage('resolve'):
+            pdf_fields = self._get_field_names()
+        if not pdf_fields:
+            result.error = "El PDF no tiene campos de formulario"
+            result.error_class = 'NoFormFields'
+            self._log(result.error, logging.ERROR, result)
+            return
+
+        self._log(f"PDF tiene {len(pdf_fields)} campos disponibles", result=result)
+        self._log(f"CSV tiene {len(data)} valores para rellenar", result=result)
+
+        # Procesar datos
+        with result.stage('coercion'):
+            processed_data = data if preprocessed else self._process_data(data)
+        result.counters['fields_skipped'] = len(data) - len(processed_data)
+
+        # Filtrar solo los datos que corresponden a campos existentes
+        with result.stage('resolve'):
             valid_data = {}
             invalid_fields = []
 
@@ -60,87 +184,264 @@ class PDFFiller:
                 else:
                     invalid_fields.append(field_name)
 
-            if invalid_fields:
-                print(f"[WARNING] Campos no encontrados en PDF: {', '.join(invalid_fields[:5])}")
-                if len(invalid_fields) > 5:
-                    print(f"[WARNING] ... y {len(invalid_fields) - 5} más")
+        result.counters['fields_invalid'] = len(invalid_fields)
+        result.counters['fields_filled'] = len(valid_data)
 
-            if not valid_data:
-                print("[ERROR] Ningún campo del CSV coincide con los campos del PDF")
-                return False
+        if invalid_fields:
+            self._log(f"Campos no encontrados en PDF: {', '.join(invalid_fields[:5])}", logging.WARNING, result)
+            if len(invalid_fields) > 5:
+                self._log(f"... y {len(invalid_fields) - 5} más", logging.WARNING, result)
+
+        if not valid_data:
+            result.error = "Ningún campo del CSV coincide con los campos del PDF"
+            result.error_class = 'NoMatchingFields'
+            self._log(result.error, logging.ERROR, result)
+            return
 
-            print(f"[INFO] Rellenando {len(valid_data)} campos válidos")
+        self._log(f"Rellenando {len(valid_data)} campos válidos", result=result)
 
-            # Rellenar campos
+        # Rellenar campos (valores y apariencias)
+        cache = self.appearance_cache
+        hits, misses = cache.hits, cache.misses
+        try:
+            with result.stage('appearance'):
+                widgets = self.template.apply_values(writer, valid_data, cache)
+            result.counters['widgets'] = widgets
+            result.counters['appearance_cache_hits'] = cache.hits - hits
+            result.counters['appearance_cache_misses'] = cache.misses - misses
+            self._log(f"Campos actualizados correctamente ({widgets} widgets)", result=result)
+        except Exception as e:
+            self._log(f"Error al actualizar campos: {e}", logging.ERROR, result)
+            # Intentar método alternativo página por página (requiere
+            # un PdfWriter completo)
+            self._log("Intentando método alternativo...", result=result)
+            with result.stage('appearance'):
+                success = isinstance(writer, PdfWriter) and self._fill_page_by_page(writer, valid_data, result)
+            if not success:
+                result.error = f"Error al actualizar campos: {e}"
+                result.error_class = type(e).__name__
+                return
+
+        # Aplanar si se solicita: las apariencias pasan al contenido de
+        # cada página y el AcroForm se elimina. Si falla no se guarda
+        # nada, para no dejar un PDF aplanado a medias
+        if flatten:
             try:
-                writer.update_form_field_values(valid_data)
-                print("[SUCCESS] Campos actualizados correctamente")
+                with result.stage('flatten'):
+                    flattened = flatten_writer(writer)
+                result.counters['flattened'] = flattened
+                self._log(f"PDF aplanado exitosamente ({flattened} widgets)", result=result)
             except Exception as e:
-                print(f"[ERROR] Error al actualizar campos: {e}")
-                # Intentar método alternativo página por página
-                print("[INFO] Intentando método alternativo...")
-                success = self._fill_page_by_page(writer, valid_data)
-                if not success:
-                    return False
-
-            # Aplanar si se solicita
-            if flatten:
-                try:
-                    # Flatten anotaciones pero mantener el contenido visible
-                    for page in writer.pages:
-                        if '/Annots' in page:
-                            page.flatten_annotations()
-                    print("[INFO] PDF aplanado exitosamente")
-                except Exception as e:
-                    print(f"[WARNING] Error al aplanar PDF: {e}")
-
-            # Guardar el PDF rellenado
-            with open(output_path, 'wb') as output_file:
+                result.error = f"Error al aplanar PDF: {e}"
+                result.error_class = type(e).__name__
+                self._log(result.error, logging.ERROR, result)
+                return
+
+        # Guardar el PDF rellenado
+        with result.stage('write'):
+            with open_output(output_path) as output_file:
                 writer.write(output_file)
 
-            print(f"[SUCCESS] PDF guardado en: {output_path}")
-            return True
+        result.success = True
+        self._log(f"PDF guardado en: {display_name(output_path)}", result=result)
 
-        except Exception as e:
-            print(f"[ERROR] Error al rellenar PDF: {e}")
-            import traceback
-            traceback.print_exc()
-            return False
+    def fill_bytes(self, data: Dict[str, str], flatten: bool = False,
+                   preprocessed: bool = False, incremental: Optional[bool] = None) -> Optional[bytes]:
+        """
+        Rellena el PDF en memoria, sin archivos intermedios.
+
+        Args:
+            data: Diccionario con {nombre_campo: valor}
+            flatten: Si True, el PDF se "aplana"
+            preprocessed: Si True, ``data`` ya viene normalizado
+            incremental: Escribir como actualización incremental (ver fill_pdf)
+
+        Returns:
+            Bytes del PDF rellenado, o None si hubo error (ver last_error)
+        """
+        buffer = io.BytesIO()
+        if not self.fill_pdf(data, buffer, flatten=flatten, preprocessed=preprocessed,
+                             incremental=incremental):
+            return None
+        return buffer.getvalue()
+
+    def fill_batch(self, rows: Iterable[Dict[str, str]], output_dir: str,
+                   filename_pattern: str = 'documento_{index:05d}.pdf',
+                   flatten: bool = False, preprocessed: bool = False) -> Dict[str, Any]:
+        """
+        Rellena un PDF por cada fila de datos (modo combinación de correspondencia).
+
+        El template se parsea y compila una sola vez; cada fila solo clona el
+        documento y rellena los widgets de sus campos. Las filas se consumen de una en una, por lo que
+        ``rows`` puede ser un generador (p.ej. CSVHandler.iter_rows_with_mapping).
+
+        Args:
+            rows: Iterable de diccionarios {nombre_campo: valor}
+            output_dir: Carpeta donde guardar los PDFs generados
+            filename_pattern: Patrón del nombre de archivo. Admite ``{index}``
+                (número de fila, empezando en 1) y cualquier nombre de campo,
+                p.ej. ``'solicitud_{index:05d}_{dni}.pdf'``. Los nombres
+                repetidos reciben un sufijo (``_2``, ``_3``...)
+            flatten: Si True, aplana cada PDF generado
+            preprocessed: Si True, las filas ya vienen normalizadas
+                (ver ColumnNormalizer)
+
+        Returns:
+            Diccionario con {total, ok, failed, outputs, errors}; ``errors``
+            es una lista de (índice, nombre de archivo, error)
+        """
+        os.makedirs(output_dir, exist_ok=True)
+
+        summary = {
+            'total': 0,
+            'ok': 0,
+            'failed': 0,
+            'outputs': [],
+            'errors': []
+        }
+
+        # Los mensajes por fila solo ensucian la salida en lotes grandes
+        verbose = self.verbose
+        self.verbose = False
+        start = time.perf_counter()
+        used_names = set()
+
+        try:
+            for index, row in enumerate(rows, start=1):
+                summary['total'] += 1
+                output_name = self.build_output_name(filename_pattern, index, row, used_names)
+                output_path = os.path.join(output_dir, output_name)
+
+                result = self.fill_pdf(row, output_path, flatten=flatten, preprocessed=preprocessed)
+                if result:
+                    summary['ok'] += 1
+                    summary['outputs'].append(output_path)
+                else:
+                    summary['failed'] += 1
+                    summary['errors'].append((index, output_name, result.error))
+
+                if verbose and index % 500 == 0:
+                    logger.info("%d filas procesadas (%d con error)", index, summary['failed'])
+        finally:
+            self.verbose = verbose
+
+        from . import metrics
+        metrics.observe_batch(summary['total'], summary['failed'], time.perf_counter() - start)
+        self._log(f"Lote terminado: {summary['ok']}/{summary['total']} PDFs generados en {output_dir}")
+        return summary
+
+    def fill_zip(self, rows: Iterable[Dict[str, str]], output: Union[str, os.PathLike, BinaryIO],
+                 filename_pattern: str = 'documento_{index:05d}.pdf',
+                 flatten: bool = False, preprocessed: bool = False,
+                 incremental: Optional[bool] = None,
+                 progress: Optional[Callable[[Dict[str, Any]], None]] = None) -> Dict[str, Any]:
+        """
+        Rellena un PDF por fila y los escribe directamente en un ZIP.
+
+        Solo se mantiene en memoria el PDF que se está generando; se añade
+        al ZIP si el rellenado termina bien. Al final se añade
+        ``manifest.csv`` con el índice, el nombre y el estado de cada fila.
 
-    def _fill_page_by_page(self, writer: PdfWriter, data: Dict[str, Any]) -> bool:
+        Args:
+            rows: Iterable de diccionarios {nombre_campo: valor}
+            output: Ruta del ZIP o stream binario (no se cierra)
+            filename_pattern: Patrón del nombre de archivo (ver fill_batch)
+            flatten: Si True, aplana cada PDF generado
+            preprocessed: Si True, las filas ya vienen normalizadas
+            incremental: Modo de escritura de cada PDF (ver fill_pdf)
+            progress: Función llamada con el resumen parcial tras cada fila
+
+        Returns:
+            Diccionario con {total, ok, failed, outputs, errors} (ver fill_batch)
+        """
+        return bundle.fill_zip(self, rows, output, filename_pattern=filename_pattern,
+                               flatten=flatten, preprocessed=preprocessed,
+                               incremental=incremental, progress=progress)
+
+    @staticmethod
+    def build_output_name(pattern: str, index: int, row: Dict[str, str],
+                          used: Optional[Set[str]] = None) -> str:
+        """
+        Construye el nombre de archivo de salida para una fila.
+
+        Args:
+            pattern: Patrón con ``{index}`` y/o nombres de campo
+            index: Número de fila (empezando en 1)
+            row: Datos de la fila
+            used: Nombres ya usados en el lote (se actualiza). Si el nombre
+                se repite, se añade un sufijo numérico (``_2``, ``_3``...)
+
+        Returns:
+            Nombre de archivo seguro (sin separadores de ruta)
+        """
+        class _Values(dict):
+            def __missing__(self, key):
+                return ''
+
+        values = _Values(row)
+        values['index'] = index
+
+        try:
+            name = pattern.format_map(values)
+        except (ValueError, IndexError, AttributeError):
+            name = f"documento_{index:05d}.pdf"
+
+        # Evitar rutas y caracteres no válidos en nombres de archivo
+        name = re.sub(r'[\\/:*?"<>|]', '_', name).strip()
+        if not name.lower().endswith('.pdf'):
+            name += '.pdf'
+
+        if used is not None:
+            # Dos filas con el mismo nombre no deben sobrescribirse
+            stem, ext = os.path.splitext(name)
+            candidate = name
+            counter = 2
+            while candidate in used:
+                candidate = f"{stem}_{counter}{ext}"
+                counter += 1
+            used.add(candidate)
+            name = candidate
+        return name
+
+    def _fill_page_by_page(self, writer: PdfWriter, data: Dict[str, Any],
+                           result: Optional[FillResult] = None) -> bool:
         """
         Intenta rellenar campos página por página como fallback.
 
+        Solo se visitan las páginas que contienen widgets de los campos
+        recibidos, y a cada una se le pasan únicamente sus propios datos.
+
         Args:
             writer: PdfWriter con las páginas
             data: Datos procesados para rellenar
+            result: Resultado del rellenado donde registrar los mensajes
 
         Returns:
             True si tuvo éxito
         """
         try:
             filled_count = 0
-            for page_num, page in enumerate(writer.pages):
+            for page_num, page_data in self.template.pages_for(data).items():
                 try:
                     writer.update_page_form_field_values(
-                        page,
-                        data,
+                        writer.pages[page_num],
+                        page_data,
                         auto_regenerate=True
                     )
                     filled_count += 1
                 except Exception as e:
-                    print(f"[WARNING] Error en página {page_num}: {e}")
+                    self._log(f"Error en página {page_num}: {e}", logging.WARNING, result)
                     continue
 
             if filled_count > 0:
-                print(f"[SUCCESS] Rellenadas {filled_count} páginas")
+                self._log(f"Rellenadas {filled_count} páginas", result=result)
                 return True
             else:
-                print("[ERROR] No se pudo rellenar ninguna página")
+                self._log("No se pudo rellenar ninguna página", logging.ERROR, result)
                 return False
 
         except Exception as e:
-            print(f"[ERROR] Error en método alternativo: {e}")
+            self._log(f"Error en método alternativo: {e}", logging.ERROR, result)
             return False
 
     def _process_data(self, data: Dict[str, str]) -> Dict[str, Any]:
@@ -148,12 +449,17 @@ class PDFFiller:
         Procesa los datos antes de rellenarlos en el PDF.
         Convierte valores especiales como checkboxes.
 
+        La conversión usa las tablas precompiladas del template: los
+        checkboxes reciben su estado activo real (leído de /AP) y los campos
+        de texto conservan el valor tal cual.
+
         Args:
             data: Datos crudos del CSV
 
         Returns:
             Datos procesados listos para el PDF
         """
+        coerce = self.template.coerce
         processed = {}
 
         for field_name, value in data.items():
@@ -161,28 +467,30 @@ class PDFFiller:
                 # Campo vacío, skip
                 continue
 
-            # Procesar checkboxes
-            value_upper = str(value).upper()
-            if value_upper in ['__YES__', 'YES', 'SÍ', 'SI', 'TRUE', '1', 'X']:
-                processed[field_name] = '/Yes'
-            elif value_upper in ['__NO__', 'NO', 'FALSE', '0', '']:
-                processed[field_name] = '/Off'
-            else:
-                # Valor normal de texto
-                processed[field_name] = str(value)
+            processed[field_name] = coerce(field_name, value)
 
         return processed
 
+    def _get_field_names(self) -> frozenset:
+        """
+        Obtiene el conjunto de nombres de campo rellenables del template.
+
+        Returns:
+            Conjunto de nombres de campo (vacío si el PDF no tiene formulario)
+        """
+        return self.template.field_names
+
     def get_fillable_fields(self) -> List[str]:
         """
         Obtiene los campos que pueden ser rellenados.
 
+        Son los mismos nombres contra los que fill_pdf valida los datos (los
+        campos terminales del template compilado, sin los nodos padre).
+
         Returns:
             Lista de nombres de campos
         """
-        if self.reader.get_fields():
-            return list(self.reader.get_fields().keys())
-        return []
+        return list(self.template.fields)
 
     def preview_filled_fields(self, data: Dict[str, str]) -> Dict[str, str]:
         """
@@ -195,10 +503,9 @@ class PDFFiller:
             Diccionario con {campo: valor_que_se_pondría}
         """
         processed = self._process_data(data)
-        fillable = self.get_fillable_fields()
 
         preview = {}
-        for field in fillable:
+        for field in self.template.fields:
             if field in processed:
                 preview[field] = processed[field]
             else:
@@ -211,6 +518,8 @@ if __name__ == "__main__":
     # Test básico
     import sys
 
+    logging.basicConfig(level=logging.INFO, format='[%(levelname)s] %(message)s')
+
     if len(sys.argv) > 3:
         pdf_path = sys.argv[1]
         output_path = sys.argv[2]
@@ -225,7 +534,9 @@ if __name__ == "__main__":
 
         if success:
             print(f"✅ PDF rellenado guardado en: {output_path}")
+            for stage, ms in success.to_dict()['timings_ms'].items():
+                print(f"  {stage}: {ms:.2f} ms")
         else:
             print("❌ Error al rellenar PDF")
     else:
-        print("Uso: python pdf_filler.py <input.pdf> <output.pdf> <campo_prueba>")
+        print("Uso: python -m utils.pdf_filler <input.pdf> <output.pdf> <campo_prueba>")
@@ -0,0 +1,437 @@
+"""
+Módulo con un servicio HTTP de relleno de PDFs (asyncio, solo biblioteca estándar).
+
+Los templates se registran una vez: se parsean, se compilan y quedan en un
+pool LRU acotado, de modo que cada petición de relleno solo aplica los
+valores. Los rellenados se ejecutan en un pool de hilos con un límite de
+concurrencia; cuando hay demasiadas peticiones pendientes el servicio
+responde 503 con ``Retry-After`` en lugar de acumularlas, antes de leer el
+cuerpo de la petición.
+
+Endpoints:
+    GET  /health                    Estado del servicio
+    GET  /metrics                   Métricas en formato Prometheus (si están activadas)
+    GET  /templates                 Templates registrados
+    POST /templates                 Registra un template (cuerpo: bytes del PDF)
+    GET  /templates/{id}            Información y campos de un template
+    POST /templates/{id}/fill       Rellena (cuerpo JSON): un objeto -> PDF,
+                                    una lista de objetos -> ZIP con manifiesto.
+                                    ``?flatten=1`` aplana los PDFs
+"""
+
+from collections import OrderedDict
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import asynccontextmanager
+from http import HTTPStatus
+from typing import Any, AsyncIterator, Dict, List, Optional, Tuple
+from urllib.parse import parse_qs, urlsplit
+import asyncio
+import io
+import json
+import threading
+
+from . import metrics
+from .field_cache import content_hash
+from .pdf_filler import PDFFiller
+
+
+# Límites por defecto
+DEFAULT_MAX_TEMPLATES = 32
+DEFAULT_REPLICAS = 2
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_MAX_PENDING = 256
+DEFAULT_MAX_BODY = 64 * 1024 * 1024
+MAX_HEADER_SIZE = 64 * 1024
+
+
+class _PooledTemplate:
+    """Template registrado: varias copias precompiladas de PDFFiller."""
+
+    def __init__(self, template_id: str, pdf: bytes, replicas: int):
+        self.template_id = template_id
+        # Cada copia tiene su propio PdfReader: un reader no admite lecturas
+        # concurrentes, así que cada rellenado usa una copia en exclusiva
+        self._fillers: List[PDFFiller] = []
+        for _ in range(max(1, replicas)):
+            filler = PDFFiller(pdf, verbose=False)
+            # Precalentar: compilar el template antes de la primera petición
+            field_names = filler.template.field_names
+            self._fillers.append(filler)
+        # Copias libres. Se esperan en el bucle de eventos, antes de pedir un
+        # hilo del pool: una ráfaga de peticiones a este template no ocupa
+        # los hilos que necesitan los demás templates
+        self._available = asyncio.Semaphore(len(self._fillers))
+
+        self.info = {
+            'template_id': template_id,
+            'pages': len(filler.reader.pages),
+            'fields': sorted(field_names),
+            'size': len(pdf)
+        }
+
+    @asynccontextmanager
+    async def checkout(self) -> AsyncIterator[PDFFiller]:
+        """Toma una copia libre del template (espera sin bloquear si todas están en uso)."""
+        async with self._available:
+            # Solo el bucle de eventos toca la lista: no hace falta cerrojo
+            filler = self._fillers.pop()
+            try:
+                yield filler
+            finally:
+                self._fillers.append(filler)
+
+
+class TemplatePool:
+    """Pool LRU acotado de templates compilados, indexados por hash de contenido."""
+
+    def __init__(self, max_templates: int = DEFAULT_MAX_TEMPLATES, replicas: int = DEFAULT_REPLICAS):
+        """
+        Inicializa el pool.
+
+        Args:
+            max_templates: Número máximo de templates en memoria
+            replicas: Copias de cada template (rellenados simultáneos por template)
+        """
+        self.max_templates = max(1, max_templates)
+        self.replicas = max(1, replicas)
+        self._templates: "OrderedDict[str, _PooledTemplate]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def register(self, pdf: bytes) -> Dict[str, Any]:
+        """
+        Registra un template (si ya estaba, solo lo marca como usado).
+
+        Args:
+            pdf: Bytes del PDF
+
+        Returns:
+            Información del template {template_id, pages, fields, size}
+        """
+        template_id = content_hash(pdf)
+        entry = self.get(template_id)
+        if entry is not None:
+            return entry.info
+
+        entry = _PooledTemplate(template_id, pdf, self.replicas)
+        with self._lock:
+            self._templates[template_id] = entry
+            self._templates.move_to_end(template_id)
+            while len(self._templates) > self.max_templates:
+                self._templates.popitem(last=False)
+        return entry.info
+
+    def get(self, template_id: str) -> Optional[_PooledTemplate]:
+        """
+        Busca un template registrado.
+
+        Args:
+            template_id: Hash de contenido devuelto por register
+
+        Returns:
+            Template o None si no está (o fue expulsado del pool)
+        """
+        with self._lock:
+            entry = self._templates.get(template_id)
+            if entry is not None:
+                self._templates.move_to_end(template_id)
+            return entry
+
+    def list(self) -> List[Dict[str, Any]]:
+        """Información de los templates registrados, del menos al más reciente."""
+        with self._lock:
+            return [entry.info for entry in self._templates.values()]
+
+    def __len__(self) -> int:
+        return len(self._templates)
+
+
+class HTTPError(Exception):
+    """Error con código de estado HTTP."""
+
+    def __init__(self, status: int, message: str, headers: Optional[Dict[str, str]] = None):
+        super().__init__(message)
+        self.status = status
+        self.headers = headers or {}
+
+
+def _row_values(row: Any) -> Dict[str, str]:
+    """
+    Valida una fila JSON y la convierte al formato de PDFFiller.
+
+    Los booleanos se convierten en __YES__/__NO__ y los números en texto.
+    """
+    if not isinstance(row, dict):
+        raise HTTPError(400, "Cada fila debe ser un objeto JSON {campo: valor}")
+
+    values = {}
+    for name, value in row.items():
+        if value is None:
+            continue
+        if isinstance(value, bool):
+            value = '__YES__' if value else '__NO__'
+        values[str(name)] = str(value)
+    return values
+
+
+class FillService:
+    """Servicio HTTP asíncrono de relleno con templates precompilados."""
+
+    def __init__(self, pool: Optional[TemplatePool] = None,
+                 max_concurrency: int = DEFAULT_MAX_CONCURRENCY,
+                 max_pending: int = DEFAULT_MAX_PENDING,
+                 max_body: int = DEFAULT_MAX_BODY):
+        """
+        Inicializa el servicio.
+
+        Args:
+            pool: Pool de templates (por defecto, uno nuevo)
+            max_concurrency: Rellenados/registros ejecutándose a la vez
+            max_pending: Peticiones de trabajo (POST) admitidas a la vez,
+                desde que llegan sus cabeceras hasta que terminan; por encima
+                se responde 503 sin leer el cuerpo
+            max_body: Tamaño máximo del cuerpo de una petición en bytes
+        """
+        self.pool = pool or TemplatePool()
+        self.max_concurrency = max(1, max_concurrency)
+        self.max_pending = max_pending
+        self.max_body = max_body
+        self.pending = 0
+        self._executor = ThreadPoolExecutor(max_workers=self.max_concurrency,
+                                            thread_name_prefix='fill')
+        self._slots: Optional[asyncio.Semaphore] = None
+
+    async def start(self, host: str = '127.0.0.1', port: int = 8080) -> asyncio.AbstractServer:
+        """
+        Arranca el servidor en el bucle de eventos actual.
+
+        Args:
+            host: Dirección de escucha
+            port: Puerto (0 = uno libre)
+
+        Returns:
+            Servidor asyncio (ver ``server.sockets`` para el puerto real)
+        """
+        self._slots = asyncio.Semaphore(self.max_concurrency)
+        return await asyncio.start_server(self._handle_connection, host, port,
+                                          limit=MAX_HEADER_SIZE)
+
+    async def serve_forever(self, host: str = '127.0.0.1', port: int = 8080) -> None:
+        """Arranca el servidor y atiende peticiones hasta que se cancele."""
+        server = await self.start(host, port)
+        async with server:
+            await server.serve_forever()
+
+    def close(self) -> None:
+        """Detiene el pool de hilos de rellenado."""
+        self._executor.shutdown(wait=True)
+
+    async def _run(self, func, *args) -> Any:
+        """Ejecuta trabajo síncrono en el pool de hilos, como mucho max_concurrency a la vez."""
+        async with self._slots:
+            loop = asyncio.get_running_loop()
+            return await loop.run_in_executor(self._executor, func, *args)
+
+    async def _handle_connection(self, reader: asyncio.StreamReader,
+                                 writer: asyncio.StreamWriter) -> None:
+        """Atiende las peticiones de una conexión (HTTP/1.1 con keep-alive)."""
+        try:
+            while True:
+                try:
+                    head = await self._read_head(reader)
+                except HTTPError as e:
+                    await self._send(writer, e.status, self._error_body(e), 'application/json',
+                                     e.headers, keep_alive=False)
+                    break
+                if head is None:
+                    break
+
+                method, target, headers, length = head
+                keep_alive = headers.get('connection', '').lower() != 'close'
+
+                # Las peticiones de trabajo (POST) se admiten o rechazan antes de
+                # leer el cuerpo: una avalancha de subidas no consume memoria ni
+                # ancho de banda antes de recibir el 503
+                admitted = method == 'POST'
+                if admitted:
+                    if self.pending >= self.max_pending:
+                        error = HTTPError(503, "Servicio saturado, reintenta más tarde", {'Retry-After': '1'})
+                        # El cuerpo no se lee, así que la conexión no se puede reutilizar
+                        await self._send(writer, error.status, self._error_body(error), 'application/json',
+                                         error.headers, keep_alive=False)
+                        break
+                    self.pending += 1
+
+                try:
+                    body = await reader.readexactly(length) if length else b''
+                    status, payload, content_type, extra = await self._dispatch(method, target, body)
+                except HTTPError as e:
+                    status, payload, content_type, extra = (e.status, self._error_body(e),
+                                                            'application/json', e.headers)
+                except (ConnectionError, asyncio.IncompleteReadError):
+                    raise
+                except Exception as e:
+                    error = HTTPError(500, f"{type(e).__name__}: {e}")
+                    status, payload, content_type, extra = (500, self._error_body(error),
+                                                            'application/json', {})
+                finally:
+                    if admitted:
+                        self.pending -= 1
+
+                await self._send(writer, status, payload, content_type, extra, keep_alive)
+                if not keep_alive:
+                    break
+        except (ConnectionError, asyncio.IncompleteReadError):
+            pass
+        finally:
+            writer.close()
+
+    async def _read_head(self, reader: asyncio.StreamReader
+                         ) -> Optional[Tuple[str, str, Dict[str, str], int]]:
+        """
+        Lee la línea de petición y las cabeceras (el cuerpo se lee después).
+
+        Returns:
+            (método, ruta, cabeceras en minúsculas, longitud del cuerpo), o
+            None si el cliente cerró la conexión
+        """
+        try:
+            head = await reader.readuntil(b'\r\n\r\n')
+        except asyncio.IncompleteReadError:
+            return None
+        except asyncio.LimitOverrunError:
+            raise HTTPError(431, "Cabeceras demasiado grandes")
+
+        lines = head.decode('latin-1').split('\r\n')
+        try:
+            method, target, _ = lines[0].split(' ', 2)
+        except ValueError:
+            raise HTTPError(400, "Línea de petición no válida")
+
+        headers = {}
+        for line in lines[1:]:
+            if ':' in line:
+                name, value = line.split(':', 1)
+                headers[name.strip().lower()] = value.strip()
+
+        if 'chunked' in headers.get('transfer-encoding', '').lower():
+            raise HTTPError(411, "Se requiere Content-Length")
+        try:
+            length = int(headers.get('content-length', 0))
+        except ValueError:
+            raise HTTPError(400, "Content-Length no válido")
+        if length > self.max_body:
+            raise HTTPError(413, f"Cuerpo demasiado grande (máximo {self.max_body} bytes)")
+
+        return method.upper(), target, headers, length
+
+    async def _dispatch(self, method: str, target: str,
+                        body: bytes) -> Tuple[int, bytes, str, Dict[str, str]]:
+        """
+        Enruta una petición a su endpoint.
+
+        Returns:
+            (estado, cuerpo, tipo de contenido, cabeceras adicionales)
+        """
+        url = urlsplit(target)
+        parts = [part for part in url.path.split('/') if part]
+        query = parse_qs(url.query)
+
+        if parts == ['health']:
+            self._allow(method, 'GET')
+            return self._json(200, {
+                'status': 'ok',
+                'templates': len(self.pool),
+                'pending': self.pending,
+                'max_pending': self.max_pending
+            })
+
+        if parts == ['metrics'] and metrics.registry() is not None:
+            self._allow(method, 'GET')
+            return 200, metrics.render().encode('utf-8'), metrics.CONTENT_TYPE, {}
+
+        if parts == ['templates']:
+            self._allow(method, 'GET', 'POST')
+            if method == 'GET':
+                return self._json(200, {'templates': self.pool.list()})
+            if not body.startswith(b'%PDF'):
+                raise HTTPError(400, "El cuerpo debe ser un PDF")
+            info = await self._run(self.pool.register, body)
+            return self._json(201, info)
+
+        if len(parts) in (2, 3) and parts[0] == 'templates' and parts[2:] in ([], ['fill']):
+            self._allow(method, 'GET' if len(parts) == 2 else 'POST')
+            entry = self.pool.get(parts[1])
+            if entry is None:
+                raise HTTPError(404, "Template no registrado")
+
+            if len(parts) == 2:
+                return self._json(200, entry.info)
+
+            try:
+                payload = json.loads(body.decode('utf-8'))
+            except (UnicodeDecodeError, ValueError):
+                raise HTTPError(400, "El cuerpo debe ser JSON")
+            flatten = query.get('flatten', ['0'])[0].lower() in ('1', 'true', 'si', 'yes')
+
+            # La copia del template se reserva antes de ocupar un hilo
+            async with entry.checkout() as filler:
+                if isinstance(payload, list):
+                    rows = [_row_values(row) for row in payload]
+                    data = await self._run(self._fill_zip, filler, rows, flatten)
+                    return 200, data, 'application/zip', {}
+
+                data = await self._run(self._fill_pdf, filler, _row_values(payload), flatten)
+                return 200, data, 'application/pdf', {}
+
+        raise HTTPError(404, "Ruta no encontrada")
+
+    @staticmethod
+    def _allow(method: str, *allowed: str) -> None:
+        """
+        Comprueba el método de la petición.
+
+        Raises:
+            HTTPError: 405 con la cabecera Allow si el método no está permitido
+        """
+        if method not in allowed:
+            raise HTTPError(405, "Método no permitido", {'Allow': ', '.join(allowed)})
+
+    @staticmethod
+    def _fill_pdf(filler: PDFFiller, row: Dict[str, str], flatten: bool) -> bytes:
+        """Rellena un PDF con una copia reservada del template (se ejecuta en el pool de hilos)."""
+        pdf = filler.fill_bytes(row, flatten=flatten)
+        if pdf is None:
+            raise HTTPError(422, filler.last_error or "Error al rellenar el PDF")
+        return pdf
+
+    @staticmethod
+    def _fill_zip(filler: PDFFiller, rows: List[Dict[str, str]], flatten: bool) -> bytes:
+        """Rellena un PDF por fila y los devuelve en un ZIP con manifiesto."""
+        buffer = io.BytesIO()
+        filler.fill_zip(rows, buffer, flatten=flatten)
+        return buffer.getvalue()
+
+    @staticmethod
+    def _json(status: int, data: Any) -> Tuple[int, bytes, str, Dict[str, str]]:
+        """Respuesta JSON."""
+        return status, json.dumps(data, ensure_ascii=False).encode('utf-8'), 'application/json', {}
+
+    @staticmethod
+    def _error_body(error: HTTPError) -> bytes:
+        """Cuerpo JSON de una respuesta de error."""
+        return json.dumps({'error': str(error)}, ensure_ascii=False).encode('utf-8')
+
+    @staticmethod
+    async def _send(writer: asyncio.StreamWriter, status: int, body: bytes, content_type: str,
+                    extra_headers: Dict[str, str], keep_alive: bool) -> None:
+        """Escribe la respuesta HTTP."""
+        headers = {
+            'Content-Type': content_type,
+            'Content-Length': str(len(body)),
+            'Connection': 'keep-alive' if keep_alive else 'close',
+            **extra_headers
+        }
+        head = f"HTTP/1.1 {status} {HTTPStatus(status).phrase}\r\n"
+        head += ''.join(f"{name}: {value}\r\n" for name, value in headers.items())
+        writer.write(head.encode('latin-1') + b'\r\n' + body)
+        await writer.drain()
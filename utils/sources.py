@@ -0,0 +1,200 @@
+"""
+Módulo para aceptar rutas, bytes o streams como entrada y salida.
+
+Permite trabajar sin archivos temporales: los PDFs, CSVs y mapeos pueden
+llegar como ruta, como bytes (p.ej. una subida de Streamlit) o como
+cualquier objeto tipo archivo.
+"""
+
+from contextlib import contextmanager
+from typing import Any, BinaryIO, Iterator, TextIO, Union
+import hashlib
+import io
+import mmap
+import os
+
+from .field_cache import content_hash, file_hash
+
+
+# Ruta, bytes u objeto tipo archivo
+Source = Union[str, os.PathLike, bytes, bytearray, memoryview, BinaryIO]
+
+
+def is_path(source: Any) -> bool:
+    """Indica si la fuente es una ruta en disco."""
+    return isinstance(source, (str, os.PathLike))
+
+
+def is_bytes(source: Any) -> bool:
+    """Indica si la fuente son bytes en memoria."""
+    return isinstance(source, (bytes, bytearray, memoryview))
+
+
+def as_binary(source: Source) -> Union[str, BinaryIO]:
+    """
+    Convierte la fuente en algo que PdfReader sepa abrir.
+
+    Args:
+        source: Ruta, bytes u objeto tipo archivo binario
+
+    Returns:
+        Ruta (str) o stream binario posicionable
+    """
+    if is_path(source):
+        return os.fspath(source)
+    if is_bytes(source):
+        return io.BytesIO(bytes(source))
+    return source
+
+
+def map_file(path: Union[str, os.PathLike]) -> mmap.mmap:
+    """
+    Proyecta un archivo en memoria en modo solo lectura.
+
+    Las páginas del archivo las gestiona la caché del sistema operativo, de
+    modo que varios procesos que proyectan el mismo template comparten la
+    memoria en lugar de tener cada uno su copia.
+
+    Args:
+        path: Ruta al archivo
+
+    Returns:
+        Objeto mmap (admite read/seek/tell, como un archivo)
+    """
+    with open(path, 'rb') as f:
+        return mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ)
+
+
+def stream_data(stream: Any) -> Any:
+    """
+    Acceso sin copia al contenido de un stream abierto por PdfReader.
+
+    Args:
+        stream: mmap, BytesIO u objeto tipo archivo
+
+    Returns:
+        El propio mmap, una vista del BytesIO o, en otro caso, sus bytes
+    """
+    if isinstance(stream, mmap.mmap):
+        return stream
+    if hasattr(stream, 'getbuffer'):
+        return stream.getbuffer()
+    return read_bytes(stream)
+
+
+def read_bytes(source: Source) -> bytes:
+    """
+    Devuelve el contenido completo de la fuente.
+
+    Los streams se leen desde el principio y se dejan en su posición original.
+
+    Args:
+        source: Ruta, bytes u objeto tipo archivo binario
+
+    Returns:
+        Bytes de la fuente
+    """
+    if is_path(source):
+        with open(source, 'rb') as f:
+            return f.read()
+    if is_bytes(source):
+        return bytes(source)
+    if hasattr(source, 'getvalue'):
+        return source.getvalue()
+
+    position = source.tell()
+    try:
+        source.seek(0)
+        return source.read()
+    finally:
+        source.seek(position)
+
+
+def source_hash(source: Source, block_size: int = 1 << 20) -> str:
+    """
+    Calcula el hash de contenido de la fuente (ver field_cache).
+
+    Args:
+        source: Ruta, bytes u objeto tipo archivo binario
+        block_size: Tamaño de bloque de lectura para streams
+
+    Returns:
+        SHA-256 en hexadecimal
+    """
+    if is_path(source):
+        return file_hash(os.fspath(source), block_size)
+    if is_bytes(source):
+        return content_hash(bytes(source))
+    if hasattr(source, 'getbuffer'):
+        with source.getbuffer() as buffer:
+            return content_hash(buffer)
+
+    digest = hashlib.sha256()
+    position = source.tell()
+    try:
+        source.seek(0)
+        for block in iter(lambda: source.read(block_size), b''):
+            digest.update(block)
+    finally:
+        source.seek(position)
+    return digest.hexdigest()
+
+
+@contextmanager
+def open_text(source: Source, encoding: str = 'utf-8-sig') -> Iterator[TextIO]:
+    """
+    Abre la fuente como texto, apta para el módulo csv.
+
+    Los streams posicionables se leen desde el principio, igual que las
+    rutas y los bytes.
+
+    Args:
+        source: Ruta, bytes, stream binario o stream de texto
+        encoding: Codificación del texto
+
+    Yields:
+        Stream de texto
+    """
+    if is_path(source):
+        with open(source, 'r', encoding=encoding, newline='') as f:
+            yield f
+    elif is_bytes(source):
+        yield io.StringIO(bytes(source).decode(encoding), newline='')
+    elif isinstance(source, io.TextIOBase):
+        if source.seekable():
+            source.seek(0)
+        yield source
+    else:
+        if hasattr(source, 'seek'):
+            source.seek(0)
+        wrapper = io.TextIOWrapper(source, encoding=encoding, newline='')
+        try:
+            yield wrapper
+        finally:
+            # No cerrar el stream del llamador al liberar el wrapper
+            wrapper.detach()
+
+
+@contextmanager
+def open_output(target: Union[str, os.PathLike, BinaryIO]) -> Iterator[BinaryIO]:
+    """
+    Abre el destino de escritura binaria.
+
+    Args:
+        target: Ruta o stream binario con ``write``
+
+    Yields:
+        Stream binario (los streams del llamador no se cierran)
+    """
+    if is_path(target):
+        with open(target, 'wb') as f:
+            yield f
+    else:
+        yield target
+
+
+def display_name(source: Source) -> str:
+    """Nombre legible de la fuente para mensajes."""
+    if is_path(source):
+        return os.fspath(source)
+    return getattr(source, 'name', None) or '<memoria>'
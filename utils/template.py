@@ -0,0 +1,507 @@
+"""
+Módulo con el template compilado: el formulario PDF se analiza una sola vez
+y se reutiliza en todos los rellenados.
+"""
+
+from pypdf import PdfReader, PdfWriter
+from pypdf.generic import (
+    ArrayObject, DecodedStreamObject, DictionaryObject, FloatObject,
+    IndirectObject, NameObject, TextStringObject
+)
+from typing import Dict, Any, Callable, List, Optional, Tuple, Union
+
+from . import appearance
+from .incremental import IncrementalWriter
+from .sources import stream_data
+
+
+# Bits de /Ff usados para distinguir tipos de campo
+FF_REQUIRED = 2
+FF_MULTILINE = 4096
+FF_RADIO = 32768
+
+# Valores (en mayúsculas) que marcan / desmarcan un checkbox
+TRUTHY_TOKENS = frozenset(['__YES__', 'YES', 'SÍ', 'SI', 'TRUE', '1', 'X', '/YES'])
+FALSY_TOKENS = frozenset(['__NO__', 'NO', 'FALSE', '0', '/OFF', 'OFF'])
+
+
+def field_type_from_flags(ft: str, ff: int) -> str:
+    """
+    Traduce /FT y /Ff al tipo de campo usado en la aplicación.
+
+    Args:
+        ft: Valor de /FT ('/Tx', '/Btn', '/Ch', ...)
+        ff: Valor de /Ff
+
+    Returns:
+        Tipo de campo: 'text', 'checkbox', 'radio', 'dropdown', 'unknown'
+    """
+    if ft == '/Tx':
+        return 'text'
+    elif ft == '/Btn':
+        return 'radio' if ff & FF_RADIO else 'checkbox'
+    elif ft == '/Ch':
+        return 'dropdown'
+    return 'unknown'
+
+
+class CompiledTemplate:
+    """
+    Formulario PDF analizado una sola vez.
+
+    Guarda el árbol de campos, las referencias a los widgets de cada página,
+    los tipos de campo y el conjunto de nombres válidos. Los rellenados
+    posteriores acceden directamente a los widgets de los campos que cambian,
+    sin volver a recorrer el AcroForm ni las anotaciones de cada página.
+
+    La compilación evita repetir el análisis, pero ``new_writer()`` sigue
+    clonando el documento completo en cada rellenado, de modo que su coste
+    crece con el número de páginas. Solo ``new_writer(incremental=True)``
+    tiene un coste por rellenado independiente del tamaño del template.
+    """
+
+    def __init__(self, source: Union[str, PdfReader],
+                 field_info: Optional[Dict[str, Dict[str, Any]]] = None):
+        """
+        Compila el template.
+
+        Args:
+            source: Ruta al PDF o PdfReader ya abierto
+            field_info: Metadatos de campo de un mapeo JSON ({nombre: {type,
+                options, export_values}}, ver CSVHandler.load_mapping_data).
+                Los campos que aparecen aquí toman el tipo, las opciones y
+                los estados del mapeo en lugar de detectarlos en el PDF
+        """
+        self.reader = source if isinstance(source, PdfReader) else PdfReader(source)
+        self._field_info = field_info or {}
+
+        # nombre -> {type, ft, flags, required, options, value, states, known_states, widgets}
+        # widgets: lista de (índice de página, índice en /Annots)
+        self.fields: Dict[str, Dict[str, Any]] = {}
+        # índice de página -> lista de (índice en /Annots, nombre de campo)
+        self.widgets_by_page: Dict[int, List[Tuple[int, str]]] = {}
+        # (página, índice en /Annots) -> {width, height, font, size, color, q, multiline}
+        self.widget_layout: Dict[Tuple[int, int], Dict[str, Any]] = {}
+
+        acro_form = self.reader.trailer['/Root'].get('/AcroForm')
+        acro_form = acro_form.get_object() if acro_form is not None else {}
+        self._default_da = str(acro_form.get('/DA', ''))
+        self._default_q = int(acro_form.get('/Q', 0))
+
+        self._compile()
+        self.field_names = frozenset(self.fields)
+
+        # nombre -> {valor en mayúsculas: estado}, solo para checkbox/radio
+        self.value_tables: Dict[str, Dict[str, str]] = {
+            name: self._build_value_table(field)
+            for name, field in self.fields.items()
+            if field['type'] in ('checkbox', 'radio')
+        }
+
+    def _compile(self) -> None:
+        """Recorre una vez las anotaciones de todas las páginas."""
+        for page_index, page in enumerate(self.reader.pages):
+            annots = page.get('/Annots')
+            if not annots:
+                continue
+
+            for annot_index, annot_ref in enumerate(annots.get_object()):
+                widget = annot_ref.get_object()
+                if widget.get('/Subtype') != '/Widget':
+                    continue
+
+                name = self._qualified_name(widget)
+                if not name:
+                    continue
+
+                field = self.fields.get(name)
+                if field is None:
+                    field = self._new_field(widget, self._field_info.get(name))
+                    self.fields[name] = field
+
+                if field['ft'] == '/Btn' and not field['known_states']:
+                    for state in self._widget_states(widget):
+                        if state not in field['states']:
+                            field['states'].append(state)
+
+                field['widgets'].append((page_index, annot_index))
+                self.widgets_by_page.setdefault(page_index, []).append((annot_index, name))
+
+                if field['ft'] in ('/Tx', '/Ch'):
+                    self.widget_layout[(page_index, annot_index)] = self._layout(widget, field)
+
+    def _new_field(self, widget: Dict, info: Optional[Dict[str, Any]]) -> Dict[str, Any]:
+        """
+        Información compilada de un campo a partir de su primer widget.
+
+        Args:
+            widget: Anotación /Widget
+            info: Metadatos del campo en el mapeo (None si no hay)
+
+        Returns:
+            Diccionario {type, ft, flags, required, options, value, states,
+            known_states, widgets}
+        """
+        ft = self._inherited(widget, '/FT', '')
+        ff = int(self._inherited(widget, '/Ff', 0))
+        field = {
+            'ft': ft,
+            'flags': ff,
+            'required': ff & FF_REQUIRED == FF_REQUIRED,
+            'value': self._inherited(widget, '/V', ''),
+            'states': [],
+            # True si los estados vienen del mapeo (no se leen los /AP)
+            'known_states': False,
+            'widgets': []
+        }
+
+        if info is not None and info.get('type', 'unknown') != 'unknown':
+            field['type'] = info['type']
+            field['options'] = list(info.get('options') or [])
+            if info.get('export_values'):
+                field['states'] = list(info['export_values'])
+                field['known_states'] = True
+        else:
+            field['type'] = field_type_from_flags(ft, ff)
+            field['options'] = self._options(self._inherited(widget, '/Opt', []))
+        return field
+
+    def _layout(self, widget: Dict, field: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Datos de maquetación de un widget de texto, resueltos al compilar.
+
+        Args:
+            widget: Anotación /Widget
+            field: Información compilada del campo
+
+        Returns:
+            Diccionario {width, height, font, size, color, q, multiline}
+        """
+        rect = [float(v) for v in widget.get('/Rect', [0, 0, 0, 0])]
+        da = str(self._inherited(widget, '/DA', '') or self._default_da)
+        font_name, font_size, color = appearance.parse_da(da)
+
+        return {
+            'width': abs(rect[2] - rect[0]),
+            'height': abs(rect[3] - rect[1]),
+            'font': font_name,
+            'size': font_size,
+            'color': color,
+            'q': int(self._inherited(widget, '/Q', self._default_q)),
+            'multiline': bool(field['flags'] & FF_MULTILINE)
+        }
+
+    @staticmethod
+    def _widget_states(widget: Dict) -> List[str]:
+        """
+        Estados "activo" de un widget de checkbox/radio según su /AP /N.
+
+        Args:
+            widget: Anotación /Widget
+
+        Returns:
+            Nombres de estado distintos de /Off (p.ej. ['/On'])
+        """
+        normal = widget.get('/AP', {}).get('/N')
+        normal = normal.get_object() if normal is not None else None
+        if normal is None or hasattr(normal, 'get_data'):
+            return []
+        return [str(state) for state in normal.keys() if state != '/Off']
+
+    @staticmethod
+    def _build_value_table(field: Dict[str, Any]) -> Dict[str, str]:
+        """
+        Construye la tabla de conversión de valores de un checkbox o radio.
+
+        Los valores verdaderos se traducen al estado activo real del campo
+        (su /AP puede usar /On, /1... en lugar de /Yes) y los falsos a /Off.
+        Cada estado también se acepta por su nombre, con o sin barra.
+
+        Args:
+            field: Información compilada del campo
+
+        Returns:
+            Diccionario {valor en mayúsculas: estado PDF}
+        """
+        states = field['states']
+        table = {token: '/Off' for token in FALSY_TOKENS}
+
+        if field['type'] == 'checkbox':
+            on_state = states[0] if states else '/Yes'
+            table.update({token: on_state for token in TRUTHY_TOKENS})
+
+        for state in states:
+            table[state.upper()] = state
+            table[state.lstrip('/').upper()] = state
+
+        return table
+
+    def coerce(self, name: str, value: Any) -> str:
+        """
+        Convierte un valor de entrada al valor que se escribe en el campo.
+
+        Para checkboxes y radios es una búsqueda en la tabla precompilada;
+        el resto de campos reciben el texto tal cual.
+
+        Args:
+            name: Nombre del campo
+            value: Valor de entrada
+
+        Returns:
+            Valor para el PDF
+        """
+        value = str(value)
+        table = self.value_tables.get(name)
+        if table is None:
+            return value
+        return table.get(value.strip().upper(), value)
+
+    @staticmethod
+    def _qualified_name(widget: Dict) -> str:
+        """
+        Calcula el nombre completo de un campo (``padre.hijo``) desde su widget.
+
+        Args:
+            widget: Anotación /Widget
+
+        Returns:
+            Nombre cualificado del campo, o cadena vacía si no tiene /T
+        """
+        parts = []
+        node = widget
+        while node is not None:
+            if '/T' in node:
+                parts.append(str(node['/T']))
+            parent = node.get('/Parent')
+            node = parent.get_object() if parent is not None else None
+        return '.'.join(reversed(parts))
+
+    @staticmethod
+    def _inherited(node: Dict, key: str, default: Any) -> Any:
+        """
+        Obtiene un atributo heredable del campo subiendo por /Parent.
+
+        Args:
+            node: Widget o campo
+            key: Clave a buscar
+            default: Valor si no aparece en ningún nivel
+
+        Returns:
+            Valor encontrado o ``default``
+        """
+        while node is not None:
+            if key in node:
+                return node[key]
+            parent = node.get('/Parent')
+            node = parent.get_object() if parent is not None else None
+        return default
+
+    @staticmethod
+    def _options(options: Any) -> List[str]:
+        """
+        Normaliza /Opt a una lista de textos visibles.
+
+        Args:
+            options: Valor de /Opt
+
+        Returns:
+            Lista de opciones
+        """
+        options = options.get_object() if hasattr(options, 'get_object') else options
+        if isinstance(options, list):
+            return [opt if isinstance(opt, str) else opt[1] for opt in options]
+        return []
+
+    def new_writer(self, incremental: bool = False) -> Union[PdfWriter, IncrementalWriter]:
+        """
+        Crea un writer para rellenar una copia del template.
+
+        Args:
+            incremental: Si True, devuelve un IncrementalWriter que no clona
+                el documento: al escribir copia los bytes originales y añade
+                solo los objetos modificados
+
+        Returns:
+            PdfWriter (copia completa: páginas + AcroForm; su coste crece
+            con el número de páginas) o IncrementalWriter
+        """
+        if incremental:
+            return IncrementalWriter(self.reader, stream_data(self.reader.stream))
+        return PdfWriter(clone_from=self.reader)
+
+    def pages_for(self, data: Dict[str, Any]) -> Dict[int, Dict[str, Any]]:
+        """
+        Reparte los valores por las páginas donde están sus widgets.
+
+        Args:
+            data: Diccionario {nombre_campo: valor} con campos válidos
+
+        Returns:
+            Diccionario {índice de página: {nombre_campo: valor}}
+        """
+        by_page: Dict[int, Dict[str, Any]] = {}
+        for name, value in data.items():
+            for page_index, _ in self.fields[name]['widgets']:
+                by_page.setdefault(page_index, {})[name] = value
+        return by_page
+
+    def apply_values(self, writer: PdfWriter, data: Dict[str, Any],
+                     cache: Optional[appearance.AppearanceCache] = None) -> int:
+        """
+        Escribe los valores en un writer creado con new_writer().
+
+        Solo se modifican los widgets de los campos recibidos: se accede a
+        cada uno por (página, índice en /Annots) y solo se genera la
+        apariencia de esos widgets. El resto de anotaciones y páginas no se
+        visitan.
+
+        Args:
+            writer: PdfWriter creado con new_writer()
+            data: Diccionario {nombre_campo: valor} con campos válidos
+            cache: Caché de partes fijas de las apariencias (opcional)
+
+        Returns:
+            Número de widgets actualizados
+        """
+        render = cache.render if cache is not None else appearance.text_stream
+        writer.set_need_appearances_writer(True)
+        fonts = self._font_resources(writer)
+        updated = 0
+
+        for name, value in data.items():
+            field = self.fields[name]
+            for page_index, annot_index in field['widgets']:
+                widget = writer.pages[page_index]['/Annots'][annot_index].get_object()
+
+                if field['ft'] == '/Btn':
+                    self._set_button(widget, field, str(value))
+                else:
+                    layout = self.widget_layout[(page_index, annot_index)]
+                    self._set_text(writer, widget, field, str(value), layout, fonts, render)
+                updated += 1
+
+        return updated
+
+    @staticmethod
+    def _font_resources(writer: PdfWriter) -> Dict[str, Any]:
+        """
+        Fuentes de /DR del AcroForm del writer.
+
+        Args:
+            writer: PdfWriter con el formulario
+
+        Returns:
+            Diccionario {'/Nombre': referencia de fuente}
+        """
+        acro_form = writer.root_object.get('/AcroForm')
+        if acro_form is None:
+            return {}
+        resources = acro_form.get_object().get('/DR')
+        if resources is None:
+            return {}
+        fonts = resources.get_object().get('/Font')
+        return fonts.get_object() if fonts is not None else {}
+
+    @staticmethod
+    def _field_object(widget: Dict) -> Dict:
+        """Diccionario del campo de un widget (el propio widget si está fusionado)."""
+        if '/T' in widget or '/Parent' not in widget:
+            return widget
+        return widget['/Parent'].get_object()
+
+    def _set_button(self, widget: Dict, field: Dict[str, Any], value: str) -> None:
+        """
+        Fija el estado de un widget de checkbox/radio.
+
+        Args:
+            widget: Anotación /Widget (del writer)
+            field: Información compilada del campo
+            value: Estado pedido (p.ej. '/On' o '/Off')
+        """
+        state = NameObject(value if value.startswith('/') else '/' + value)
+        widget_states = self._widget_states(widget)
+
+        widget[NameObject('/AS')] = state if state in widget_states else NameObject('/Off')
+        self._field_object(widget)[NameObject('/V')] = (
+            state if state in field['states'] else NameObject('/Off')
+        )
+
+    @staticmethod
+    def _set_text(writer: PdfWriter, widget: Dict, field: Dict[str, Any], value: str,
+                  layout: Dict[str, Any], fonts: Dict[str, Any],
+                  render: Callable[..., bytes] = appearance.text_stream) -> None:
+        """
+        Fija el valor de un widget de texto/desplegable y regenera su apariencia.
+
+        Args:
+            writer: PdfWriter con el formulario
+            widget: Anotación /Widget (del writer)
+            field: Información compilada del campo
+            value: Texto a escribir
+            layout: Maquetación precalculada del widget
+            fonts: Fuentes de /DR del AcroForm
+            render: Generador del contenido de la apariencia
+        """
+        field_obj = CompiledTemplate._field_object(widget)
+        field_obj[NameObject('/V')] = TextStringObject(value)
+        if field['ft'] == '/Ch' and '/I' in field_obj:
+            del field_obj['/I']
+
+        content = render(
+            value, layout['width'], layout['height'], layout['font'],
+            layout['size'], layout['color'], layout['q'], layout['multiline']
+        )
+
+        resources = DictionaryObject()
+        font_ref = fonts.get('/' + layout['font'])
+        if font_ref is not None:
+            resources[NameObject('/Font')] = DictionaryObject({
+                NameObject('/' + layout['font']): font_ref
+            })
+
+        bbox = ArrayObject([
+            FloatObject(0), FloatObject(0),
+            FloatObject(layout['width']), FloatObject(layout['height'])
+        ])
+
+        # Reutilizar el objeto /AP /N existente si se puede, para no dejar
+        # streams huérfanos en el documento
+        current = widget.get('/AP', {}).get('/N')
+        if isinstance(current, IndirectObject):
+            stream = current.get_object()
+            try:
+                stream.set_data(content)
+                stream[NameObject('/BBox')] = bbox
+                stream[NameObject('/Resources')] = resources
+                return
+            except Exception:
+                pass
+
+        stream = DecodedStreamObject()
+        stream.set_data(content)
+        stream[NameObject('/Type')] = NameObject('/XObject')
+        stream[NameObject('/Subtype')] = NameObject('/Form')
+        stream[NameObject('/BBox')] = bbox
+        stream[NameObject('/Resources')] = resources
+        widget[NameObject('/AP')] = DictionaryObject({
+            NameObject('/N'): writer._add_object(stream)
+        })
+
+    def fill(self, data: Dict[str, Any],
+             cache: Optional[appearance.AppearanceCache] = None) -> PdfWriter:
+        """
+        Crea un writer con los valores aplicados.
+
+        Los nombres que no existen en el template se ignoran.
+
+        Args:
+            data: Diccionario {nombre_campo: valor}
+            cache: Caché de partes fijas de las apariencias (opcional)
+
+        Returns:
+            PdfWriter con el formulario rellenado
+        """
+        writer = self.new_writer()
+        valid_data = {name: value for name, value in data.items() if name in self.field_names}
+        self.apply_values(writer, valid_data, cache)
+        return writer
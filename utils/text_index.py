@@ -0,0 +1,119 @@
+"""
+Módulo con un índice espacial de textos de página para buscar etiquetas.
+"""
+
+from typing import Dict, List, Any, Tuple, Optional
+import math
+
+
+class TextGrid:
+    """
+    Índice en rejilla de los textos de una página.
+
+    Permite encontrar el texto con menor distancia ponderada a un campo
+    visitando solo las celdas cercanas, en lugar de recorrer todos los
+    textos de la página para cada campo.
+    """
+
+    # Factor de ponderación mínimo que puede aplicarse a una distancia
+    # (texto a la izquierda del campo). Sirve de cota inferior en la búsqueda.
+    MIN_WEIGHT = 0.5
+
+    def __init__(self, text_elements: List[Dict[str, Any]], cell_size: float = 50.0):
+        """
+        Construye el índice.
+
+        Args:
+            text_elements: Lista de {text, x, y, ...} de la página
+            cell_size: Tamaño de celda en puntos PDF
+        """
+        self.cell_size = cell_size
+        self.cells: Dict[Tuple[int, int], List[Tuple[int, str, float, float]]] = {}
+        self.size = 0
+
+        for order, elem in enumerate(text_elements):
+            text = elem['text']
+
+            # Ignorar texto muy corto o que parece ser un valor de campo
+            if len(text) < 2 or text.isdigit():
+                continue
+
+            x = elem['x']
+            y = elem['y']
+            self.cells.setdefault(self._cell(x, y), []).append((order, text, x, y))
+            self.size += 1
+
+        if self.cells:
+            self.min_i = min(i for i, _ in self.cells)
+            self.max_i = max(i for i, _ in self.cells)
+            self.min_j = min(j for _, j in self.cells)
+            self.max_j = max(j for _, j in self.cells)
+
+    def _cell(self, x: float, y: float) -> Tuple[int, int]:
+        """Celda que contiene el punto (x, y)."""
+        return (math.floor(x / self.cell_size), math.floor(y / self.cell_size))
+
+    def nearest(self, field_rect: Tuple[float, float, float, float]) -> Optional[str]:
+        """
+        Busca el texto con menor distancia ponderada al campo.
+
+        Usa la misma puntuación que la búsqueda lineal: distancia Manhattan
+        al borde izquierdo / centro vertical del campo, reducida para textos
+        a la izquierda (x0.5) o encima (x0.7). Los empates se resuelven por
+        el orden original de los textos.
+
+        Args:
+            field_rect: Rectángulo del campo (left, bottom, right, top)
+
+        Returns:
+            Texto más cercano (sin limpiar) o None
+        """
+        if not self.cells:
+            return None
+
+        field_left, field_bottom, field_right, field_top = field_rect
+        field_center_x = (field_left + field_right) / 2
+        field_center_y = (field_bottom + field_top) / 2
+
+        qi, qj = self._cell(field_left, field_center_y)
+        max_ring = max(
+            abs(qi - self.min_i), abs(qi - self.max_i),
+            abs(qj - self.min_j), abs(qj - self.max_j)
+        )
+
+        best = None  # (distancia, orden, texto)
+        for ring in range(max_ring + 1):
+            for cell in self._ring_cells(qi, qj, ring):
+                for order, text, x, y in self.cells.get(cell, ()):
+                    distance = abs(x - field_left) + abs(y - field_center_y)
+
+                    if x < field_left and abs(y - field_center_y) < 50:
+                        distance *= 0.5
+                    elif y > field_top and abs(x - field_center_x) < 100:
+                        distance *= 0.7
+
+                    if best is None or (distance, order) < best[:2]:
+                        best = (distance, order, text)
+
+            # Cualquier texto en anillos posteriores está al menos a
+            # ring * cell_size (Chebyshev) del punto de consulta. Con un
+            # empate exacto se sigue buscando: un texto anterior en el orden
+            # de la página podría estar más lejos en la rejilla
+            if best is not None and best[0] < self.MIN_WEIGHT * ring * self.cell_size:
+                break
+
+        return best[2] if best else None
+
+    @staticmethod
+    def _ring_cells(qi: int, qj: int, ring: int):
+        """Celdas a distancia de Chebyshev exacta ``ring`` de (qi, qj)."""
+        if ring == 0:
+            yield (qi, qj)
+            return
+
+        for i in range(qi - ring, qi + ring + 1):
+            yield (i, qj - ring)
+            yield (i, qj + ring)
+        for j in range(qj - ring + 1, qj + ring):
+            yield (qi - ring, j)
+            yield (qi + ring, j)